@@ -0,0 +1,156 @@
+"""Бенчмарк хранения рассылки: тело в каждой строке против общей части по ссылке.
+
+Синтетическая рассылка одного email на ``--recipients`` получателей
+пишется в ``notifications`` через ``NotificationRepository.bulk_create``
+пачками ``fanout_batch_size``: "до" — тема, тело и data в каждой строке,
+"после" — одна строка ``message_payloads`` и ``payload_ref`` в строках.
+Меряются строки в секунду и размер таблиц с индексами. Нужен Postgres
+(таблица ``notifications`` очищается!), например:
+
+    docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=bench -e POSTGRES_DB=bench postgres:16
+    POSTGRES_HOST=localhost POSTGRES_PORT=5432 POSTGRES_DB=bench POSTGRES_USER=postgres \\
+        POSTGRES_PASSWORD=bench python -m benchmarks.bench_content_storage --recipients 100000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "services" / "notification_api"))
+
+from core.db import AsyncDBSession, NotificationTemplate, dispose_db, init_db  # noqa: E402
+from core.repository import MessagePayloadRepository, NotificationRepository  # noqa: E402
+from core.settings import settings  # noqa: E402
+from models.delivery import DeliveryStatus, NotificationType, PriorityLevel  # noqa: E402
+from shared.models.wire import payload_ref  # noqa: E402
+
+SUBJECT = "Новые фильмы недели"
+BODY = (
+    "<p>Здравствуйте, {{ user.name }}!</p><p>На этой неделе в каталоге появились новинки, "
+    "которые могут вам понравиться:</p><ul>"
+    + "".join(
+        f'<li><a href="https://cinema.example.com/s/{index:08x}">Фильм недели №{index}</a></li>'
+        for index in range(12)
+    )
+    + "</ul><p>Приятного просмотра!</p>"
+)
+DATA: Dict[str, Any] = {"campaign": "weekly", "movie_ids": list(range(12))}
+
+RowFactory = Callable[[UUID, str], Dict[str, Any]]
+
+
+def _row(template_id: UUID, user_id: str) -> Dict[str, Any]:
+    return {
+        "id": uuid4(),
+        "user_id": user_id,
+        "template_id": template_id,
+        "notification_type": NotificationType.EMAIL,
+        "status": DeliveryStatus.PENDING,
+        "scheduled_time": None,
+        "is_recurring": False,
+        "recurrence_pattern": None,
+        "priority": PriorityLevel.NORMAL,
+    }
+
+
+def inline_row(template_id: UUID, user_id: str) -> Dict[str, Any]:
+    return {**_row(template_id, user_id), "subject": SUBJECT, "body": BODY, "data": DATA}
+
+
+def reference_row(ref: str) -> RowFactory:
+    def make(template_id: UUID, user_id: str) -> Dict[str, Any]:
+        return {**_row(template_id, user_id), "payload_ref": ref, "data": {}}
+
+    return make
+
+
+async def _table_bytes() -> int:
+    async with AsyncDBSession() as session:
+        result = await session.execute(
+            # notifications секционирована: размер родителя — ноль, считаем секции
+            text(
+                "SELECT (SELECT sum(pg_total_relation_size(relid)) "
+                "FROM pg_partition_tree('notifications')) "
+                "+ pg_total_relation_size('message_payloads')"
+            )
+        )
+        return int(result.scalar_one())
+
+
+async def _reset() -> None:
+    async with AsyncDBSession() as session:
+        await session.execute(text("TRUNCATE notifications, message_payloads"))
+        await session.commit()
+
+
+async def run_case(
+    template_id: UUID, recipients: int, make_row: RowFactory, shared: List[Dict[str, Any]]
+) -> Tuple[float, int]:
+    await _reset()
+    started = time.perf_counter()
+    async with AsyncDBSession() as session:
+        await MessagePayloadRepository(session).ensure(shared, commit=False)
+        repository = NotificationRepository(session)
+        for start in range(0, recipients, settings.fanout_batch_size):
+            rows = [
+                make_row(template_id, f"user-{index}")
+                for index in range(start, min(start + settings.fanout_batch_size, recipients))
+            ]
+            await repository.bulk_create(rows, batch_size=settings.fanout_batch_size)
+    elapsed = time.perf_counter() - started
+    return elapsed, await _table_bytes()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=100_000)
+    args = parser.parse_args()
+
+    await init_db()
+    template_id = uuid4()
+    async with AsyncDBSession() as session:
+        session.add(
+            NotificationTemplate(
+                id=template_id,
+                name=f"bench-{template_id}",
+                subject=SUBJECT,
+                body=BODY,
+                notification_type=NotificationType.EMAIL,
+            )
+        )
+        await session.commit()
+
+    ref = payload_ref(template_id, 1, SUBJECT, BODY, DATA)
+    shared = {
+        "ref": ref,
+        "template_id": template_id,
+        "template_version": 1,
+        "subject": SUBJECT,
+        "body": BODY,
+        "data": DATA,
+    }
+    cases = [
+        ("body in every row (before)", inline_row, []),
+        ("payload_ref (after)", reference_row(ref), [shared]),
+    ]
+    print(f"{'case':<28} {'rows/s':>10} {'table MB':>10} {'bytes/row':>10}")
+    try:
+        for name, make_row, payloads in cases:
+            elapsed, size = await run_case(template_id, args.recipients, make_row, payloads)
+            print(
+                f"{name:<28} {args.recipients / elapsed:>10.0f} "
+                f"{size / 2**20:>10.1f} {size / args.recipients:>10.0f}"
+            )
+        await _reset()
+    finally:
+        await dispose_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Бенчмарк накладных расходов middleware логирования notification-api.
+
+Запросы идут напрямую в ASGI-приложение без сети, поэтому разница между
+вариантами — это стоимость самого middleware. Сравниваются: без middleware,
+прежний ``BaseHTTPMiddleware`` с логом каждого запроса и новый ASGI-middleware
+с выборкой 10% и 100%. Лог пишется в /dev/null. Модулям сервиса нужны
+переменные окружения (например, из ``.env``):
+
+    python -m benchmarks.bench_logging_middleware --requests 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import structlog
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "services" / "notification_api"))
+
+from core.logging_settings import LoggingMiddleware  # noqa: E402
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """Прежняя реализация: BaseHTTPMiddleware, time.time() и лог на каждый запрос."""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        start_time = time.time()
+        logger = structlog.get_logger("http")
+        response = await call_next(request)
+        logger.info(
+            "Successful request",
+            method=request.method,
+            path=request.url.path,
+            query=str(request.url.query),
+            client_ip=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent"),
+            status_code=response.status_code,
+            process_time=round(time.time() - start_time, 3),
+        )
+        return response
+
+
+def _app(middleware: Optional[type] = None, **options: Any) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int) -> Dict[str, int]:
+        return {"id": item_id}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+
+async def _drive(app: FastAPI, count: int) -> float:
+    started = time.perf_counter()
+    for index in range(count):
+        delivered = False
+        finished = asyncio.Event()
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal delivered
+            if delivered:
+                # клиент отключается только после ответа, как настоящий
+                await finished.wait()
+                return {"type": "http.disconnect"}
+            delivered = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                finished.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/items/{index}",
+            "raw_path": f"/items/{index}".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    logging.basicConfig(stream=devnull, level=logging.INFO, force=True)
+    structlog.configure(
+        processors=[structlog.processors.TimeStamper(fmt="iso"), structlog.processors.JSONRenderer()],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    cases = [
+        ("no middleware", _app()),
+        ("BaseHTTPMiddleware, log all", _app(LegacyLoggingMiddleware)),
+        ("ASGI, sample 10%", _app(LoggingMiddleware, sample_rate=0.1)),
+        ("ASGI, sample 100%", _app(LoggingMiddleware, sample_rate=1.0)),
+    ]
+    baseline: Optional[float] = None
+    for name, app in cases:
+        await _drive(app, 200)  # прогрев
+        elapsed = await _drive(app, args.requests)
+        rps = args.requests / elapsed
+        per_request_us = elapsed / args.requests * 1e6
+        overhead = "" if baseline is None else f"  +{per_request_us - baseline:.0f} us/req"
+        if baseline is None:
+            baseline = per_request_us
+        print(f"{name:<30} {rps:>8.0f} req/s{overhead}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Бенчмарк конвейера логов: события в секунду и задержки event loop.
+
+Сравниваются прежняя схема (``StreamHandler`` и ``JSONRenderer`` прямо на
+event loop) и ``shared.utils.logging_pipeline`` (очередь, orjson и запись
+в фоновом потоке). Продюсер пишет пачками событие ``EMAIL_SENT``, рядом
+тикер с периодом 1 мс меряет, насколько позже срока он просыпается, —
+это и есть задержка loop. Приёмник — /dev/null и «медленный пайп», запись
+в который блокирует на ``--sink-latency-us`` (stdout под давлением
+лог-драйвера). Базы и брокера не нужно:
+
+    python -m benchmarks.bench_logging_pipeline --events 50000
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import time
+from typing import Callable, List, Optional, TextIO, Tuple
+
+import structlog
+
+from shared.utils.logging_pipeline import configure_logging, shutdown_logging
+from shared.utils.metrics import LOG_RECORDS_DROPPED
+
+BURST = 100
+TICK = 0.001
+
+
+class SlowSink(io.TextIOBase):
+    """Поток, каждая запись в который блокирует поток на ``latency`` секунд."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency)
+        return len(text)
+
+
+def legacy_setup(stream: TextIO) -> None:
+    """Прежний ``setup_logging`` notification-api в JSON-режиме."""
+    root_logger = logging.getLogger()
+    for root_handler in root_logger.handlers[:]:
+        root_logger.removeHandler(root_handler)
+    root_logger.addHandler(logging.StreamHandler(stream))
+    root_logger.setLevel(logging.INFO)
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
+            structlog.processors.format_exc_info,
+            structlog.processors.JSONRenderer(ensure_ascii=False, indent=None, sort_keys=False),
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+
+def pipeline_setup(stream: TextIO) -> None:
+    configure_logging(level="INFO", json_format=True, stream=stream)
+
+
+async def _ticker(lateness: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK
+        await asyncio.sleep(TICK)
+        lateness.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _produce(count: int) -> float:
+    logger = structlog.get_logger("services.worker.senders")
+    started = time.perf_counter()
+    for index in range(count):
+        logger.info("EMAIL_SENT", to=f"user-{index}@example.com", subject="Новые фильмы недели")
+        if index % BURST == BURST - 1:
+            await asyncio.sleep(0)
+    return time.perf_counter() - started
+
+
+async def run_case(
+    setup: Callable[[TextIO], None], stream: TextIO, count: int
+) -> Tuple[float, float, float, float, int]:
+    setup(stream)
+    dropped_before = LOG_RECORDS_DROPPED._value.get()
+    lateness: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lateness, stop))
+    started = time.perf_counter()
+    loop_time = await _produce(count)
+    stop.set()
+    await ticker
+    shutdown_logging()  # дожидаемся записи всего хвоста очереди
+    total_time = time.perf_counter() - started
+    dropped = int(LOG_RECORDS_DROPPED._value.get() - dropped_before)
+    p99 = statistics.quantiles(lateness, n=100)[98] if len(lateness) > 1 else 0.0
+    return loop_time, total_time, p99, max(lateness, default=0.0), dropped
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--sink-latency-us", type=float, default=20.0)
+    args = parser.parse_args()
+
+    sinks: List[Tuple[str, Callable[[], TextIO]]] = [
+        ("/dev/null", lambda: open(os.devnull, "w")),
+        (f"pipe {args.sink_latency_us:.0f}us/write", lambda: SlowSink(args.sink_latency_us / 1e6)),
+    ]
+    cases = [("sync StreamHandler", legacy_setup), ("queue + orjson", pipeline_setup)]
+    print(
+        f"{'case':<40} {'loop ev/s':>10} {'e2e ev/s':>10} "
+        f"{'stall p99':>10} {'stall max':>10} {'dropped':>8}"
+    )
+    for sink_name, open_sink in sinks:
+        for name, setup in cases:
+            stream: Optional[TextIO] = open_sink()
+            assert stream is not None
+            await run_case(setup, stream, 1000)  # прогрев
+            loop_time, total_time, p99, worst, dropped = await run_case(
+                setup, stream, args.events
+            )
+            print(
+                f"{name + ', ' + sink_name:<40} {args.events / loop_time:>10.0f} "
+                f"{args.events / total_time:>10.0f} {p99 * 1000:>8.2f}ms "
+                f"{worst * 1000:>8.2f}ms {dropped:>8}"
+            )
+            stream.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""Бенчмарк применения квитанций о доставке: по одной против пачек.
+
+В ``notifications`` заводятся ``--notifications`` отправленных уведомлений,
+на каждое приходит квитанция ``delivered`` и на каждое десятое — запоздавшая
+``sent`` (её монотонный переход должен пропустить). "До" — как
+``PATCH /notifications/{id}``: чтение, UPDATE, commit и повторное чтение на
+квитанцию (на выборке ``--sample``); "после" — ``apply_receipts`` воркера
+пачками ``receipts_batch_size``. Нужен Postgres со схемой API (её создаёт
+API при старте или ``bench_content_storage``); строки бенчмарка удаляются:
+
+    POSTGRES_HOST=localhost POSTGRES_PORT=5432 POSTGRES_DB=bench POSTGRES_USER=postgres \\
+        POSTGRES_PASSWORD=bench python -m benchmarks.bench_receipts --notifications 200000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+
+from services.worker.db import AsyncDBSession, engine
+from services.worker.receipts import apply_receipts
+from services.worker.settings import settings
+
+
+async def _seed(template_id: UUID, count: int) -> List[UUID]:
+    async with AsyncDBSession() as session:
+        await session.execute(
+            text(
+                "INSERT INTO notification_templates (id, name, subject, body, notification_type, "
+                "variables, version) VALUES (:id, :name, 'Тема', 'Тело', 'EMAIL', '{}', 1)"
+            ),
+            {"id": template_id, "name": f"bench-receipts-{template_id}"},
+        )
+        result = await session.execute(
+            text(
+                "INSERT INTO notifications (id, user_id, notification_type, status, sent_at, "
+                "template_id, data, is_recurring, priority, created_at) "
+                "SELECT gen_random_uuid(), 'user-' || g, 'EMAIL', 'SENT', now(), :template_id, "
+                "'{}', false, 'normal', now() FROM generate_series(1, :count) AS g RETURNING id"
+            ),
+            {"template_id": template_id, "count": count},
+        )
+        ids = list(result.scalars().all())
+        await session.commit()
+    return ids
+
+
+async def _cleanup(template_id: UUID) -> None:
+    async with AsyncDBSession() as session:
+        await session.execute(
+            text("DELETE FROM notifications WHERE template_id = :id"), {"id": template_id}
+        )
+        await session.execute(
+            text("DELETE FROM notification_templates WHERE id = :id"), {"id": template_id}
+        )
+        await session.commit()
+
+
+def _receipts(ids: List[UUID]) -> List[Dict[str, Any]]:
+    occurred_at = datetime.now(timezone.utc).isoformat()
+    receipts: List[Dict[str, Any]] = []
+    for index, notification_id in enumerate(ids):
+        receipts.append(
+            {"notification_id": str(notification_id), "status": "delivered", "occurred_at": occurred_at}
+        )
+        if index % 10 == 0:
+            receipts.append(
+                {"notification_id": str(notification_id), "status": "sent", "occurred_at": occurred_at}
+            )
+    return receipts
+
+
+async def per_receipt(receipts: List[Dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    async with AsyncDBSession() as session:
+        for receipt in receipts:
+            params = {"id": UUID(receipt["notification_id"])}
+            await session.execute(text("SELECT * FROM notifications WHERE id = :id"), params)
+            await session.execute(
+                text(
+                    "UPDATE notifications SET status = CAST(:status AS deliverystatus), "
+                    "delivered_at = now() WHERE id = :id"
+                ),
+                {**params, "status": receipt["status"].upper()},
+            )
+            await session.commit()
+            await session.execute(text("SELECT * FROM notifications WHERE id = :id"), params)
+    return time.perf_counter() - started
+
+
+async def batched(receipts: List[Dict[str, Any]], batch_size: int) -> float:
+    started = time.perf_counter()
+    async with AsyncDBSession() as session:
+        for start in range(0, len(receipts), batch_size):
+            await apply_receipts(session, receipts[start:start + batch_size])
+            await session.commit()
+    return time.perf_counter() - started
+
+
+async def _delivered(template_id: UUID) -> int:
+    async with AsyncDBSession() as session:
+        result = await session.execute(
+            text(
+                "SELECT count(*) FROM notifications "
+                "WHERE template_id = :id AND status = 'DELIVERED' AND delivered_at IS NOT NULL"
+            ),
+            {"id": template_id},
+        )
+        return int(result.scalar_one())
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notifications", type=int, default=200_000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    template_id = uuid4()
+    try:
+        ids = await _seed(template_id, args.notifications)
+        receipts = _receipts(ids)
+        sample = receipts[: args.sample]
+        print(f"{'case':<28} {'receipts':>10} {'receipts/s':>12}")
+        elapsed = await per_receipt(sample)
+        print(f"{'per receipt (before)':<28} {len(sample):>10} {len(sample) / elapsed:>12.0f}")
+        elapsed = await batched(receipts, settings.receipts_batch_size)
+        print(f"{'batched (after)':<28} {len(receipts):>10} {len(receipts) / elapsed:>12.0f}")
+        print(f"delivered: {await _delivered(template_id)} of {len(ids)}")
+    finally:
+        await _cleanup(template_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""Бенчмарк сериализации списков notification-api: время на 10k строк.
+
+"до" — прежний путь: полные модели с ``body`` и ``data`` в нетипизированном
+``BaseResponse``, ``fastapi.routing.serialize_response`` и ``JSONResponse``,
+как в обработчике запроса; "после" — строки проекции колонок
+в ``Page[NotificationSummary]`` и ``core.responses.page_response``.
+База данных не нужна:
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+from uuid import uuid4
+
+from asyncpg.pgproto.pgproto import UUID as PgUUID
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "services" / "notification_api"))
+
+from core.responses import page_response  # noqa: E402
+from models.base import BaseResponse, Page  # noqa: E402
+from models.delivery import DeliveryStatus, NotificationType  # noqa: E402
+from models.notification import NotificationBase, NotificationSummary  # noqa: E402
+
+BODY = "Здравствуйте! На этой неделе в каталоге появились новинки: " + "https://example.com/movie " * 20
+
+
+def _full_rows(count: int) -> List[NotificationBase]:
+    now = datetime.now(timezone.utc)
+    return [
+        NotificationBase(
+            id=uuid4(),
+            user_id=f"user-{index}",
+            template_id=uuid4(),
+            subject="Новые фильмы недели",
+            body=BODY,
+            notification_type=NotificationType.EMAIL,
+            status=DeliveryStatus.SENT,
+            sent_at=now,
+            data={"movie_ids": list(range(20)), "campaign": "weekly"},
+        )
+        for index in range(count)
+    ]
+
+
+def _summary_rows(count: int) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            # строки проекции приходят от asyncpg с его UUID
+            "id": PgUUID(str(uuid4())),
+            "user_id": f"user-{index}",
+            "template_id": PgUUID(str(uuid4())),
+            "notification_type": NotificationType.EMAIL,
+            "status": DeliveryStatus.SENT,
+            "subject": "Новые фильмы недели",
+            "created_at": now,
+            "sent_at": now,
+            "delivered_at": None,
+            "error_message": None,
+        }
+        for index in range(count)
+    ]
+
+
+async def before(count: int) -> Callable[[], Awaitable[bytes]]:
+    field = create_response_field(name="Response_before", type_=BaseResponse)
+    rows = _full_rows(count)
+
+    async def run() -> bytes:
+        content = BaseResponse(success=True, data=Page(items=rows))
+        value = await serialize_response(field=field, response_content=content, is_coroutine=True)
+        return JSONResponse(value).body
+
+    return run
+
+
+async def after(count: int) -> Callable[[], Awaitable[bytes]]:
+    rows = _summary_rows(count)
+
+    async def run() -> bytes:
+        page = Page[NotificationSummary].model_construct(items=rows, next_cursor=None)
+        return page_response(page).body
+
+    return run
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, case in (("before: full models, json", before), ("after: projection, orjson", after)):
+        run = await case(args.rows)
+        await run()  # прогрев
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            body = await run()
+            timings.append(time.perf_counter() - started)
+        per_10k = min(timings) * 10_000 / args.rows * 1000
+        print(f"{name:<28} {per_10k:>8.1f} ms / 10k rows  {len(body) / args.rows:>6.0f} B/row")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
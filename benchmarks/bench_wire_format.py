@@ -0,0 +1,124 @@
+"""Бенчмарк формата сообщений брокера: CPU на кодирование/разбор и размер.
+
+Сравниваются прежний ``json.dumps(ensure_ascii=False)`` / ``json.loads``,
+JSON через orjson (``content_type=application/json`` после перехода на
+``shared.models.wire``) и msgpack по схеме v1. Сообщения — как их
+публикует API: email с отрендеренным телом, короткие sms и push, а также
+email рассылки по ссылке (``payload_ref``, msgpack по схеме v2).
+Брокер не нужен:
+
+    python -m benchmarks.bench_wire_format --messages 20000
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from shared.models.wire import WireFormat, decode_message, encode_message, payload_ref
+
+EMAIL_BODY = (
+    "<p>Здравствуйте, Анна!</p><p>На этой неделе в каталоге появились новинки, "
+    "которые могут вам понравиться:</p><ul>"
+    + "".join(
+        f'<li><a href="https://cinema.example.com/s/{index:08x}">Фильм недели №{index}</a></li>'
+        for index in range(12)
+    )
+    + "</ul><p>Приятного просмотра!</p>"
+)
+
+
+def _message(notification_type: str, subject: str, body: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "notification_id": str(uuid4()),
+        "user_id": str(uuid4()),
+        "template_id": str(uuid4()),
+        "subject": subject,
+        "body": body,
+        "notification_type": notification_type,
+        "priority": "normal",
+        "data": data,
+    }
+
+
+def _reference_message() -> Dict[str, Any]:
+    template_id = str(uuid4())
+    return {
+        "notification_id": str(uuid4()),
+        "user_id": str(uuid4()),
+        "template_id": template_id,
+        "template_version": 1,
+        "payload_ref": payload_ref(
+            template_id, 1, "Новые фильмы недели", EMAIL_BODY, {"campaign": "weekly"}
+        ),
+        "notification_type": "email",
+        "priority": "normal",
+    }
+
+
+PAYLOADS = {
+    "email": lambda: _message(
+        "email", "Новые фильмы недели", EMAIL_BODY, {"campaign": "weekly", "movie_ids": list(range(12))}
+    ),
+    "sms": lambda: _message(
+        "sms", "Код входа", "Ваш код для входа: 482913. Никому его не сообщайте.", {}
+    ),
+    "push": lambda: _message(
+        "push", "Новая серия", "Вышла 5 серия «Тёмного леса»", {"deeplink": "cinema://series/42/5"}
+    ),
+    "email ref": _reference_message,
+}
+
+Encoder = Callable[[Dict[str, Any]], Tuple[bytes, str]]
+Decoder = Callable[[bytes, str], Dict[str, Any]]
+
+
+def _legacy_encode(message: Dict[str, Any]) -> Tuple[bytes, str]:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8"), "application/json"
+
+
+def _legacy_decode(body: bytes, content_type: str) -> Dict[str, Any]:
+    return json.loads(body.decode("utf-8"))
+
+
+CODECS: List[Tuple[str, Encoder, Decoder]] = [
+    ("json (before)", _legacy_encode, _legacy_decode),
+    ("json, orjson", lambda message: encode_message(message, WireFormat.JSON), decode_message),
+    ("msgpack", lambda message: encode_message(message, WireFormat.MSGPACK), decode_message),
+]
+
+
+def _best(run: Callable[[], None], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'payload':<10} {'codec':<14} {'bytes/msg':>10} {'encode us':>10} {'decode us':>10}")
+    for payload_name, make in PAYLOADS.items():
+        messages = [make() for _ in range(args.messages)]
+        for codec_name, encode, decode in CODECS:
+            encoded = [encode(message) for message in messages]
+            size = sum(len(body) for body, _ in encoded) / len(encoded)
+            encode_time = _best(lambda: [encode(message) for message in messages], args.repeat)
+            decode_time = _best(
+                lambda: [decode(body, content_type) for body, content_type in encoded], args.repeat
+            )
+            print(
+                f"{payload_name:<10} {codec_name:<14} {size:>10.0f} "
+                f"{encode_time / args.messages * 1e6:>10.2f} {decode_time / args.messages * 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import os
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import redis
 import shortuuid
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
 from pydantic import BaseModel
 
 app = FastAPI(title="Link Shortener Service", version="0.1.0")
@@ -12,6 +14,15 @@ app = FastAPI(title="Link Shortener Service", version="0.1.0")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# больше ссылок в одном запросе — весь ответ и конвейер Redis держатся в памяти
+BATCH_MAX_SIZE = int(os.getenv("SHORTEN_BATCH_MAX_SIZE", 1000))
+
+REDIRECT_SECONDS = Histogram(
+    "shortener_redirect_seconds",
+    "Обработка перехода по короткой ссылке",
+    ["result"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
 
 
 class LinkCreate(BaseModel):
@@ -26,6 +37,14 @@ class LinkResponse(BaseModel):
     created_at: datetime
 
 
+class LinkBatchCreate(BaseModel):
+    original_urls: List[str]
+
+
+def _short_url(short_code: str) -> str:
+    return f"http://localhost:8001/{short_code}"
+
+
 @app.get("/")
 async def root() -> dict:
     return {"message": "Link Shortener Service"}
@@ -40,6 +59,12 @@ async def health_check() -> Dict[str, Any]:
         return {"status": "error", "service": "link-shortener", "redis": "disconnected"}
 
 
+# объявлен до /{short_code}, иначе его перехватит редирект
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
 @app.post("/shorten", response_model=LinkResponse)
 async def shorten_link(link_data: LinkCreate) -> Dict[str, Any]:
     # Generate short code
@@ -60,24 +85,56 @@ async def shorten_link(link_data: LinkCreate) -> Dict[str, Any]:
     redis_client.hset(f"link:{short_code}", mapping=link_info)  # type: ignore[arg-type]
     redis_client.sadd("all_links", short_code)  # For tracking all links
 
-    short_url = f"http://localhost:8001/{short_code}"
-
     return LinkResponse(
         short_code=short_code,
         original_url=link_data.original_url,
-        short_url=short_url,
+        short_url=_short_url(short_code),
         created_at=datetime.utcnow(),
     )
 
 
+@app.post("/shorten/batch", response_model=List[LinkResponse])
+async def shorten_links_batch(batch: LinkBatchCreate) -> List[LinkResponse]:
+    """Сокращает много ссылок за один конвейерный запрос к Redis."""
+    if len(batch.original_urls) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Не больше {BATCH_MAX_SIZE} ссылок в пакете"
+        )
+    created_at = datetime.utcnow()
+    responses = []
+    pipeline = redis_client.pipeline(transaction=False)
+    for original_url in batch.original_urls:
+        short_code = shortuuid.uuid()[:8]
+        link_info = {
+            "original_url": original_url,
+            "created_at": created_at.isoformat(),
+            "click_count": 0,
+        }
+        pipeline.hset(f"link:{short_code}", mapping=link_info)  # type: ignore[arg-type]
+        pipeline.sadd("all_links", short_code)
+        responses.append(
+            LinkResponse(
+                short_code=short_code,
+                original_url=original_url,
+                short_url=_short_url(short_code),
+                created_at=created_at,
+            )
+        )
+    pipeline.execute()
+    return responses
+
+
 @app.get("/{short_code}")
 async def redirect_link(short_code: str) -> Dict[Any, Any]:
+    started = time.perf_counter()
     link_data = redis_client.hgetall(f"link:{short_code}")
 
     if not link_data:
+        REDIRECT_SECONDS.labels("not_found").observe(time.perf_counter() - started)
         raise HTTPException(status_code=404, detail="Short link not found")
 
     redis_client.hincrby(f"link:{short_code}", "click_count", 1)
+    REDIRECT_SECONDS.labels("found").observe(time.perf_counter() - started)
 
     original_url = link_data["original_url"]
     return {"redirect": original_url}
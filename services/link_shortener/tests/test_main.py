@@ -69,6 +69,33 @@ class TestLinkShortenerUnit:
         )
         assert response.status_code == 400
 
+    def test_shorten_batch(
+        self, client: TestClient, cleanup_redis: pytest.Fixture
+    ) -> None:
+        """Тест пакетного сокращения URL"""
+        urls = ["https://example1.com", "https://example2.com/page"]
+        response = client.post("/shorten/batch", json={"original_urls": urls})
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["original_url"] for item in data] == urls
+        assert len({item["short_code"] for item in data}) == len(urls)
+
+        # ссылки из пачки доступны так же, как созданные по одной
+        response = client.get(f"/{data[0]['short_code']}")
+        assert response.status_code == 200
+        assert response.json()["redirect"] == urls[0]
+
+    def test_shorten_batch_too_large(
+        self, client: TestClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест: пакет больше SHORTEN_BATCH_MAX_SIZE отклоняется до записи в Redis"""
+        from .. import main
+
+        monkeypatch.setattr(main, "BATCH_MAX_SIZE", 2)
+        urls = ["https://example1.com", "https://example2.com", "https://example3.com"]
+        response = client.post("/shorten/batch", json={"original_urls": urls})
+        assert response.status_code == 413
+
     def test_redirect_nonexistent_link(
         self, client: TestClient, cleanup_redis: pytest.Fixture
     ) -> None:
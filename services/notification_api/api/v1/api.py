@@ -1,56 +1,378 @@
-from typing import List
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Literal, Optional, Tuple, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
+from core.admission import admission_controller
+from core.broker import publish_receipts
+from core.cache import template_cache
+from core.exceptions import (
+    ConflictError,
+    IdempotencyInProgressError,
+    IdempotencyKeyReusedError,
+    NotFoundError,
+)
+from core.idempotency import fingerprint, idempotency_store
+from core.jobs import fanout_executor
+from core.responses import model_response, page_response
 from core.service import NotificationService, get_notification_service
-from models.base import BaseResponse
+from core.settings import settings
+from models.admission import AdmissionDecision, AdmissionStatus
+from models.base import BaseResponse, Page
+from models.inbox import InboxCounters, InboxReadRequest
+from models.job import FanOutJobRead
+from models.receipt import DeliveryReceipt
 from models.notification import (
+    EventResult,
+    NotificationBase,
     NotificationCreate,
     NotificationEvent,
+    NotificationFilter,
+    NotificationSummary,
     NotificationTemplateBase,
+    NotificationTemplateCreate,
 )
 
 router = APIRouter(prefix="/api/v1", tags=["Notification API V1"])
 
+# sync-режим отдаёт созданные уведомления, job-режим — id задания
+SendResult = Union[List[NotificationBase], Dict[str, str]]
 
-@router.post("/notifications/send", status_code=201, response_model=BaseResponse,
-             description="Отправка рассылок",
-             responses={status.HTTP_201_CREATED: {"message": "Successfully sent", "model": BaseResponse}})
+
+def _caller(request: Request) -> str:
+    """Клиент для квот: адрес соединения или X-Client-Id от доверенного шлюза.
+
+    Заголовок от остальных клиентов не учитывается: сменой id квоту можно
+    было бы обнулять.
+    """
+    host = request.client.host if request.client else "unknown"
+    client_id = request.headers.get("x-client-id")
+    if client_id and host in settings.admission_trusted_proxies:
+        return client_id
+    return host
+
+
+def _raise_rejected(decision: AdmissionDecision) -> None:
+    if not decision.admitted:
+        raise HTTPException(
+            status_code=decision.status_code or status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=decision.reason,
+            headers={"Retry-After": str(int(decision.retry_after or 1))},
+        )
+
+
+def _admit(request: Request, notification: NotificationCreate) -> NotificationCreate:
+    """Допуск рассылки; при перегрузке низкий приоритет откладывается."""
+    decision = admission_controller.check(
+        notification.notification_type,
+        notification.priority,
+        _caller(request),
+        admission_controller.cost(notification.recipients),
+    )
+    _raise_rejected(decision)
+    if decision.defer_seconds and not notification.is_recurring:
+        deferred_until = datetime.now(timezone.utc) + timedelta(seconds=decision.defer_seconds)
+        if notification.scheduled_time is None or notification.scheduled_time < deferred_until:
+            # отложенные публикует планировщик воркера, а не этот запрос
+            return notification.model_copy(update={"scheduled_time": deferred_until})
+    return notification
+
+
+async def _idempotent(
+    scope: str,
+    key: Optional[str],
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[Response]],
+) -> Response:
+    try:
+        return await idempotency_store.run(scope, key, request_fingerprint, handler)
+    except IdempotencyKeyReusedError as error:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
+    except IdempotencyInProgressError as error:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=str(error), headers={"Retry-After": "1"}
+        )
+
+
+@contextmanager
+def _client_errors() -> Iterator[None]:
+    """Ошибки запроса из сервиса — в 404 (нет шаблона) или 422, а не в 500."""
+    try:
+        yield
+    except NotFoundError as error:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
+
+
+@router.post("/notifications/send", status_code=201, response_model=BaseResponse[SendResult],
+             description="Отправка рассылок. mode=job ставит рассылку в фон и сразу возвращает 202; "
+                         "рассылка всем (recipients: [\"ALL\"]) всегда идёт заданием. "
+                         "Повтор с тем же Idempotency-Key вернёт первый ответ без новой рассылки",
+             responses={status.HTTP_201_CREATED: {"message": "Successfully sent", "model": BaseResponse},
+                        status.HTTP_202_ACCEPTED: {"message": "Accepted", "model": BaseResponse}})
 async def send_notification(
     notification: NotificationCreate,
+    request: Request,
+    mode: Literal["sync", "job"] = "sync",
+    idempotency_key: Optional[str] = Header(None),
+    service: NotificationService = Depends(get_notification_service),
+) -> Response:
+    async def handle() -> Response:
+        admitted = _admit(request, notification)
+        # ответ sync-режима перечисляет все уведомления — для "всем" только задание
+        if mode == "job" or admitted.is_broadcast:
+            with _client_errors():
+                job = await service.create_fanout_job(admitted)
+            fanout_executor.submit(job.id)
+            return model_response(
+                BaseResponse[SendResult],
+                BaseResponse(success=True, message="Accepted", data={"job_id": str(job.id)}),
+                status_code=status.HTTP_202_ACCEPTED,
+                headers={"Location": f"{router.prefix}/jobs/{job.id}"},
+            )
+        with _client_errors():
+            created = await service.send_notification(admitted)
+        return model_response(
+            BaseResponse[SendResult],
+            BaseResponse(success=True, message="Successfully sent", data=created),
+            status_code=status.HTTP_201_CREATED,
+        )
+
+    request_fingerprint = fingerprint(mode, notification.model_dump_json())
+    return await _idempotent("send", idempotency_key, request_fingerprint, handle)
+
+
+@router.post("/notifications/send/bulk", status_code=201, response_model=BaseResponse[Dict[str, int]],
+             description="Массовая отправка рассылок пачками",
+             responses={status.HTTP_201_CREATED: {"message": "Successfully sent", "model": BaseResponse}})
+async def send_notification_bulk(
+    notification: NotificationCreate,
+    request: Request,
     service: NotificationService = Depends(get_notification_service),
 ) -> BaseResponse:
-    created = await service.send_notification(notification)
-    return BaseResponse(success=True, message="Successfully sent", data=created)
+    result = await service.send_notification_bulk(_admit(request, notification))
+    return BaseResponse(success=True, message="Successfully sent", data=result)
 
 
-@router.post("/notifications/events", status_code=201, response_model=BaseResponse,
-             description="Прием событий",
+@router.post("/notifications/events", status_code=201, response_model=BaseResponse[Dict[str, List[str]]],
+             description="Прием событий. Повтор с тем же Idempotency-Key вернёт первый ответ",
              responses={status.HTTP_201_CREATED: {"message": "Successfully sent", "model": BaseResponse}})
 async def send_event(
     event: NotificationEvent,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    service: NotificationService = Depends(get_notification_service),
+) -> Response:
+    async def handle() -> Response:
+        _raise_rejected(admission_controller.check_caller(_caller(request), 1))
+        result = await service.process_event(event)
+        for job_id in result.get("jobs", []):
+            fanout_executor.submit(UUID(job_id))
+        return model_response(
+            BaseResponse[Dict[str, List[str]]],
+            BaseResponse(success=True, message="Successfully sent", data=result),
+            status_code=status.HTTP_201_CREATED,
+        )
+
+    return await _idempotent("events", idempotency_key, fingerprint(event.model_dump_json()), handle)
+
+
+def _parse_events(
+    body: bytes, content_type: str
+) -> Tuple[List[Tuple[int, NotificationEvent]], List[EventResult]]:
+    """Разбирает пакет событий: JSON-массив или NDJSON (по событию на строку).
+
+    Ошибка в одном событии не отклоняет весь пакет, а попадает в его результат.
+    """
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        items: List[Any] = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except orjson.JSONDecodeError as error:
+                items.append(error)
+    else:
+        try:
+            items = orjson.loads(body)
+        except orjson.JSONDecodeError as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ожидается массив событий")
+    if len(items) > settings.events_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не больше {settings.events_batch_max_size} событий в пакете",
+        )
+
+    events: List[Tuple[int, NotificationEvent]] = []
+    errors: List[EventResult] = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise ValueError(str(item))
+            events.append((index, NotificationEvent.model_validate(item)))
+        except ValueError as error:
+            errors.append(EventResult(index=index, success=False, error=str(error)))
+    return events, errors
+
+
+@router.post("/notifications/events/batch", response_model=BaseResponse[List[EventResult]],
+             description="Пакетный приём событий: JSON-массив или NDJSON (Content-Type: application/x-ndjson). "
+                         "Результат — по каждому событию в порядке следования")
+async def send_events_batch(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    service: NotificationService = Depends(get_notification_service),
+) -> Response:
+    body = await request.body()
+
+    async def handle() -> Response:
+        events, results = _parse_events(body, request.headers.get("content-type", ""))
+        _raise_rejected(admission_controller.check_caller(_caller(request), len(events)))
+        processed = await service.process_events([event for _, event in events])
+        for (index, _), result in zip(events, processed):
+            result.index = index
+            if result.job_id is not None:
+                fanout_executor.submit(result.job_id)
+        results = sorted(results + processed, key=lambda result: result.index)
+        failed = sum(not result.success for result in results)
+        return model_response(
+            BaseResponse[List[EventResult]],
+            BaseResponse(
+                success=failed == 0,
+                message=f"Обработано событий: {len(results)}, с ошибкой: {failed}",
+                data=results,
+            ),
+        )
+
+    request_fingerprint = fingerprint(body.decode(errors="replace"))
+    return await _idempotent("events:batch", idempotency_key, request_fingerprint, handle)
+
+
+@router.post("/notifications/receipts", status_code=202, response_model=BaseResponse[Dict[str, int]],
+             description="Квитанции провайдеров о доставке. Применяются воркером пачками; "
+                         "статус уведомления только растёт: sent → failed → delivered")
+async def ingest_receipts(receipts: List[DeliveryReceipt]) -> BaseResponse:
+    if len(receipts) > settings.receipts_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не больше {settings.receipts_batch_max_size} квитанций в запросе",
+        )
+    try:
+        messages = await publish_receipts(receipts)
+    except Exception as error:
+        # провайдер повторит отправку позже
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error), headers={"Retry-After": "5"}
+        )
+    return BaseResponse(success=True, message="Accepted", data={"accepted": len(receipts), "messages": messages})
+
+
+@router.get("/jobs/{job_id}", response_model=BaseResponse[FanOutJobRead],
+            description="Прогресс фонового задания рассылки")
+async def get_job(
+    job_id: UUID,
     service: NotificationService = Depends(get_notification_service),
 ) -> BaseResponse:
-    result = await service.process_event(event)
-    return BaseResponse(success=True, message="Successfully sent", data=result)
+    try:
+        job = await service.get_fanout_job(job_id)
+        return BaseResponse(success=True, data=job)
+    except Exception as error:
+        return BaseResponse(success=False, message=str(error))
+
+
+@router.get("/admission/status", response_model=BaseResponse[AdmissionStatus],
+            description="Состояние допуска: глубина и скорость разбора полос очередей, квоты каналов")
+async def admission_status() -> BaseResponse:
+    return BaseResponse(success=True, data=admission_controller.status())
 
 
 # --- выдача пользователю его уведомлений ---
-@router.get("/users/{user_id}/notifications", response_model=BaseResponse,
-            description="Получить уведомления пользователя")
+@router.get("/users/{user_id}/notifications", response_model=BaseResponse[Page[NotificationSummary]],
+            description="Получить уведомления пользователя (keyset-пагинация, новые первыми)")
 async def user_notifications(
+    user_id: str,
+    filters: NotificationFilter = Depends(),
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    service: NotificationService = Depends(get_notification_service),
+) -> Response:
+    try:
+        page = await service.get_user_notifications(user_id, filters, limit, cursor)
+        return page_response(page)
+    except ValueError as error:
+        return BaseResponse(success=False, message=str(error))
+
+
+@router.get("/users/{user_id}/inbox", response_model=BaseResponse[Page[NotificationSummary]],
+            description="Входящие пользователя: доставленные уведомления без pending "
+                        "из кэша Redis (keyset-пагинация, новые первыми)")
+async def user_inbox(
+    user_id: str,
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    service: NotificationService = Depends(get_notification_service),
+) -> Response:
+    try:
+        page = await service.get_inbox(user_id, limit, cursor)
+        return page_response(page)
+    except ValueError as error:
+        return BaseResponse(success=False, message=str(error))
+
+
+@router.get("/users/{user_id}/notifications/unread", response_model=BaseResponse[InboxCounters],
+            description="Число непрочитанных уведомлений пользователя")
+async def user_unread_count(
     user_id: str,
     service: NotificationService = Depends(get_notification_service),
 ) -> BaseResponse:
-    items = await service.get_user_notifications(user_id)
-    return BaseResponse(success=True, data=items)
+    unread = await service.get_unread_count(user_id)
+    return BaseResponse(success=True, data=InboxCounters(unread=unread))
+
+
+@router.post("/users/{user_id}/notifications/read", response_model=BaseResponse[InboxCounters],
+             description="Отметить уведомления пользователя прочитанными; "
+                         "без notification_ids — все")
+async def mark_notifications_read(
+    user_id: str,
+    read: InboxReadRequest,
+    service: NotificationService = Depends(get_notification_service),
+) -> BaseResponse:
+    notification_ids = read.notification_ids
+    if notification_ids is not None and len(notification_ids) > settings.inbox_mark_read_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не больше {settings.inbox_mark_read_max_ids} уведомлений в отметке",
+        )
+    counters = await service.mark_read(user_id, notification_ids)
+    return BaseResponse(success=True, data=counters)
+
+
+# выгрузка объявлена до /notifications/{notification_id}, иначе "export" разберётся как id
+@router.get("/notifications/export", response_class=StreamingResponse,
+            description="Потоковая выгрузка уведомлений в NDJSON")
+async def export_notifications(
+    filters: NotificationFilter = Depends(),
+    user_id: Optional[str] = None,
+    service: NotificationService = Depends(get_notification_service),
+) -> StreamingResponse:
+    return StreamingResponse(
+        service.export_notifications(filters, user_id),
+        media_type="application/x-ndjson",
+    )
 
 
 # CRUD: Получить уведомление по id
 @router.get(
     "/notifications/{notification_id}",
-    response_model=BaseResponse,
+    response_model=BaseResponse[NotificationBase],
     description="Получить уведомление по id",
 )
 async def get_notification(
@@ -67,20 +389,26 @@ async def get_notification(
 # CRUD: Получить все уведомления
 @router.get(
     "/notifications",
-    response_model=BaseResponse,
-    description="Получить все уведомления",
+    response_model=BaseResponse[Page[NotificationSummary]],
+    description="Получить уведомления (keyset-пагинация, новые первыми)",
 )
 async def list_notifications(
+    filters: NotificationFilter = Depends(),
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
     service: NotificationService = Depends(get_notification_service),
-) -> BaseResponse:
-    notifications = await service.list_notifications()
-    return BaseResponse(success=True, data=notifications)
+) -> Response:
+    try:
+        page = await service.list_notifications(filters, limit, cursor)
+        return page_response(page)
+    except ValueError as error:
+        return BaseResponse(success=False, message=str(error))
 
 
 # CRUD: Обновить уведомление
 @router.patch(
     "/notifications/{notification_id}",
-    response_model=BaseResponse,
+    response_model=BaseResponse[NotificationBase],
     description="Обновить уведомление по id",
 )
 async def update_notification(
@@ -112,10 +440,19 @@ async def delete_notification(
         return BaseResponse(success=False, message=str(error))
 
 
+@router.get(
+    "/templates/cache/stats",
+    response_model=BaseResponse[Dict[str, int]],
+    description="Счётчики попаданий и промахов кэша шаблонов",
+)
+async def template_cache_stats() -> BaseResponse:
+    return BaseResponse(success=True, data=template_cache.stats())
+
+
 # CRUD: Получить шаблон по id
 @router.get(
     "/templates/{template_id}",
-    response_model=BaseResponse,
+    response_model=BaseResponse[NotificationTemplateBase],
     description="Получить шаблон по id",
 )
 async def get_template(
@@ -132,7 +469,7 @@ async def get_template(
 # CRUD: Обновить шаблон
 @router.patch(
     "/templates/{template_id}",
-    response_model=BaseResponse,
+    response_model=BaseResponse[NotificationTemplateBase],
     description="Обновить шаблон по id",
 )
 async def update_template(
@@ -186,11 +523,32 @@ async def get_templates(
         },
     },
     status_code=201,
-    response_model=BaseResponse,
+    response_model=BaseResponse[NotificationTemplateBase],
 )
 async def create_template(
     template: NotificationTemplateBase,
     service: NotificationService = Depends(get_notification_service),
 ) -> BaseResponse:
-    created = await service.create_template(template)
+    try:
+        created = await service.create_template(template)
+    except ConflictError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
     return BaseResponse(success=True, message="Successfully sent", data=created)
+
+
+@router.post(
+    "/templates/import",
+    description="Массовый импорт шаблонов: новые создаются, существующие по имени обновляются",
+    status_code=200,
+    response_model=BaseResponse[Dict[str, Any]],
+)
+async def import_templates(
+    templates: List[NotificationTemplateCreate],
+    service: NotificationService = Depends(get_notification_service),
+) -> BaseResponse:
+    template_ids = await service.import_templates(templates)
+    return BaseResponse(
+        success=True,
+        message="Successfully imported",
+        data={"count": len(template_ids), "ids": [str(template_id) for template_id in template_ids]},
+    )
@@ -0,0 +1,218 @@
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import text
+
+from core.broker import published_counts, publisher
+from core.cache import TTLCache
+from core.db import AsyncDBSession
+from core.settings import settings
+from models.admission import AdmissionDecision, AdmissionStatus, ChannelState, LaneState
+from models.delivery import NotificationType, PriorityLevel, QueueName
+from shared.broker.admission import LaneMonitor, TokenBucket, recipients_cost
+from shared.broker.lanes import PRIORITY_LANES, lane_queue
+
+logger = structlog.get_logger(__name__)
+
+CHANNEL_QUEUES: Dict[NotificationType, QueueName] = {
+    NotificationType.EMAIL: QueueName.EMAIL,
+    NotificationType.SMS: QueueName.SMS,
+    NotificationType.PUSH: QueueName.PUSH,
+    NotificationType.INSTANT: QueueName.INSTANT,
+}
+
+class AdmissionController:
+    """Приём рассылок с учётом очередей RabbitMQ.
+
+    Фоновый цикл раз в ``admission_poll_seconds`` замеряет глубину и число
+    консьюмеров каждой полосы каждого канала. Запрос проходит три проверки:
+    квоту вызывающего (token bucket на клиента), насыщенность целевой полосы
+    и квоту канала; квоты списываются, только если пройдены все. Квоты
+    считаются в сообщениях и действуют в пределах одного инстанса API.
+    Клиентов отслеживается не больше ``admission_max_tracked_callers``: пока
+    таблица полна, новые клиенты делят одну общую корзину, а не вытесняют
+    чужие — вытеснение обнуляло бы квоту.
+    """
+
+    def __init__(self) -> None:
+        self.channels: Dict[NotificationType, TokenBucket] = {
+            channel: TokenBucket(settings.admission_channel_rate, settings.admission_channel_burst)
+            for channel in CHANNEL_QUEUES
+        }
+        self.callers: TTLCache[TokenBucket] = TTLCache(
+            maxsize=settings.admission_max_tracked_callers,
+            ttl=settings.admission_caller_idle_seconds,
+        )
+        self.overflow_caller = self._new_caller_bucket()
+        self.lanes: Dict[Tuple[NotificationType, PriorityLevel], LaneMonitor] = {
+            (channel, level): LaneMonitor(
+                lane_queue(queue.value, level),
+                level.value,
+                max_depth=settings.admission_max_queue_depth,
+                max_wait=settings.admission_max_wait_seconds,
+            )
+            for channel, queue in CHANNEL_QUEUES.items()
+            for level in PRIORITY_LANES
+        }
+        # оценка числа получателей рассылки "всем"; до первого замера —
+        # полная корзина канала, дороже квоты всё равно не списать
+        self.broadcast_size = settings.admission_channel_burst
+        self.updated_at: Optional[float] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def cost(self, recipients: List[str]) -> int:
+        """Стоимость рассылки в сообщениях; "всем" — по оценке числа получателей."""
+        return recipients_cost(recipients, self.broadcast_size)
+
+    def check(
+        self,
+        channel: NotificationType,
+        priority: PriorityLevel,
+        caller: str,
+        cost: int,
+    ) -> AdmissionDecision:
+        if not settings.admission_enabled:
+            return AdmissionDecision()
+        bucket = self._caller_bucket(caller)
+        caller_wait = bucket.wait(cost)
+        if caller_wait:
+            return _reject(429, caller_wait, "Превышена квота клиента")
+
+        lane = self.lanes[(channel, priority)]
+        if lane.saturated:
+            retry_after = min(
+                lane.estimated_wait_seconds or settings.admission_max_wait_seconds,
+                settings.admission_max_defer_seconds,
+            )
+            if priority == PriorityLevel.LOW:
+                # низкий приоритет не отклоняем, а откладываем через планировщик воркера
+                bucket.take(cost)
+                return AdmissionDecision(defer_seconds=retry_after, reason="Канал перегружен")
+            return _reject(503, retry_after, f"Очередь {lane.queue} перегружена")
+
+        # срочные не упираются в квоту канала, чтобы не ждать за массовыми рассылками
+        if priority != PriorityLevel.URGENT:
+            channel_bucket = self.channels[channel]
+            channel_wait = channel_bucket.wait(cost)
+            if channel_wait:
+                return _reject(429, channel_wait, f"Превышена квота канала {channel.value}")
+            channel_bucket.take(cost)
+        bucket.take(cost)
+        return AdmissionDecision()
+
+    def check_caller(self, caller: str, cost: int) -> AdmissionDecision:
+        """Только квота вызывающего — для запросов, где канал ещё неизвестен."""
+        if not settings.admission_enabled:
+            return AdmissionDecision()
+        caller_wait = self._caller_bucket(caller).take(cost)
+        if caller_wait:
+            return _reject(429, caller_wait, "Превышена квота клиента")
+        return AdmissionDecision()
+
+    def _caller_bucket(self, caller: str) -> TokenBucket:
+        bucket = self.callers.get(caller)
+        if bucket is None:
+            if len(self.callers) >= self.callers.maxsize:
+                self.callers.expire()
+            if len(self.callers) >= self.callers.maxsize:
+                return self.overflow_caller
+            bucket = self._new_caller_bucket()
+        # set продлевает TTL: активный клиент сохраняет свою корзину
+        self.callers.set(caller, bucket)
+        return bucket
+
+    def _new_caller_bucket(self) -> TokenBucket:
+        return TokenBucket(settings.admission_caller_rate, settings.admission_caller_burst)
+
+    def status(self) -> AdmissionStatus:
+        channels: Dict[str, ChannelState] = {}
+        for channel, bucket in self.channels.items():
+            channels[channel.value] = ChannelState(
+                tokens=round(bucket.level(), 2),
+                rate=bucket.rate,
+                burst=bucket.capacity,
+                lanes=[
+                    LaneState(**self.lanes[(channel, level)].snapshot()) for level in PRIORITY_LANES
+                ],
+            )
+        return AdmissionStatus(
+            enabled=settings.admission_enabled,
+            updated_at=self.updated_at,
+            channels=channels,
+            tracked_callers=len(self.callers),
+        )
+
+    def start(self) -> None:
+        if settings.admission_enabled:
+            self._tasks = [
+                asyncio.create_task(self._monitor()),
+                asyncio.create_task(self._estimate_recipients()),
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _monitor(self) -> None:
+        while True:
+            try:
+                connection = await publisher.connect()
+                channel = await connection.channel()
+                try:
+                    while True:
+                        for monitor in self.lanes.values():
+                            # объявление идемпотентно: те же durable-параметры, что у консьюмеров
+                            queue = await channel.declare_queue(monitor.state.queue, durable=True)
+                            result = queue.declaration_result
+                            monitor.update(
+                                result.message_count,
+                                result.consumer_count,
+                                published_counts[monitor.queue],
+                            )
+                        self.updated_at = time.time()
+                        await asyncio.sleep(settings.admission_poll_seconds)
+                finally:
+                    await channel.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("ADMISSION_MONITOR_ERROR", error=str(error))
+                await asyncio.sleep(settings.admission_poll_seconds)
+
+    async def _estimate_recipients(self) -> None:
+        while True:
+            try:
+                async with AsyncDBSession() as session:
+                    estimate = (await session.execute(RECIPIENTS_ESTIMATE)).scalar()
+                if estimate is not None:
+                    self.broadcast_size = int(estimate)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("ADMISSION_ESTIMATE_ERROR", error=str(error))
+            await asyncio.sleep(settings.admission_recipients_estimate_seconds)
+
+
+# оценка из статистики планировщика без полного прохода по таблице;
+# до первого ANALYZE (reltuples = -1) — точный count
+RECIPIENTS_ESTIMATE = text(
+    "SELECT CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint "
+    "ELSE (SELECT count(*) FROM recipients) END "
+    "FROM pg_class AS c WHERE c.oid = to_regclass('recipients')"
+)
+
+
+def _reject(status_code: int, retry_after: float, reason: str) -> AdmissionDecision:
+    return AdmissionDecision(
+        admitted=False,
+        status_code=status_code,
+        retry_after=max(1.0, math.ceil(retry_after)),
+        reason=reason,
+    )
+
+
+admission_controller = AdmissionController()
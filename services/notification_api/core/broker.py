@@ -1,10 +1,13 @@
-import json
-from typing import Any, Dict
-
-import aio_pika
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Sequence
 
 from core.settings import settings
-from models.delivery import QueueName
+from models.delivery import PriorityLevel, QueueName
+from models.receipt import DeliveryReceipt
+from shared.broker.lanes import lane_queue
+from shared.broker.publisher import AmqpPublisher
+from shared.broker.receipts import RECEIPTS_CONTENT_TYPE, RECEIPTS_QUEUE, encode_receipts
+from shared.models.wire import WireFormat, encode_message
 
 
 def _amqp_url() -> str:
@@ -14,19 +17,52 @@ def _amqp_url() -> str:
     )
 
 
-async def publish_message(queue_name: QueueName, message: Dict[str, Any]) -> None:
-    connection = await aio_pika.connect_robust(_amqp_url())
-    try:
-        channel = await connection.channel()
-        # гарантируем durable очередь
-        queue = await channel.declare_queue(queue_name.value, durable=True)
-        await channel.default_exchange.publish(
-            aio_pika.Message(
-                body=json.dumps(message, ensure_ascii=False).encode("utf-8"),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-                content_type="application/json",
-            ),
-            routing_key=queue.name,
+# поставлено этим процессом в очереди (через outbox): приток для оценки скорости разбора
+published_counts: "Counter[str]" = Counter()
+
+wire_format = WireFormat(settings.rabbitmq_wire_format)
+
+# одно соединение и пул каналов на процесс API: публикует relay воркера,
+# здесь соединение нужно для замеров очередей
+publisher = AmqpPublisher(
+    _amqp_url(),
+    channel_pool_size=settings.rabbitmq_channel_pool_size,
+    batch_size=settings.rabbitmq_publish_batch_size,
+    wire_format=wire_format,
+)
+
+
+def outbox_rows(
+    queue_name: QueueName,
+    messages: Iterable[Dict[str, Any]],
+    priority: PriorityLevel = PriorityLevel.NORMAL,
+) -> List[Dict[str, Any]]:
+    """Строки ``notification_outbox``: сообщения, закодированные для полосы ``priority``."""
+    queue = lane_queue(queue_name.value, priority)
+    rows = []
+    for message in messages:
+        body, content_type = encode_message(message, wire_format)
+        rows.append({"queue": queue, "body": body, "content_type": content_type})
+    published_counts[queue] += len(rows)
+    return rows
+
+
+async def publish_receipts(receipts: Sequence[DeliveryReceipt]) -> int:
+    """Публикует квитанции сообщениями по ``receipts_message_size``, вернёт число сообщений.
+
+    Квитанции не связаны с записью в БД API, поэтому идут в брокер напрямую,
+    минуя outbox: ответ провайдеру уходит после подтверждения брокера.
+    """
+    size = settings.receipts_message_size
+    bodies = (
+        (
+            encode_receipts([receipt.model_dump(mode="json") for receipt in receipts[start:start + size]]),
+            RECEIPTS_CONTENT_TYPE,
         )
-    finally:
-        await connection.close()
+        for start in range(0, len(receipts), size)
+    )
+    return await publisher.publish_encoded(RECEIPTS_QUEUE, bodies)
+
+
+async def close_broker() -> None:
+    await publisher.close()
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Optional
+from uuid import UUID
+
+import asyncpg
+import structlog
+
+from core.settings import settings
+from models.notification import NotificationTemplateBase
+from shared.utils.cache import TemplateCache, TTLCache
+
+logger = structlog.get_logger(__name__)
+
+# канал Postgres LISTEN/NOTIFY для сброса кэша шаблонов на всех инстансах
+TEMPLATE_INVALIDATION_CHANNEL = "notification_templates_invalidation"
+
+
+class TemplateInvalidationListener:
+    """Слушает NOTIFY об изменении шаблонов от других инстансов API."""
+
+    def __init__(self, cache: TemplateCache[NotificationTemplateBase]) -> None:
+        self.cache = cache
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            self.cache.invalidate(UUID(payload))
+        except ValueError:
+            self.cache.clear()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    host=settings.postgres_host,
+                    port=int(settings.postgres_port),
+                    user=settings.postgres_user,
+                    password=settings.postgres_password,
+                    database=settings.postgres_db,
+                )
+            except Exception as error:
+                logger.warning("TEMPLATE_CACHE_LISTEN_ERROR", error=str(error))
+                await asyncio.sleep(5)
+                continue
+            try:
+                # пока слушателя не было, инвалидации могли потеряться
+                self.cache.clear()
+                await connection.add_listener(TEMPLATE_INVALIDATION_CHANNEL, self._on_notify)
+                while not connection.is_closed():
+                    await asyncio.sleep(5)
+            finally:
+                await connection.close()
+            logger.warning("TEMPLATE_CACHE_LISTEN_LOST")
+
+
+template_cache: TemplateCache[NotificationTemplateBase] = TemplateCache(
+    maxsize=settings.template_cache_size,
+    ttl=settings.template_cache_ttl_seconds,
+    snapshot=NotificationTemplateBase.model_validate,
+)
+template_invalidation_listener = TemplateInvalidationListener(template_cache)
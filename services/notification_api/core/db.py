@@ -1,11 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, AsyncGenerator, Dict, List, Optional
 from uuid import UUID, uuid4
 
+from core.partitions import convert_legacy_table, ensure_partitions
+from core.replica import ReplicaMonitor, read_after
 from core.settings import settings
-from models.delivery import DeliveryStatus, NotificationType
+from models.delivery import DeliveryStatus, JobStatus, NotificationType, PriorityLevel
 from models.notification import NotificationBase, NotificationTemplateBase
-from sqlalchemy import ARRAY, Column, DateTime, String
+from shared.utils.db_pool import TimedQueuePool
+from shared.broker.outbox import OUTBOX_TABLE
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    Column,
+    DateTime,
+    Enum as sa_Enum,
+    Identity,
+    Index,
+    LargeBinary,
+    String,
+    func,
+    text,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -15,6 +31,7 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.ext.mutable import MutableDict, MutableList
 from sqlmodel import Field, Relationship, SQLModel
+from starlette.requests import Request
 
 
 class NotificationTemplate(
@@ -23,13 +40,15 @@ class NotificationTemplate(
     __tablename__ = "notification_templates"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    name: str = Field(index=True, nullable=False)
+    # уникальность имени обеспечивает индекс notification_templates_name_key
+    name: str = Field(unique=True, nullable=False)
     subject: str = Field(nullable=False)
     body: str = Field(nullable=False)
     notification_type: NotificationType = Field(nullable=False)
     variables: List[str] = Field(
         default_factory=list, sa_type=MutableList.as_mutable(ARRAY(String))
     )
+    version: int = Field(default=1, nullable=False)
 
     notifications: List["Notification"] = Relationship(back_populates="template")
 
@@ -38,9 +57,12 @@ class Notification(NotificationBase, table=True):  # type: ignore[call-arg]
     __tablename__ = "notifications"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: str = Field(index=True, nullable=False)
-    subject: str = Field(nullable=False)
-    body: str = Field(nullable=False)
+    user_id: str = Field(nullable=False)
+    # пусты, если содержимое в message_payloads по payload_ref
+    subject: Optional[str] = Field(default=None)  # type: ignore[assignment]
+    body: Optional[str] = Field(default=None)  # type: ignore[assignment]
+    # без внешнего ключа: проверка ссылки на каждой строке замедлила бы массовый INSERT
+    payload_ref: Optional[str] = Field(default=None)
     notification_type: NotificationType = Field(nullable=False)
     status: DeliveryStatus = Field(default=DeliveryStatus.PENDING)
     sent_at: Optional[datetime] = Field(
@@ -49,9 +71,14 @@ class Notification(NotificationBase, table=True):  # type: ignore[call-arg]
     delivered_at: Optional[datetime] = Field(
         default=None, sa_column=Column(DateTime(timezone=True))
     )
+    # отметка пользователя о прочтении; счётчики непрочитанных — во входящих Redis
+    read_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
     template_id: UUID = Field(foreign_key="notification_templates.id", nullable=False)
 
     template: NotificationTemplate = Relationship(back_populates="notifications")
+    # при payload_ref — только data получателя поверх общей
     data: Dict[str, Any] = Field(
         default_factory=dict,
         sa_type=MutableDict.as_mutable(JSONB),
@@ -62,6 +89,183 @@ class Notification(NotificationBase, table=True):  # type: ignore[call-arg]
     )
     is_recurring: bool = Field(default=False)
     recurrence_pattern: Optional[str] = Field(default=None)
+    # строкой со значением уровня: по нему полосу выбирает и планировщик воркера
+    priority: PriorityLevel = Field(
+        default=PriorityLevel.NORMAL,
+        sa_column=Column(
+            sa_Enum(
+                PriorityLevel,
+                native_enum=False,
+                length=16,
+                values_callable=lambda levels: [level.value for level in levels],
+            ),
+            nullable=False,
+            server_default=PriorityLevel.NORMAL.value,
+        ),
+    )
+
+    # ключ keyset-пагинации и секционирования (см. core.partitions): входит в PK,
+    # т.к. уникальность в секционированной таблице проверяется внутри секции;
+    # server_default нужен массовым INSERT в обход ORM
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(
+            DateTime(timezone=True),
+            primary_key=True,
+            nullable=False,
+            server_default=func.now(),
+        ),
+    )
+
+    __table_args__ = (
+        Index("ix_notifications_created_at_id", "created_at", "id"),
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+        # скан планировщика воркера: только ждущие отправки отложенные
+        Index(
+            "ix_notifications_due",
+            "scheduled_time",
+            postgresql_where=text(
+                "status = 'PENDING' AND scheduled_time IS NOT NULL"
+            ),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class FanOutJob(SQLModel, table=True):  # type: ignore[call-arg]
+    """Фоновое задание массовой рассылки и его счётчики прогресса."""
+
+    __tablename__ = "fanout_jobs"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    status: JobStatus = Field(default=JobStatus.QUEUED, nullable=False)
+    request: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
+    queued: int = Field(default=0)
+    published: int = Field(default=0)
+    failed: int = Field(default=0)
+    error_message: Optional[str] = Field(default=None)
+    # процесс, выполняющий задание: чекпоинты пишет только он
+    owner: Optional[str] = Field(default=None)
+    # чекпоинты: ключ последнего записанного и последнего опубликованного получателя
+    cursor: Optional[str] = Field(default=None)
+    published_cursor: Optional[str] = Field(default=None)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+    )
+    started_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+    finished_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+    heartbeat_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+
+
+class IdempotencyKey(SQLModel, table=True):  # type: ignore[call-arg]
+    """Ответ на запрос с заголовком Idempotency-Key.
+
+    Пока ``status_code`` пуст, запрос выполняется; ``expires_at`` у такой
+    записи — аренда владельца ``owner``, которую он продлевает, пока жив.
+    После её истечения ключ может забрать повтор.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    scope: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    fingerprint: str = Field(nullable=False)
+    owner: Optional[str] = Field(default=None)
+    status_code: Optional[int] = Field(default=None)
+    body: Optional[str] = Field(default=None)
+    headers: Dict[str, str] = Field(default_factory=dict, sa_type=JSONB)
+    expires_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False, index=True)
+    )
+
+
+class MessagePayload(SQLModel, table=True):  # type: ignore[call-arg]
+    """Общая часть сообщений рассылки: тема, тело и data.
+
+    Ключ ``ref`` — sha256 содержимого, поэтому одна строка обслуживает всю
+    рассылку, а повтор того же текста переиспользует её. На строку ссылаются
+    уведомления (``Notification.payload_ref``) и сообщения в брокере в режиме
+    ссылок.
+    """
+
+    __tablename__ = "message_payloads"
+
+    ref: str = Field(primary_key=True)
+    template_id: UUID = Field(nullable=False)
+    template_version: int = Field(nullable=False)
+    subject: str = Field(nullable=False)
+    body: str = Field(nullable=False)
+    data: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, server_default=func.now()
+        ),
+    )
+
+
+class OutboxMessage(SQLModel, table=True):  # type: ignore[call-arg]
+    """Сообщение для RabbitMQ, записанное в одной транзакции с уведомлениями.
+
+    Тело уже закодировано в формате ``rabbitmq_wire_format``; публикует и
+    удаляет строку relay воркера (см. ``shared.broker.outbox``).
+    """
+
+    __tablename__ = OUTBOX_TABLE
+
+    id: Optional[int] = Field(
+        default=None, sa_column=Column(BigInteger, Identity(), primary_key=True)
+    )
+    # имя очереди полосы приоритета, как для AmqpPublisher
+    queue: str = Field(nullable=False)
+    body: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    content_type: str = Field(nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, server_default=func.now()
+        ),
+    )
+
+
+# create_all не меняет существующие таблицы: идемпотентные доработки схемы
+SCHEMA_UPGRADES: List[str] = [
+    "ALTER TABLE fanout_jobs ADD COLUMN IF NOT EXISTS cursor VARCHAR",
+    "ALTER TABLE fanout_jobs ADD COLUMN IF NOT EXISTS published_cursor VARCHAR",
+    "ALTER TABLE fanout_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE",
+    # имя шаблона было неуникальным индексом: заменяем на уникальный.
+    # Дубли имён до этого были возможны: все, кроме первого по id, переименовываем
+    # в "<имя>-<id>"; уведомления ссылаются на id и не меняются
+    "UPDATE notification_templates AS t SET name = t.name || '-' || t.id "
+    "FROM (SELECT id, row_number() OVER (PARTITION BY name ORDER BY id) AS n "
+    "FROM notification_templates) AS d WHERE t.id = d.id AND d.n > 1",
+    "CREATE UNIQUE INDEX IF NOT EXISTS notification_templates_name_key "
+    "ON notification_templates (name)",
+    "DROP INDEX IF EXISTS ix_notification_templates_name",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS created_at "
+    "TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_notifications_created_at_id "
+    "ON notifications (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_created_at_id "
+    "ON notifications (user_id, created_at, id)",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS priority "
+    "VARCHAR(16) NOT NULL DEFAULT 'normal'",
+    "ALTER TABLE notification_templates ADD COLUMN IF NOT EXISTS version "
+    "INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS payload_ref VARCHAR",
+    "ALTER TABLE notifications ALTER COLUMN subject DROP NOT NULL",
+    "ALTER TABLE notifications ALTER COLUMN body DROP NOT NULL",
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS read_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS owner VARCHAR",
+    "ALTER TABLE fanout_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR",
+]
 
 
 # Создаем асинхронный движок
@@ -71,6 +275,8 @@ engine: AsyncEngine = create_async_engine(
     echo=settings.database_echo,
     pool_size=settings.database_pool_size,
     max_overflow=settings.database_max_overflow,
+    # замеряет ожидание соединения для db_pool_checkout_wait_seconds
+    poolclass=TimedQueuePool,
 )
 
 # Создаем асинхронную фабрику сессий
@@ -82,20 +288,54 @@ AsyncDBSession = async_sessionmaker(
     autocommit=False,
 )
 
+# реплика для читающих запросов; без неё они идут в основную БД
+replica_engine: Optional[AsyncEngine] = (
+    create_async_engine(
+        settings.replica_database_url,
+        pool_pre_ping=True,
+        echo=settings.database_echo,
+        pool_size=settings.database_replica_pool_size,
+        max_overflow=settings.database_max_overflow,
+        poolclass=TimedQueuePool,
+    )
+    if settings.replica_database_url
+    else None
+)
+
+AsyncReplicaSession = async_sessionmaker(
+    bind=replica_engine or engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False,
+)
+
+replica_monitor = ReplicaMonitor(replica_engine)
+
 
 async def init_db() -> None:
-    """Асинхронное создание таблиц"""
+    """Асинхронное создание таблиц и секций notifications"""
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+        table = Notification.__table__  # type: ignore[attr-defined]
+        await convert_legacy_table(conn, table)
+        await ensure_partitions(conn, table, settings.notifications_partitions_ahead)
 
 
 async def dispose_db() -> None:
     """Асинхронное закрытие соединения с БД"""
     await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
 
 
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncDBSession() as session:
+async def get_db_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия запроса: GET/HEAD — с реплики, если она догнала записи клиента."""
+    use_replica = replica_monitor.use_replica(request.method, read_after(request))
+    session_factory = AsyncReplicaSession if use_replica else AsyncDBSession
+    async with session_factory() as session:
         try:
             yield session
         except Exception:
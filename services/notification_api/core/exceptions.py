@@ -0,0 +1,18 @@
+class ConflictError(ValueError):
+    """Нарушение уникальности, например занятое имя шаблона"""
+
+
+class IdempotencyKeyReusedError(ConflictError):
+    """Idempotency-Key уже использован с другим телом запроса"""
+
+
+class IdempotencyInProgressError(ConflictError):
+    """Запрос с тем же Idempotency-Key ещё выполняется"""
+
+
+class JobLeaseLostError(Exception):
+    """Задание рассылки забрал другой процесс: его аренда истекла"""
+
+
+class NotFoundError(ValueError):
+    """Нет объекта, на который ссылается запрос, например шаблона рассылки"""
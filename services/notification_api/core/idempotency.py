@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+
+import structlog
+from fastapi import Response
+
+from core.db import AsyncDBSession
+from core.exceptions import IdempotencyInProgressError, IdempotencyKeyReusedError
+from core.repository import IdempotencyRepository
+from core.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+# заголовки ответа, которые повтор должен вернуть вместе с телом
+REPLAYED_HEADERS = ("location",)
+
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Дедупликация повторных запросов по заголовку Idempotency-Key в Postgres.
+
+    Первый запрос занимает ключ и выполняется; его ответ сохраняется на
+    ``ttl_seconds``. Повтор получает сохранённый ответ без повторной работы,
+    а параллельный дубль ждёт, пока первый запрос не завершится. Владелец
+    продлевает аренду ``lock_seconds`` каждую её треть, пока выполняется;
+    если он упал, ключ освобождается по истечении аренды.
+    Каждая операция идёт в своей короткой сессии, вне транзакции запроса.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int,
+        lock_seconds: int,
+        wait_seconds: float,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+        self._purge: Optional[asyncio.Task] = None
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        request_fingerprint: str,
+        handler: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        if not key:
+            return await handler()
+
+        owner = uuid4().hex
+        replay = await self._acquire(scope, key, request_fingerprint, owner)
+        if replay is not None:
+            return replay
+
+        renewal = asyncio.create_task(self._renew_loop(scope, key, owner))
+        try:
+            response = await handler()
+        except BaseException:
+            # ошибка не кэшируется: повтор выполнит запрос заново
+            await self._release(scope, key, owner)
+            raise
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+        if response.status_code >= 500:
+            await self._release(scope, key, owner)
+            return response
+
+        headers = {
+            name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers
+        }
+        async with AsyncDBSession() as session:
+            completed = await IdempotencyRepository(session).complete(
+                scope,
+                key,
+                owner,
+                status_code=response.status_code,
+                body=bytes(response.body).decode(),
+                headers=headers,
+                expires_at=_now() + timedelta(seconds=self.ttl_seconds),
+            )
+        if not completed:
+            # аренду не удалось продлить, и ключ забрал повтор: его ответ не перетираем
+            logger.warning("IDEMPOTENCY_LEASE_LOST", scope=scope, key=key)
+        return response
+
+    async def _acquire(
+        self, scope: str, key: str, request_fingerprint: str, owner: str
+    ) -> Optional[Response]:
+        """None — ключ занят нами; иначе сохранённый ответ первого запроса."""
+        deadline = time.monotonic() + self.wait_seconds
+        delay = self.poll_interval
+        while True:
+            async with AsyncDBSession() as session:
+                repo = IdempotencyRepository(session)
+                lease_until = _now() + timedelta(seconds=self.lock_seconds)
+                if await repo.claim(scope, key, request_fingerprint, owner, lease_until):
+                    return None
+                stored = await repo.get(scope, key)
+            if stored is not None:
+                if stored.fingerprint != request_fingerprint:
+                    raise IdempotencyKeyReusedError(
+                        "Idempotency-Key уже использован с другим запросом"
+                    )
+                if stored.status_code is not None:
+                    logger.info("IDEMPOTENT_REPLAY", scope=scope, key=key)
+                    return Response(
+                        content=stored.body,
+                        status_code=stored.status_code,
+                        headers={**stored.headers, "Idempotent-Replayed": "true"},
+                        media_type="application/json",
+                    )
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError(
+                    "Запрос с таким Idempotency-Key ещё выполняется"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def _renew_loop(self, scope: str, key: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.lock_seconds / 3)
+            try:
+                async with AsyncDBSession() as session:
+                    lease_until = _now() + timedelta(seconds=self.lock_seconds)
+                    renewed = await IdempotencyRepository(session).renew(
+                        scope, key, owner, lease_until
+                    )
+            except Exception as error:
+                # следующая попытка ещё успеет до конца аренды
+                logger.warning("IDEMPOTENCY_RENEW_ERROR", key=key, error=str(error))
+                continue
+            if not renewed:
+                logger.warning("IDEMPOTENCY_LEASE_LOST", scope=scope, key=key)
+                return
+
+    async def _release(self, scope: str, key: str, owner: str) -> None:
+        try:
+            async with AsyncDBSession() as session:
+                await IdempotencyRepository(session).release(scope, key, owner)
+        except Exception as error:
+            # ключ освободится сам по истечении аренды
+            logger.warning("IDEMPOTENCY_RELEASE_ERROR", key=key, error=str(error))
+
+    def start(self) -> None:
+        self._purge = asyncio.create_task(self._purge_loop())
+
+    async def stop(self) -> None:
+        if self._purge is not None:
+            self._purge.cancel()
+            await asyncio.gather(self._purge, return_exceptions=True)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lock_seconds)
+            try:
+                async with AsyncDBSession() as session:
+                    purged = await IdempotencyRepository(session).purge_expired(
+                        grace=timedelta(seconds=self.lock_seconds)
+                    )
+                if purged:
+                    logger.info("IDEMPOTENCY_KEYS_PURGED", count=purged)
+            except Exception as error:
+                logger.warning("IDEMPOTENCY_PURGE_ERROR", error=str(error))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    lock_seconds=settings.idempotency_lock_seconds,
+    wait_seconds=settings.idempotency_wait_seconds,
+)
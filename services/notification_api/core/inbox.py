@@ -0,0 +1,20 @@
+from redis.asyncio import Redis
+
+from core.settings import settings
+from shared.inbox.store import InboxStore
+
+# входящие — только read model: при недоступном Redis чтения идут в Postgres,
+# поэтому таймауты короткие
+redis_client = Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    decode_responses=True,
+    socket_connect_timeout=1.0,
+    socket_timeout=1.0,
+)
+
+inbox_store = InboxStore(redis_client, size=settings.inbox_size, ttl=settings.inbox_ttl_seconds)
+
+
+async def close_inbox() -> None:
+    await redis_client.aclose()
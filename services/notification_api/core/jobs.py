@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from uuid import UUID
+
+import structlog
+
+from core.db import AsyncDBSession
+from core.repository import FanOutJobRepository
+from core.service import NotificationService
+from core.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+
+class FanOutExecutor:
+    """Выполняет задания рассылки в фоне, вне HTTP-запроса.
+
+    Каждое задание получает свою сессию БД; одновременно работает не больше
+    ``max_concurrency`` заданий, остальные ждут в очереди семафора.
+    Фоновый цикл восстановления подбирает задания, брошенные упавшими
+    процессами, и продолжает их с сохранённого чекпоинта.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[UUID, asyncio.Task] = {}
+        self._recovery: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._recovery = asyncio.create_task(self._recovery_loop())
+
+    def submit(self, job_id: UUID) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: UUID) -> None:
+        async with self._semaphore:
+            logger.info("FANOUT_JOB_STARTED", job_id=str(job_id))
+            try:
+                async with AsyncDBSession() as session:
+                    await NotificationService(session).run_fanout_job(job_id)
+            except Exception as error:
+                logger.exception("FANOUT_JOB_FAILED", job_id=str(job_id), error=str(error))
+                return
+            logger.info("FANOUT_JOB_FINISHED", job_id=str(job_id))
+
+    async def _recovery_loop(self) -> None:
+        while True:
+            try:
+                stale_before = datetime.now(timezone.utc) - timedelta(
+                    seconds=settings.fanout_job_lease_seconds
+                )
+                async with AsyncDBSession() as session:
+                    job_ids = await FanOutJobRepository(session).list_resumable(stale_before)
+                for job_id in job_ids:
+                    logger.info("FANOUT_JOB_RESUMED", job_id=str(job_id))
+                    self.submit(job_id)
+            except Exception as error:
+                logger.exception("FANOUT_RECOVERY_ERROR", error=str(error))
+            await asyncio.sleep(settings.fanout_job_lease_seconds)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        if self._recovery is not None:
+            tasks.append(self._recovery)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+fanout_executor = FanOutExecutor(settings.fanout_max_concurrent_jobs)
@@ -1,92 +1,112 @@
 import logging
+import random
 import time
-from typing import Callable
+from typing import Optional
 
 import structlog
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from shared.utils.logging_pipeline import configure_logging
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .metrics import HTTP_REQUEST_DURATION
 from .settings import settings
 
 
 def setup_logging() -> None:
-    root_logger = logging.getLogger()
-    for root_handler in root_logger.handlers[:]:
-        root_logger.removeHandler(root_handler)
-
-    handler = logging.StreamHandler()
-    root_logger.addHandler(handler)
-    root_logger.setLevel(settings.log_level)
-
-    shared_processors = [
-        structlog.contextvars.merge_contextvars,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
-        structlog.processors.format_exc_info,
-    ]
-
-    if settings.log_json_format:
-        processors = shared_processors + [
-            structlog.processors.JSONRenderer(
-                ensure_ascii=False,
-                indent=None,
-                sort_keys=False,
-            ),
-        ]
-    else:
-        processors = shared_processors + [structlog.dev.ConsoleRenderer()]
-
-    structlog.configure(
-        processors=processors,
-        logger_factory=structlog.stdlib.LoggerFactory(),
-        wrapper_class=structlog.stdlib.BoundLogger,
-        cache_logger_on_first_use=True,
+    configure_logging(
+        level=settings.log_level,
+        json_format=settings.log_json_format,
+        sample_rates=settings.log_event_sample_rates,
+        rate_limits=settings.log_event_rate_limits,
+        queue_size=settings.log_queue_size,
     )
 
-    logging.getLogger("uvicorn").handlers = []
-    logging.getLogger("uvicorn.access").handlers = []
-    logging.getLogger("uvicorn").propagate = True
-
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
     logging.getLogger("aioredis").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("requests").setLevel(logging.WARNING)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        logger = structlog.get_logger("http")
+class LoggingMiddleware:
+    """Чистый ASGI-middleware логирования запросов.
+
+    В отличие от ``BaseHTTPMiddleware`` не заводит задачу и поток тела ответа
+    на каждый запрос. Успешные запросы логируются с вероятностью
+    ``sample_rate``; ошибки (статус 4xx/5xx, исключения) и медленные запросы —
+    всегда. Длительность каждого запроса пишется в гистограмму по шаблону
+    маршрута, а не по сырому пути, чтобы id в пути не плодили серии.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: Optional[float] = None,
+        slow_request_seconds: Optional[float] = None,
+    ) -> None:
+        self.app = app
+        self.sample_rate = settings.log_sample_rate if sample_rate is None else sample_rate
+        self.slow_request_seconds = (
+            settings.log_slow_request_seconds
+            if slow_request_seconds is None
+            else slow_request_seconds
+        )
+        self.logger = structlog.get_logger("http")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
         try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
-
-            logger.info(
-                "Successful request",
-                method=request.method,
-                path=request.url.path,
-                query=str(request.url.query),
-                client_ip=request.client.host if request.client else None,
-                user_agent=request.headers.get("user-agent"),
-                status_code=response.status_code,
-                process_time=round(process_time, 3),
-            )
-
-            return response
-
+            await self.app(scope, receive, send_with_status)
         except Exception as error:
-            process_time = time.time() - start_time
-
-            logger.error(
-                "Request failed",
-                method=request.method,
-                path=request.url.path,
-                query=str(request.url.query),
-                client_ip=request.client.host if request.client else None,
-                user_agent=request.headers.get("user-agent"),
-                error=str(error),
-                process_time=round(process_time, 3),
-            )
+            self._record(scope, 500, time.perf_counter() - started, error)
             raise
+        self._record(scope, status_code, time.perf_counter() - started)
+
+    def _record(
+        self,
+        scope: Scope,
+        status_code: int,
+        process_time: float,
+        error: Optional[Exception] = None,
+    ) -> None:
+        # шаблон маршрута роутер FastAPI кладёт в scope после сопоставления
+        route = scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_DURATION.labels(scope["method"], route_path, str(status_code)).observe(
+            process_time
+        )
+
+        failed = error is not None or status_code >= 400
+        slow = process_time >= self.slow_request_seconds
+        if not failed and not slow and random.random() >= self.sample_rate:
+            return
+
+        client = scope.get("client")
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route_path,
+            "status_code": status_code,
+            "process_time": round(process_time, 4),
+            "client_ip": client[0] if client else None,
+        }
+        if error is not None:
+            self.logger.error("Request failed", error=str(error), **fields)
+        elif status_code >= 500:
+            self.logger.error("Request failed", **fields)
+        elif failed:
+            self.logger.warning("Request rejected", **fields)
+        elif slow:
+            self.logger.warning("Slow request", **fields)
+        else:
+            self.logger.info("Successful request", sampled=self.sample_rate, **fields)
@@ -0,0 +1,27 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# границы подобраны под SLA API: от единиц миллисекунд до 10 секунд
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса по шаблону маршрута",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_READS_ROUTED = Counter(
+    "db_reads_routed_total",
+    "Читающие запросы по базе, которая их обслужила",
+    ["target"],
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds",
+    "Отставание реплики чтения от основной БД",
+)
+INBOX_READS = Counter(
+    "inbox_reads_total",
+    "Чтения входящих пользователя: hit — из Redis, miss — из Postgres со сборкой "
+    "входящих, fallback — из Postgres без сборки, error — Redis недоступен",
+    ["result"],
+)
@@ -0,0 +1,18 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+
+
+def encode_cursor(created_at: datetime, notification_id: UUID) -> str:
+    """Непрозрачный курсор keyset-пагинации: (created_at, id) последней строки."""
+    raw = f"{created_at.isoformat()}|{notification_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(notification_id)
+    except Exception as error:
+        raise ValueError("Некорректный курсор") from error
@@ -0,0 +1,321 @@
+"""Секционирование ``notifications`` по месяцам ``created_at``.
+
+Таблица объявлена ``PARTITION BY RANGE (created_at)``, секции
+``notifications_pYYYY_MM`` покрывают по календарному месяцу в UTC и
+создаются на текущий месяц и ``notifications_partitions_ahead`` вперёд.
+Запросы с условием на ``created_at`` (фильтры списка, страницы от новых к
+старым) читают только подходящие секции.
+
+Таблица, созданная до секционирования, при старте переименовывается в
+``notifications_legacy`` и подключается секцией от MINVALUE до начала
+следующего месяца — строки не копируются, а уйдут в архив целиком, когда
+истечёт срок хранения.
+
+Хранение: секция, чья верхняя граница старше ``notifications_retention_months``
+месяцев, отсоединяется, а затем выгружается в
+``<notifications_archive_dir>/<секция>.csv.gz`` и удаляется. Тема, тело и
+data рассылок в архив попадают из ``message_payloads``: в строках секции
+лежит только ``payload_ref``. Ещё не отправленные отложенные уведомления
+перед этим переносятся в текущую секцию.
+Схему секций меняет одна реплика за раз: всё под ``pg_advisory_xact_lock``.
+"""
+
+import asyncio
+import gzip
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import structlog
+from models.delivery import DeliveryStatus
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = structlog.get_logger(__name__)
+
+# ключ advisory-блокировки: создание, отсоединение и архивация секций
+PARTITIONS_LOCK_KEY = 7_240_022
+# DETACH берёт эксклюзивную блокировку родителя: не ждём долгих запросов
+DETACH_LOCK_TIMEOUT = "5s"
+# индексы несекционированной таблицы с теми же колонками, что у родителя:
+# ATTACH подключит их вместо постройки заново, нужно только освободить имена
+LEGACY_INDEXES = {
+    "ix_notifications_created_at_id": "ix_notifications_legacy_created_at_id",
+    "ix_notifications_user_id_created_at_id": "ix_notifications_legacy_user_id_created_at_id",
+}
+# покрыт индексом (user_id, created_at, id)
+DROPPED_INDEXES = ("ix_notifications_user_id",)
+# общие части рассылок, на которые ссылаются строки по payload_ref
+PAYLOADS_TABLE = "message_payloads"
+
+_BOUND_VALUE = re.compile(r"\(([^)]*)\)")
+
+
+class Partition(NamedTuple):
+    """Секция и её границы; ``None`` — MINVALUE/MAXVALUE."""
+
+    name: str
+    lower: Optional[datetime]
+    upper: Optional[datetime]
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: Table, start: datetime) -> str:
+    return f"{table.name}_p{start:%Y_%m}"
+
+
+def legacy_name(table: Table) -> str:
+    return f"{table.name}_legacy"
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def _lock(conn: AsyncConnection, wait: bool = True) -> bool:
+    if wait:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK_KEY})
+        return True
+    result = await conn.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK_KEY}
+    )
+    return bool(result.scalar_one())
+
+
+async def _relkind(conn: AsyncConnection, name: str) -> Optional[str]:
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name}
+    )
+    return result.scalar_one_or_none()
+
+
+async def list_partitions(conn: AsyncConnection, table: Table) -> List[Partition]:
+    """Подключённые секции таблицы по возрастанию нижней границы."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:parent)"
+        ),
+        {"parent": table.name},
+    )
+    partitions = []
+    for name, bound in result.all():
+        # FOR VALUES FROM ('...') TO ('...'); DEFAULT-секций мы не создаём
+        values = _BOUND_VALUE.findall(bound)
+        if len(values) != 2:
+            continue
+        partitions.append(Partition(name, _parse_bound(values[0]), _parse_bound(values[1])))
+    return sorted(partitions, key=lambda p: p.lower or datetime.min.replace(tzinfo=timezone.utc))
+
+
+async def list_detached(conn: AsyncConnection, table: Table) -> List[str]:
+    """Отсоединённые, но ещё не выгруженные в архив секции."""
+    result = await conn.execute(
+        text(
+            "SELECT relname FROM pg_class "
+            "WHERE relkind = 'r' AND NOT relispartition "
+            "AND relnamespace = 'public'::regnamespace "
+            "AND (relname LIKE :pattern OR relname = :legacy) ORDER BY relname"
+        ),
+        {"pattern": f"{table.name}\\_p%", "legacy": legacy_name(table)},
+    )
+    return list(result.scalars().all())
+
+
+async def convert_legacy_table(conn: AsyncConnection, table: Table) -> bool:
+    """Превращает несекционированную таблицу в секцию новой родительской.
+
+    Вызывается в транзакции ``init_db`` после доработок схемы, когда у
+    старой таблицы уже все колонки модели. Вернёт ``False``, если таблица
+    уже секционирована или ещё не создана.
+    """
+    await _lock(conn)
+    if await _relkind(conn, table.name) != "r":
+        return False
+    legacy = legacy_name(table)
+    await conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{legacy}"'))
+    for index, renamed in LEGACY_INDEXES.items():
+        await conn.execute(text(f'ALTER INDEX IF EXISTS "{index}" RENAME TO "{renamed}"'))
+    for index in DROPPED_INDEXES:
+        await conn.execute(text(f'DROP INDEX IF EXISTS "{index}"'))
+    # ключ секционированной таблицы обязан включать created_at: единственная
+    # перестройка индекса при переходе
+    await conn.execute(text(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{table.name}_pkey"'))
+    await conn.execute(
+        text(f'ALTER TABLE "{legacy}" ADD CONSTRAINT "{legacy}_pkey" PRIMARY KEY (id, created_at)')
+    )
+    await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+
+    # строки «из будущего» (сдвиг часов) тоже должны попасть в границы
+    result = await conn.execute(text(f'SELECT max(created_at) FROM "{legacy}"'))
+    newest = result.scalar_one_or_none()
+    upper = add_months(month_start(max(newest or _now(), _now())), 1)
+    await conn.execute(
+        text(
+            f'ALTER TABLE "{table.name}" ATTACH PARTITION "{legacy}" '
+            f"FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat()}')"
+        )
+    )
+    logger.info("NOTIFICATIONS_TABLE_PARTITIONED", legacy=legacy, upper=upper.isoformat())
+    return True
+
+
+async def ensure_partitions(
+    conn: AsyncConnection, table: Table, ahead: int, now: Optional[datetime] = None
+) -> List[str]:
+    """Создаёт секции на текущий месяц и ``ahead`` месяцев вперёд.
+
+    Месяцы, уже покрытые секцией (например, ``notifications_legacy``),
+    пропускаются. Вернёт имена созданных секций.
+    """
+    await _lock(conn)
+    existing = await list_partitions(conn, table)
+    current = month_start(now or _now())
+    created = []
+    for offset in range(ahead + 1):
+        start, end = add_months(current, offset), add_months(current, offset + 1)
+        if any(_overlaps(partition, start, end) for partition in existing):
+            continue
+        name = partition_name(table, start)
+        await conn.execute(
+            text(
+                f'CREATE TABLE "{name}" PARTITION OF "{table.name}" '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        existing.append(Partition(name, start, end))
+        created.append(name)
+    if created:
+        logger.info("NOTIFICATIONS_PARTITIONS_CREATED", partitions=created)
+    return created
+
+
+async def detach_expired(
+    conn: AsyncConnection, table: Table, retention_months: int, now: Optional[datetime] = None
+) -> List[str]:
+    """Отсоединяет секции, целиком старше срока хранения.
+
+    Отложенные уведомления, которые планировщик ещё не отправил, сначала
+    копируются в текущую секцию с ``created_at = now``. Вернёт имена
+    отсоединённых секций; пусто, если обслуживание идёт на другой реплике.
+    """
+    if not await _lock(conn, wait=False):
+        return []
+    now = now or _now()
+    cutoff = add_months(month_start(now), -retention_months)
+    expired = [
+        partition
+        for partition in await list_partitions(conn, table)
+        if partition.upper is not None and partition.upper <= cutoff
+    ]
+    if not expired:
+        return []
+    await conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+    columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name != "created_at")
+    for partition in expired:
+        carried = await conn.execute(
+            text(
+                f'INSERT INTO "{table.name}" ({columns}, created_at) '
+                f'SELECT {columns}, :now FROM "{partition.name}" '
+                "WHERE status = :status AND scheduled_time IS NOT NULL"
+            ),
+            {"now": now, "status": DeliveryStatus.PENDING.name},
+        )
+        await conn.execute(
+            text(f'ALTER TABLE "{table.name}" DETACH PARTITION "{partition.name}"')
+        )
+        logger.info(
+            "NOTIFICATIONS_PARTITION_DETACHED",
+            partition=partition.name,
+            carried_forward=carried.rowcount,
+        )
+    return [partition.name for partition in expired]
+
+
+def archive_query(table: Table, name: str) -> str:
+    """SELECT строк секции с содержимым рассылок, подставленным по ``payload_ref``.
+
+    Колонки — в порядке модели: заголовок архива не зависит от того, в каком
+    порядке их добавляли в старую таблицу.
+    """
+    expressions = {
+        "subject": 'COALESCE(n."subject", p.subject)',
+        "body": 'COALESCE(n."body", p.body)',
+        # как у воркера: data получателя поверх общей
+        "data": 'CASE WHEN p.ref IS NULL THEN n."data" '
+        """ELSE p.data || COALESCE(n."data", '{}'::jsonb) END""",
+    }
+    columns = []
+    for column in table.columns:
+        expression = expressions.get(column.name, f'n."{column.name}"')
+        columns.append(f'{expression} AS "{column.name}"')
+    return (
+        f'SELECT {", ".join(columns)} FROM "{name}" n '
+        f'LEFT JOIN "{PAYLOADS_TABLE}" p ON p.ref = n."payload_ref"'
+    )
+
+
+async def archive_partition(
+    conn: AsyncConnection, table: Table, name: str, archive_dir: Path
+) -> Optional[Path]:
+    """Выгружает отсоединённую секцию в gzip-CSV с заголовком и удаляет её.
+
+    Строки рассылок выгружаются полными: тема, тело и data берутся из
+    ``message_payloads``, иначе архив без живой БД было бы не прочитать.
+    Файл пишется во временный и переименовывается после fsync, таблица
+    удаляется только после этого: сбой посередине оставит таблицу, и
+    следующий проход выгрузит её заново. Вернёт ``None``, если секцию
+    обслуживает другая реплика.
+    """
+    if not await _lock(conn, wait=False):
+        return None
+    path = archive_dir / f"{name}.csv.gz"
+    partial = archive_dir / f"{name}.csv.gz.partial"
+    await asyncio.to_thread(archive_dir.mkdir, parents=True, exist_ok=True)
+    archive = await asyncio.to_thread(gzip.open, partial, "wb")
+
+    async def write(chunk: bytes) -> None:
+        await asyncio.to_thread(archive.write, chunk)
+
+    raw = await conn.get_raw_connection()
+    try:
+        await raw.driver_connection.copy_from_query(
+            archive_query(table, name), output=write, format="csv", header=True
+        )
+    finally:
+        await asyncio.to_thread(archive.close)
+    await asyncio.to_thread(_seal, partial, path)
+    await conn.execute(text(f'DROP TABLE "{name}"'))
+    logger.info("NOTIFICATIONS_PARTITION_ARCHIVED", partition=name, path=str(path))
+    return path
+
+
+def _seal(partial: Path, path: Path) -> None:
+    with open(partial, "rb") as archive:
+        os.fsync(archive.fileno())
+    os.replace(partial, path)
+
+
+def _overlaps(partition: Partition, start: datetime, end: datetime) -> bool:
+    return (partition.lower is None or partition.lower < end) and (
+        partition.upper is None or partition.upper > start
+    )
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
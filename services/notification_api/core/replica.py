@@ -0,0 +1,149 @@
+"""Чтение с реплики Postgres.
+
+Читающие запросы (GET/HEAD) обслуживает реплика ``postgres_replica_host``,
+если она настроена, отвечает и отстаёт не больше ``replica_max_lag_seconds``;
+иначе — основная БД. Отставание раз в ``replica_lag_poll_seconds`` замеряет
+``ReplicaMonitor``.
+
+Read-your-writes: успешный изменяющий запрос отдаёт клиенту время записи
+(cookie ``READ_AFTER_COOKIE`` и заголовок ``X-Read-After``). Пока с этого
+времени прошло не больше текущего отставания реплики, чтения клиента идут в
+основную БД, поэтому только что отправленное уведомление видно сразу.
+Клиенты без cookie передают полученное значение тем же заголовком.
+"""
+
+import asyncio
+import math
+import time
+from typing import Optional
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import DB_READS_ROUTED, DB_REPLICA_LAG_SECONDS
+from .settings import settings
+
+logger = structlog.get_logger(__name__)
+
+READ_AFTER_COOKIE = "read_after"
+READ_AFTER_HEADER = "x-read-after"
+SAFE_METHODS = frozenset({"GET", "HEAD"})
+
+# пока реплика не получает WAL, replay_timestamp стоит на месте: при
+# полностью проигранном WAL отставание нулевое, а не «время с последней записи»
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class ReplicaMonitor:
+    """Замеряет отставание реплики и решает, куда направить чтение."""
+
+    def __init__(self, engine: Optional[AsyncEngine]) -> None:
+        self.engine = engine
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.engine is not None:
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def use_replica(self, method: str, read_after: Optional[float]) -> bool:
+        routed = self._use_replica(method, read_after)
+        if method in SAFE_METHODS:
+            DB_READS_ROUTED.labels("replica" if routed else "primary").inc()
+        return routed
+
+    def _use_replica(self, method: str, read_after: Optional[float]) -> bool:
+        if self.engine is None or method not in SAFE_METHODS:
+            return False
+        lag = self._current_lag()
+        if lag is None or lag > settings.replica_max_lag_seconds:
+            return False
+        # запись клиента видна на реплике, когда с неё прошло больше отставания;
+        # замер мог устареть на период опроса
+        if read_after is not None:
+            return time.time() - read_after > lag + settings.replica_lag_poll_seconds
+        return True
+
+    def _current_lag(self) -> Optional[float]:
+        # замер, которому больше трёх периодов опроса, не доверяем
+        if self.checked_at is None:
+            return None
+        if time.monotonic() - self.checked_at > 3 * settings.replica_lag_poll_seconds:
+            return None
+        return self.lag_seconds
+
+    async def _monitor(self) -> None:
+        assert self.engine is not None
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    result = await conn.execute(text(REPLICA_LAG_QUERY))
+                    self.lag_seconds = float(result.scalar_one())
+                self.checked_at = time.monotonic()
+                DB_REPLICA_LAG_SECONDS.set(self.lag_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.lag_seconds = None
+                logger.warning("REPLICA_LAG_CHECK_ERROR", error=str(error))
+            await asyncio.sleep(settings.replica_lag_poll_seconds)
+
+
+def read_after(request: Request) -> Optional[float]:
+    """Время последней записи клиента из заголовка или cookie."""
+    value = request.headers.get(READ_AFTER_HEADER) or request.cookies.get(READ_AFTER_COOKIE)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class ReadAfterWriteMiddleware:
+    """Чистый ASGI-middleware: помечает ответы на успешные записи временем записи.
+
+    Ставится, только если настроена реплика: без неё все чтения и так идут
+    в основную БД.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # дольше допустимого отставания метка не нужна: реплику тогда не используют
+        self.max_age = math.ceil(settings.replica_max_lag_seconds + settings.replica_lag_poll_seconds)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_mark(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                written_at = f"{time.time():.3f}".encode()
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (READ_AFTER_HEADER.encode(), written_at),
+                    (
+                        b"set-cookie",
+                        b"%s=%s; Max-Age=%d; Path=/; HttpOnly; SameSite=Lax"
+                        % (READ_AFTER_COOKIE.encode(), written_at, self.max_age),
+                    ),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_mark)
@@ -1,10 +1,80 @@
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Select, and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db import Notification, NotificationTemplate
+from core.cache import TEMPLATE_INVALIDATION_CHANNEL, template_cache
+from core.db import (
+    FanOutJob,
+    IdempotencyKey,
+    MessagePayload,
+    Notification,
+    NotificationTemplate,
+    OutboxMessage,
+    replica_engine,
+)
+from core.settings import settings
+from models.delivery import DeliveryStatus, JobStatus
+from models.notification import NotificationBase, NotificationFilter, NotificationTemplateBase
+from shared.broker.outbox import OUTBOX_NOTIFY_CHANNEL
+
+
+# проекция списков и выгрузки (поля NotificationSummary): без тяжёлых body и data;
+# тема строк с payload_ref берётся из общей части рассылки
+SUMMARY_COLUMNS = (
+    Notification.id,
+    Notification.user_id,
+    Notification.template_id,
+    Notification.notification_type,
+    Notification.status,
+    Notification.priority,
+    func.coalesce(Notification.subject, MessagePayload.subject).label("subject"),
+    Notification.created_at,
+    Notification.sent_at,
+    Notification.delivered_at,
+    Notification.error_message,
+    Notification.read_at,
+)
+
+
+def _summary_select() -> Select:
+    return select(*SUMMARY_COLUMNS).outerjoin(
+        MessagePayload, MessagePayload.ref == Notification.payload_ref
+    )
+
+
+def _resolved(notification: Notification, payload: Optional[MessagePayload]) -> NotificationBase:
+    values = notification.model_dump()
+    if payload is not None:
+        # как coalesce в SUMMARY_COLUMNS: своё значение строки важнее общей части
+        values.update(
+            subject=payload.subject if notification.subject is None else notification.subject,
+            body=payload.body if notification.body is None else notification.body,
+            data={**payload.data, **notification.data},
+        )
+    return NotificationBase.model_validate(values)
+
+
+def _filtered(
+    query: Select, filters: NotificationFilter, user_id: Optional[str], inbox: bool = False
+) -> Select:
+    if user_id is not None:
+        query = query.where(Notification.user_id == user_id)
+    if inbox:
+        # во входящих только доставленные: ждущие отправки пользователь ещё не получил
+        query = query.where(Notification.status != DeliveryStatus.PENDING)
+    if filters.status is not None:
+        query = query.where(Notification.status == filters.status)
+    if filters.notification_type is not None:
+        query = query.where(Notification.notification_type == filters.notification_type)
+    if filters.created_from is not None:
+        query = query.where(Notification.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(Notification.created_at < filters.created_to)
+    return query
 
 
 class NotificationRepository:
@@ -17,21 +87,151 @@ class NotificationRepository:
         await self.session.refresh(notification)
         return notification
 
+    async def bulk_create(
+        self, rows: List[Dict[str, Any]], batch_size: int = 1000, commit: bool = True
+    ) -> List[UUID]:
+        """Многострочный INSERT без refresh: id генерируются на стороне клиента.
+
+        Строки с уже существующим ключом (id, created_at) пропускаются,
+        поэтому повтор пачки после рестарта не создаёт дублей. Вернёт id
+        действительно вставленных строк.
+        """
+        if not rows:
+            return []
+        # executemany одного закэшированного INSERT: многострочный VALUES
+        # компилировался заново на каждую пачку и стоил дороже самой вставки
+        statement = (
+            insert(Notification)
+            .on_conflict_do_nothing(index_elements=["id", "created_at"])
+            .returning(Notification.id)
+        )
+        inserted: List[UUID] = []
+        for start in range(0, len(rows), batch_size):
+            result = await self.session.execute(statement, rows[start:start + batch_size])
+            inserted.extend(result.scalars().all())
+        if commit:
+            await self.session.commit()
+        return inserted
+
+    async def get_pending_ids(self, notification_ids: List[UUID]) -> List[UUID]:
+        result = await self.session.execute(
+            select(Notification.id).where(
+                Notification.id.in_(notification_ids),
+                Notification.status == DeliveryStatus.PENDING,
+            )
+        )
+        return list(result.scalars().all())
+
     async def get_by_id(self, notification_id: UUID) -> Optional[Notification]:
         result = await self.session.execute(
             select(Notification).where(Notification.id == notification_id)
         )
         return result.scalar_one_or_none()
 
-    async def list(self) -> List[Notification]:
-        result = await self.session.execute(select(Notification))
-        return result.scalars().all()
+    async def get_resolved(self, notification_id: UUID) -> Optional[NotificationBase]:
+        """Уведомление с темой, телом и data, подставленными из общей части рассылки."""
+        result = await self.session.execute(
+            select(Notification, MessagePayload)
+            .outerjoin(MessagePayload, MessagePayload.ref == Notification.payload_ref)
+            .where(Notification.id == notification_id)
+        )
+        row = result.first()
+        return _resolved(*row) if row is not None else None
 
-    async def get_by_user(self, user_id: str) -> List[Notification]:
+    async def list_page(
+        self,
+        filters: NotificationFilter,
+        limit: int,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        user_id: Optional[str] = None,
+        inbox: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Страница от новых к старым по (created_at, id), начиная после курсора."""
+        query = _filtered(_summary_select(), filters, user_id, inbox)
+        if after is not None:
+            query = query.where(tuple_(Notification.created_at, Notification.id) < after)
         result = await self.session.execute(
-            select(Notification).where(Notification.user_id == user_id)
+            query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
         )
-        return result.scalars().all()
+        return [dict(row) for row in result.mappings().all()]
+
+    async def list_inbox(self, user_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Последние ``limit`` входящих пользователя и число всех его непрочитанных.
+
+        Счётчик — подзапросом того же запроса, поэтому из одного снимка со строками.
+        """
+        unread = (
+            _filtered(select(func.count()), NotificationFilter(), user_id, inbox=True)
+            .select_from(Notification)
+            .where(Notification.read_at.is_(None))
+            # счётчик по всем строкам пользователя, а не по строке внешнего запроса
+            .correlate(None)
+            .scalar_subquery()
+            .label("unread_total")
+        )
+        query = _filtered(_summary_select(), NotificationFilter(), user_id, inbox=True)
+        result = await self.session.execute(
+            query.add_columns(unread)
+            .order_by(Notification.created_at.desc(), Notification.id.desc())
+            .limit(limit)
+        )
+        rows = [dict(row) for row in result.mappings().all()]
+        unread_total = rows[0]["unread_total"] if rows else 0
+        for row in rows:
+            del row["unread_total"]
+        return rows, unread_total
+
+    async def count_unread(self, user_id: str) -> int:
+        result = await self.session.execute(
+            _filtered(select(func.count()), NotificationFilter(), user_id, inbox=True)
+            .select_from(Notification)
+            .where(Notification.read_at.is_(None))
+        )
+        return int(result.scalar_one())
+
+    async def mark_read(
+        self, user_id: str, notification_ids: List[UUID], read_at: datetime
+    ) -> List[UUID]:
+        """Отмечает прочитанными; вернёт id, которые были непрочитанными."""
+        result = await self.session.execute(
+            update(Notification)
+            .where(
+                Notification.user_id == user_id,
+                Notification.id.in_(notification_ids),
+                Notification.status != DeliveryStatus.PENDING,
+                Notification.read_at.is_(None),
+            )
+            .values(read_at=read_at)
+            .returning(Notification.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars().all())
+
+    async def mark_all_read(self, user_id: str, read_at: datetime) -> int:
+        result = await self.session.execute(
+            update(Notification)
+            .where(
+                Notification.user_id == user_id,
+                Notification.status != DeliveryStatus.PENDING,
+                Notification.read_at.is_(None),
+            )
+            .values(read_at=read_at)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def stream(
+        self, filters: NotificationFilter, user_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Строки из серверного курсора: в памяти только текущая порция."""
+        query = _filtered(_summary_select(), filters, user_id).order_by(
+            Notification.created_at, Notification.id
+        )
+        result = await self.session.stream(
+            query.execution_options(yield_per=settings.export_fetch_size)
+        )
+        async for row in result.mappings():
+            yield dict(row)
 
     async def update(self, notification_id: UUID, update_data: dict) -> Optional[Notification]:
         notification = await self.get_by_id(notification_id)
@@ -68,6 +268,74 @@ class NotificationTemplateRepository:
         )
         return result.scalar_one_or_none()
 
+    async def get_by_name(self, name: str) -> Optional[NotificationTemplate]:
+        result = await self.session.execute(
+            select(NotificationTemplate).where(NotificationTemplate.name == name)
+        )
+        return result.scalar_one_or_none()
+
+    async def exists_by_name(self, name: str) -> bool:
+        result = await self.session.execute(
+            select(
+                select(NotificationTemplate.id)
+                .where(NotificationTemplate.name == name)
+                .exists()
+            )
+        )
+        return bool(result.scalar())
+
+    async def upsert_many(self, rows: List[Dict[str, Any]]) -> List[UUID]:
+        """Импорт шаблонов одним INSERT ... ON CONFLICT (name) DO UPDATE."""
+        if not rows:
+            return []
+        statement = insert(NotificationTemplate).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "subject": statement.excluded.subject,
+                "body": statement.excluded.body,
+                "notification_type": statement.excluded.notification_type,
+                "variables": statement.excluded.variables,
+                "version": NotificationTemplate.version + 1,
+            },
+        ).returning(NotificationTemplate.id)
+        result = await self.session.execute(statement)
+        template_ids = list(result.scalars().all())
+        # изменённых шаблонов может быть много — остальным инстансам
+        # отправляем один сигнал сбросить кэш целиком
+        await self.session.execute(select(func.pg_notify(TEMPLATE_INVALIDATION_CHANNEL, "*")))
+        await self.session.commit()
+        for template_id in template_ids:
+            template_cache.invalidate(template_id)
+        return template_ids
+
+    async def get_cached(self, template_id: UUID) -> Optional[NotificationTemplateBase]:
+        """Снимок шаблона из кэша процесса; при промахе читает БД."""
+        cached = template_cache.get_by_id(template_id)
+        if cached is not None:
+            return cached
+        # поколение до чтения: инвалидация во время запроса отменит заполнение
+        generation = template_cache.generation
+        template = await self.get_by_id(template_id)
+        return self._snapshot(template, generation) if template else None
+
+    async def get_cached_by_name(self, name: str) -> Optional[NotificationTemplateBase]:
+        cached = template_cache.get_by_name(name)
+        if cached is not None:
+            return cached
+        generation = template_cache.generation
+        template = await self.get_by_name(name)
+        return self._snapshot(template, generation) if template else None
+
+    def _snapshot(
+        self, template: NotificationTemplate, generation: int
+    ) -> NotificationTemplateBase:
+        # реплика может отдать версию до правки: инвалидация по NOTIFY уже
+        # прошла, и кэш процесса хранил бы её до TTL. Кэш наполняет только основная БД
+        if replica_engine is not None and self.session.bind is replica_engine:
+            return NotificationTemplateBase.model_validate(template)
+        return template_cache.put(template, generation)
+
     async def list(self) -> List[NotificationTemplate]:
         result = await self.session.execute(select(NotificationTemplate))
         return result.scalars().all()
@@ -78,7 +346,10 @@ class NotificationTemplateRepository:
             return None
         for key, value in update_data.items():
             setattr(template, key, value)
+        template.version += 1
+        await self._notify_changed(template_id)
         await self.session.commit()
+        template_cache.invalidate(template_id)
         await self.session.refresh(template)
         return template
 
@@ -86,6 +357,247 @@ class NotificationTemplateRepository:
         template = await self.get_by_id(template_id)
         if template:
             await self.session.delete(template)
+            await self._notify_changed(template_id)
             await self.session.commit()
+            template_cache.invalidate(template_id)
             return True
         return False
+
+    async def _notify_changed(self, template_id: UUID) -> None:
+        # NOTIFY транзакционный: остальные инстансы получат его только после commit
+        await self.session.execute(
+            select(func.pg_notify(TEMPLATE_INVALIDATION_CHANNEL, str(template_id)))
+        )
+
+
+class MessagePayloadRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def ensure(self, payloads: List[Dict[str, Any]], commit: bool = True) -> None:
+        """Сохраняет общие части сообщений; уже сохранённые ref пропускаются."""
+        if not payloads:
+            return
+        await self.session.execute(
+            insert(MessagePayload).values(payloads).on_conflict_do_nothing(index_elements=["ref"])
+        )
+        if commit:
+            await self.session.commit()
+
+
+class OutboxRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(
+        self, rows: List[Dict[str, Any]], batch_size: int = 1000, commit: bool = True
+    ) -> int:
+        """Ставит сообщения в outbox текущей транзакции и будит relay после commit."""
+        if not rows:
+            return 0
+        statement = insert(OutboxMessage)
+        for start in range(0, len(rows), batch_size):
+            await self.session.execute(statement, rows[start:start + batch_size])
+        # одинаковые NOTIFY в транзакции Postgres схлопывает в один
+        await self.session.execute(select(func.pg_notify(OUTBOX_NOTIFY_CHANNEL, "")))
+        if commit:
+            await self.session.commit()
+        return len(rows)
+
+
+class FanOutJobRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, job: FanOutJob) -> FanOutJob:
+        self.session.add(job)
+        await self.session.commit()
+        return job
+
+    async def get_by_id(self, job_id: UUID) -> Optional[FanOutJob]:
+        result = await self.session.execute(
+            select(FanOutJob).where(FanOutJob.id == job_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def update(self, job_id: UUID, update_data: dict, commit: bool = True) -> None:
+        # без чтения строки: счётчики обновляются после каждой пачки
+        await self.session.execute(
+            update(FanOutJob).where(FanOutJob.id == job_id).values(**update_data)
+        )
+        if commit:
+            await self.session.commit()
+
+    async def update_owned(
+        self, job_id: UUID, owner: str, update_data: dict, commit: bool = True
+    ) -> bool:
+        """Обновляет выполняющееся задание, только пока им владеет ``owner``.
+
+        False — аренда истекла и задание забрал другой процесс.
+        """
+        result = await self.session.execute(
+            update(FanOutJob)
+            .where(
+                FanOutJob.id == job_id,
+                FanOutJob.owner == owner,
+                FanOutJob.status == JobStatus.RUNNING,
+            )
+            .values(**update_data)
+        )
+        if commit:
+            await self.session.commit()
+        return result.rowcount > 0
+
+    async def claim(
+        self, job_id: UUID, stale_before: datetime, owner: str
+    ) -> Optional[FanOutJob]:
+        """Атомарно забирает задание: новое или брошенное упавшим процессом."""
+        now = datetime.now(timezone.utc)
+        result = await self.session.execute(
+            update(FanOutJob)
+            .where(
+                FanOutJob.id == job_id,
+                or_(
+                    FanOutJob.status == JobStatus.QUEUED,
+                    and_(
+                        FanOutJob.status == JobStatus.RUNNING,
+                        FanOutJob.heartbeat_at < stale_before,
+                    ),
+                ),
+            )
+            .values(
+                status=JobStatus.RUNNING,
+                owner=owner,
+                started_at=func.coalesce(FanOutJob.started_at, now),
+                heartbeat_at=now,
+            )
+            .returning(FanOutJob.id)
+        )
+        claimed = result.scalar_one_or_none()
+        await self.session.commit()
+        if claimed is None:
+            return None
+        return await self.get_by_id(job_id)
+
+    async def list_resumable(self, stale_before: datetime) -> List[UUID]:
+        result = await self.session.execute(
+            select(FanOutJob.id).where(
+                or_(
+                    and_(
+                        FanOutJob.status == JobStatus.QUEUED,
+                        FanOutJob.created_at < stale_before,
+                    ),
+                    and_(
+                        FanOutJob.status == JobStatus.RUNNING,
+                        FanOutJob.heartbeat_at < stale_before,
+                    ),
+                )
+            )
+        )
+        return list(result.scalars().all())
+
+
+def _owned_key(scope: str, key: str, owner: str) -> Tuple[Any, ...]:
+    # только незавершённый ключ этого владельца: после истечения аренды
+    # его мог забрать повтор, и чужую запись трогать нельзя
+    return (
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key,
+        IdempotencyKey.owner == owner,
+        IdempotencyKey.status_code.is_(None),
+    )
+
+
+class IdempotencyRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def claim(
+        self, scope: str, key: str, fingerprint: str, owner: str, lease_until: datetime
+    ) -> bool:
+        """Атомарно занимает ключ: новый или с истёкшим сроком."""
+        statement = insert(IdempotencyKey).values(
+            scope=scope,
+            key=key,
+            fingerprint=fingerprint,
+            owner=owner,
+            headers={},
+            expires_at=lease_until,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+            set_={
+                "fingerprint": statement.excluded.fingerprint,
+                "owner": statement.excluded.owner,
+                "status_code": None,
+                "body": None,
+                "headers": statement.excluded.headers,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=IdempotencyKey.expires_at < func.now(),
+        ).returning(IdempotencyKey.key)
+        result = await self.session.execute(statement)
+        claimed = result.scalar_one_or_none()
+        await self.session.commit()
+        return claimed is not None
+
+    async def renew(self, scope: str, key: str, owner: str, lease_until: datetime) -> bool:
+        """Продлевает аренду; False — ключ уже не наш."""
+        result = await self.session.execute(
+            update(IdempotencyKey)
+            .where(*_owned_key(scope, key, owner))
+            .values(expires_at=lease_until)
+        )
+        await self.session.commit()
+        return result.rowcount > 0
+
+    async def get(self, scope: str, key: str) -> Optional[IdempotencyKey]:
+        result = await self.session.execute(
+            select(IdempotencyKey).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def complete(
+        self,
+        scope: str,
+        key: str,
+        owner: str,
+        status_code: int,
+        body: str,
+        headers: Dict[str, str],
+        expires_at: datetime,
+    ) -> bool:
+        """Сохраняет ответ; False — ключ уже забрал другой запрос."""
+        result = await self.session.execute(
+            update(IdempotencyKey)
+            .where(*_owned_key(scope, key, owner))
+            .values(status_code=status_code, body=body, headers=headers, expires_at=expires_at)
+        )
+        await self.session.commit()
+        return result.rowcount > 0
+
+    async def release(self, scope: str, key: str, owner: str) -> None:
+        await self.session.execute(delete(IdempotencyKey).where(*_owned_key(scope, key, owner)))
+        await self.session.commit()
+
+    async def purge_expired(self, grace: timedelta) -> int:
+        """Удаляет истёкшие ответы и брошенные ключи.
+
+        Выполняющийся ключ удаляется, только если аренда истекла больше
+        ``grace`` назад: запоздавшее продление живого владельца не теряется.
+        """
+        result = await self.session.execute(
+            delete(IdempotencyKey).where(
+                or_(
+                    and_(
+                        IdempotencyKey.status_code.is_not(None),
+                        IdempotencyKey.expires_at < func.now(),
+                    ),
+                    IdempotencyKey.expires_at < func.now() - grace,
+                )
+            )
+        )
+        await self.session.commit()
+        return result.rowcount
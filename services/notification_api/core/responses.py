@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from models.base import Page
+from shared.utils.serialization import dumps
+
+
+class RowsResponse(ORJSONResponse):
+    """ORJSONResponse для строк БД: UUID драйвера asyncpg пишет строкой."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content, orjson.OPT_NON_STR_KEYS)
+
+
+def page_response(page: Page[Any], message: Optional[str] = None) -> RowsResponse:
+    """Страница списка в конверте ``BaseResponse`` без повторной валидации.
+
+    Строки приходят из проекции колонок и уже типизированы драйвером БД,
+    поэтому их сразу кодирует orjson: FastAPI не делает model_dump, проверку
+    по ``response_model`` и повторный обход перед json.dumps. Схема ответа
+    по-прежнему описана в ``response_model`` маршрута.
+    """
+    return RowsResponse(
+        {
+            "success": True,
+            "message": message,
+            "data": {"items": page.items, "next_cursor": page.next_cursor},
+        }
+    )
+
+
+def model_response(
+    response_model: Type[BaseModel],
+    content: BaseModel,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> ORJSONResponse:
+    """Готовый ответ по схеме маршрута — то же тело, что построил бы FastAPI.
+
+    Нужен там, где тело ответа сохраняется как есть, например для повторов
+    по Idempotency-Key.
+    """
+    body = response_model.model_validate(content.model_dump()).model_dump(mode="json")
+    return ORJSONResponse(body, status_code=status_code, headers=headers)
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import structlog
+
+from core.db import Notification, engine
+from core.partitions import archive_partition, detach_expired, ensure_partitions, list_detached
+from core.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+
+class PartitionMaintainer:
+    """Обслуживание секций ``notifications`` в фоне.
+
+    Раз в ``partition_maintenance_seconds``: создаёт секции наперёд,
+    отсоединяет секции старше срока хранения и выгружает отсоединённые в
+    ``notifications_archive_dir``. Каждая секция архивируется в своей
+    транзакции, поэтому сбой на одной не откатывает остальные.
+    """
+
+    def __init__(self) -> None:
+        self.table = Notification.__table__  # type: ignore[attr-defined]
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def maintain(self, now: Optional[datetime] = None) -> List[Path]:
+        """Один проход обслуживания; вернёт пути созданных архивов."""
+        async with engine.begin() as conn:
+            await ensure_partitions(conn, self.table, settings.notifications_partitions_ahead, now)
+        async with engine.begin() as conn:
+            await detach_expired(conn, self.table, settings.notifications_retention_months, now)
+        async with engine.connect() as conn:
+            detached = await list_detached(conn, self.table)
+        archives = []
+        for name in detached:
+            async with engine.begin() as conn:
+                path = await archive_partition(
+                    conn, self.table, name, Path(settings.notifications_archive_dir)
+                )
+            if path is not None:
+                archives.append(path)
+        return archives
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception as error:
+                logger.warning("PARTITION_MAINTENANCE_ERROR", error=str(error))
+            await asyncio.sleep(settings.partition_maintenance_seconds)
+
+
+partition_maintainer = PartitionMaintainer()
@@ -1,21 +1,82 @@
-from typing import List, Dict, Any
-from uuid import UUID
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4, uuid5
 
+import orjson
+import structlog
 from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
-from core.db import Notification, NotificationTemplate, get_db_session
-from core.repository import NotificationRepository, NotificationTemplateRepository
-from core.broker import publish_message
+from core.db import (
+    AsyncDBSession,
+    FanOutJob,
+    NotificationTemplate,
+    get_db_session,
+)
+from core.pagination import decode_cursor, encode_cursor
+from core.repository import (
+    FanOutJobRepository,
+    MessagePayloadRepository,
+    NotificationRepository,
+    NotificationTemplateRepository,
+    OutboxRepository,
+)
+from core.broker import outbox_rows
+from core.exceptions import ConflictError, JobLeaseLostError, NotFoundError
+from core.inbox import inbox_store
+from core.metrics import INBOX_READS
 from core.settings import settings
-from core.shortener import shorten
-from models.delivery import QueueName, NotificationType
+from core.shortener import shorten_many
+from models.delivery import DeliveryStatus, JobStatus, NotificationType, PriorityLevel, QueueName
+from models.base import Page
+from models.inbox import InboxCounters
+from models.job import FanOutJobRead
 from models.notification import (
+    EventResult,
+    NotificationBase,
     NotificationCreate,
-    NotificationTemplateBase,
     NotificationEvent,
+    NotificationFilter,
+    NotificationSummary,
+    NotificationTemplateBase,
+    NotificationTemplateCreate,
 )
+from shared.models.wire import payload_ref
+from shared.utils.serialization import dumps
+
+logger = structlog.get_logger(__name__)
+
+
+def _is_broadcast(recipients: List[str]) -> bool:
+    return len(recipients) == 1 and recipients[0].upper() == "ALL"
+
+
+def _delta(data: Dict[str, Any], shared: Dict[str, Any]) -> Dict[str, Any]:
+    # data получателя поверх общей части: у рассылки она обычно та же самая
+    return {} if data == shared["data"] else data
+
+
+def _notification_id(job: Optional[FanOutJob], user_id: str) -> UUID:
+    # детерминированный id внутри задания: повторная вставка после
+    # рестарта упрётся в PK и будет пропущена
+    if job is None:
+        return uuid4()
+    return uuid5(job.id, user_id)
+
+
+def _inbox_page(items: List[Dict[str, Any]], has_more: bool) -> Page[NotificationSummary]:
+    next_cursor = None
+    if has_more:
+        # сводки из Redis хранят время строкой ISO 8601
+        created_at, notification_id = items[-1]["created_at"], items[-1]["id"]
+        if isinstance(created_at, str):
+            created_at, notification_id = datetime.fromisoformat(created_at), UUID(notification_id)
+        next_cursor = encode_cursor(created_at, notification_id)
+    return Page[NotificationSummary].model_construct(items=items, next_cursor=next_cursor)
 
 
 class NotificationService:
@@ -23,23 +84,76 @@ class NotificationService:
         self.session = session
         self.notification_repo = NotificationRepository(session)
         self.template_repo = NotificationTemplateRepository(session)
+        self.job_repo = FanOutJobRepository(session)
+        self.payload_repo = MessagePayloadRepository(session)
+        self.outbox_repo = OutboxRepository(session)
 
     # === helpers ===
-    async def _all_recipient_ids(self) -> List[str]:
+    async def _iter_all_recipient_ids(
+        self, after: Optional[str] = None
+    ) -> AsyncIterator[List[str]]:
+        """Keyset-пагинация по recipients: память не зависит от размера таблицы."""
         # admin_panel создаёт таблицу "recipients" (UUID PK). Читаем напрямую.
-        result = await self.session.execute(text("SELECT id::text FROM recipients"))
-        return [row[0] for row in result.all()]
+        while True:
+            if after is None:
+                result = await self.session.execute(
+                    text("SELECT id::text FROM recipients ORDER BY id LIMIT :limit"),
+                    {"limit": settings.recipients_chunk_size},
+                )
+            else:
+                result = await self.session.execute(
+                    text(
+                        "SELECT id::text FROM recipients WHERE id > CAST(:after AS uuid) "
+                        "ORDER BY id LIMIT :limit"
+                    ),
+                    {"after": after, "limit": settings.recipients_chunk_size},
+                )
+            chunk = [row[0] for row in result.all()]
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1]
+
+    async def _recipient_chunks(
+        self, recipients: List[str], after: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, List[str]]]:
+        """Пачки получателей вместе с ключом последнего из них.
+
+        Ключ — id получателя для "ALL" и позиция в списке для явных получателей;
+        по нему фан-аут сохраняет чекпоинт и продолжает работу после падения.
+        """
+        if _is_broadcast(recipients):
+            async for chunk in self._iter_all_recipient_ids(after):
+                yield chunk[-1], chunk
+            return
+        size = settings.fanout_batch_size
+        for start in range(int(after or 0), len(recipients), size):
+            chunk = recipients[start:start + size]
+            yield str(start + len(chunk)), chunk
+
+    async def _recipients_between(
+        self, recipients: List[str], after: Optional[str], until: str
+    ) -> AsyncIterator[List[str]]:
+        """Получатели с ключами в диапазоне (after, until]."""
+        if not _is_broadcast(recipients):
+            yield recipients[int(after or 0):int(until)]
+            return
+        async for chunk in self._iter_all_recipient_ids(after):
+            # uuid в Postgres сравниваются так же, как их текстовая форма
+            yield [user_id for user_id in chunk if user_id <= until]
+            if chunk[-1] >= until:
+                return
 
     async def _prepare_body(self, body: str, data: Dict[str, Any]) -> str:
+        """Готовит тело один раз на рассылку: оно общее для всех получателей."""
         # упрощённая подстановка коротких ссылок: data["links"] = ["http://...", ...]
         links = data.get("links") or []
         if isinstance(links, list) and links:
-            short_links = []
-            for url in links:
-                short_links.append(await shorten(str(url)))
+            urls = [str(url) for url in links]
+            shortened = await shorten_many(urls)
             # простой протокол замены {{linkN}}
-            for i, s in enumerate(short_links, start=1):
-                body = body.replace(f"{{{{link{i}}}}}", s)
+            for i, url in enumerate(urls, start=1):
+                body = body.replace(f"{{{{link{i}}}}}", shortened[url])
         return body
 
     def _queue_for_type(self, ntype: NotificationType) -> QueueName:
@@ -50,53 +164,375 @@ class NotificationService:
             NotificationType.INSTANT: QueueName.INSTANT,
         }[ntype]
 
+    def _shared_payload(
+        self,
+        template: NotificationTemplateBase,
+        body: str,
+        data: NotificationCreate,
+        shared_data: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Общая часть рассылки — строка ``message_payloads`` с ключом по содержимому."""
+        shared_data = data.data if shared_data is None else shared_data
+        return {
+            "ref": payload_ref(
+                data.template_id, template.version, template.subject, body, shared_data
+            ),
+            "template_id": data.template_id,
+            "template_version": template.version,
+            "subject": template.subject,
+            "body": body,
+            "data": shared_data,
+        }
+
+    def _use_reference(self, notification_type: NotificationType, recipients: int) -> bool:
+        """Публиковать ли сообщения по ссылке на общую часть, а не целиком.
+
+        Нет, если режим ссылок выключен, получателей мало или это instant
+        (WebSocket-сервер не ходит в БД за общей частью).
+        """
+        return (
+            settings.rabbitmq_message_mode == "reference"
+            and notification_type != NotificationType.INSTANT
+            and recipients >= settings.rabbitmq_reference_min_recipients
+        )
+
+    def _broker_message(
+        self,
+        notification_id: UUID,
+        user_id: str,
+        template: NotificationTemplateBase,
+        body: str,
+        data: NotificationCreate,
+        shared: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if shared is not None:
+            message = {
+                "notification_id": str(notification_id),
+                "user_id": user_id,
+                "template_id": str(data.template_id),
+                "template_version": shared["template_version"],
+                "payload_ref": shared["ref"],
+                "notification_type": data.notification_type.value,
+                "priority": data.priority.value,
+            }
+            delta = _delta(data.data, shared)
+            if delta:
+                message["delta"] = delta
+            return message
+        return {
+            "notification_id": str(notification_id),
+            "user_id": user_id,
+            "template_id": str(data.template_id),
+            "subject": template.subject,
+            "body": body,
+            "notification_type": data.notification_type.value,
+            "priority": data.priority.value,
+            "data": data.data,
+        }
+
+    def _notification_row(
+        self,
+        notification_id: UUID,
+        user_id: str,
+        data: NotificationCreate,
+        shared: Dict[str, Any],
+        created_at: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        # тема и тело не копируются в каждую строку: они в общей части по payload_ref
+        return {
+            "id": notification_id,
+            # created_at входит в PK: у задания он постоянный, чтобы повтор
+            # пачки после рестарта упёрся в тот же ключ
+            "created_at": created_at or datetime.now(timezone.utc),
+            "user_id": user_id,
+            "template_id": data.template_id,
+            "payload_ref": shared["ref"],
+            "notification_type": data.notification_type,
+            "status": DeliveryStatus.PENDING,
+            "data": _delta(data.data, shared),
+            "scheduled_time": data.scheduled_time,
+            "is_recurring": data.is_recurring,
+            "recurrence_pattern": data.recurrence_pattern,
+            "priority": data.priority,
+        }
+
     # === основной поток ===
-    async def send_notification(self, data: NotificationCreate) -> List[Notification]:
-        notifications: List[Notification] = []
-        template = await self.template_repo.get_by_id(data.template_id)
+    async def send_notification(self, data: NotificationCreate) -> List[NotificationBase]:
+        """Рассылка явному списку получателей: строки и сообщения — одной транзакцией.
+
+        Рассылка "всем" здесь не выполняется: ответ держал бы в памяти всех
+        получателей. Для неё есть задание (``create_fanout_job``).
+        """
+        if data.is_broadcast:
+            raise ValueError("Рассылка всем получателям выполняется только заданием")
+        template = await self.template_repo.get_cached(data.template_id)
+        if not template:
+            raise NotFoundError("Шаблон не найден")
+
+        # короткие ссылки считаются один раз на рассылку, а не на получателя
+        body = await self._prepare_body(template.body, data.data)
+        publish_now = not data.scheduled_time and not data.is_recurring
+        shared = self._shared_payload(template, body, data)
+        reference = (
+            shared if self._use_reference(data.notification_type, len(data.recipients)) else None
+        )
+        rows = [
+            self._notification_row(uuid4(), user_id, data, shared)
+            for user_id in dict.fromkeys(data.recipients)
+        ]
+        await self.payload_repo.ensure([shared], commit=False)
+        await self.notification_repo.bulk_create(
+            rows, batch_size=settings.fanout_batch_size, commit=False
+        )
+        # публикуем сразу, если не отложено/не повторяющееся: через outbox,
+        # в одной транзакции со строками уведомлений
+        if publish_now:
+            await self.outbox_repo.add(
+                outbox_rows(
+                    self._queue_for_type(data.notification_type),
+                    (
+                        self._broker_message(
+                            row["id"], row["user_id"], template, body, data, reference
+                        )
+                        for row in rows
+                    ),
+                    data.priority,
+                ),
+                batch_size=settings.fanout_batch_size,
+                commit=False,
+            )
+        await self.session.commit()
+
+        content = {"subject": template.subject, "body": body, "data": data.data}
+        return [NotificationBase.model_validate({**row, **content}) for row in rows]
+
+    async def send_notification_bulk(
+        self, data: NotificationCreate, job: Optional[FanOutJob] = None
+    ) -> Dict[str, int]:
+        """Массовая рассылка: пачки строк и их сообщений в outbox одной транзакцией.
+
+        Если передано задание ``job``, после каждой пачки сохраняется чекпоинт:
+        ``cursor`` и ``published_cursor`` коммитятся в одной транзакции со
+        строками и сообщениями пачки. Повторный запуск продолжает с чекпоинта
+        и не создаёт и не публикует уже обработанных получателей. Чекпоинт
+        пишется, только пока задание за владельцем ``job.owner``; иначе пачка
+        откатывается и поднимается ``JobLeaseLostError``.
+        """
+        template = await self.template_repo.get_cached(data.template_id)
         if not template:
             raise ValueError("Шаблон не найден")
 
-        recipients = data.recipients
-        if len(recipients) == 1 and recipients[0].upper() == "ALL":
-            recipients = await self._all_recipient_ids()
-
-        for user_id in recipients:
-            body = await self._prepare_body(template.body, data.data)
-            notification = Notification(
-                user_id=user_id,
-                template_id=data.template_id,
-                subject=template.subject,
-                body=body,
-                notification_type=data.notification_type,
-                status="pending",
-                data=data.data,
-                scheduled_time=data.scheduled_time,
-                is_recurring=data.is_recurring,
-                recurrence_pattern=data.recurrence_pattern,
+        # тело одинаково для всех получателей — готовим один раз
+        body = await self._prepare_body(template.body, data.data)
+        # отложенные/повторяющиеся опубликует планировщик воркера
+        publish_now = not data.scheduled_time and not data.is_recurring
+        stats = {"created": 0, "published": 0, "failed": 0}
+        after: Optional[str] = None
+        shared = self._shared_payload(template, body, data)
+        # коммитится вместе с первой пачкой строк
+        await self.payload_repo.ensure([shared], commit=False)
+        # массовая рассылка заведомо крупная: порог по числу получателей не нужен
+        reference = (
+            shared
+            if self._use_reference(
+                data.notification_type, settings.rabbitmq_reference_min_recipients
             )
-            created = await self.notification_repo.create(notification)
-            notifications.append(created)
+            else None
+        )
 
-            # публикуем сразу, если не отложено/не повторяющееся
-            if not data.scheduled_time and not data.is_recurring:
-                await publish_message(
-                    self._queue_for_type(data.notification_type),
+        if job is not None:
+            stats = {"created": job.queued, "published": job.published, "failed": job.failed}
+            after = job.cursor
+            if publish_now and job.cursor is not None and job.published_cursor != job.cursor:
+                # чекпоинт задания, начатого до outbox: пачка записана, но не опубликована
+                await self._republish_pending(job, data, template, body, stats, reference)
+
+        async for key, chunk in self._recipient_chunks(data.recipients, after):
+            rows = [
+                self._notification_row(
+                    _notification_id(job, user_id),
+                    user_id,
+                    data,
+                    shared,
+                    job.created_at if job is not None else None,
+                )
+                for user_id in dict.fromkeys(chunk)
+            ]
+            inserted = set(
+                await self.notification_repo.bulk_create(
+                    rows, batch_size=settings.fanout_batch_size, commit=False
+                )
+            )
+            stats["created"] += len(inserted)
+            if publish_now:
+                # уже существующие строки публиковала их первая запись
+                fresh = [row for row in rows if row["id"] in inserted]
+                await self._enqueue_rows(fresh, template, body, data, stats, reference)
+            if job is not None:
+                await self._checkpoint(
+                    job,
                     {
-                        "notification_id": str(created.id),
-                        "user_id": user_id,
-                        "template_id": str(data.template_id),
-                        "subject": template.subject,
-                        "body": body,
-                        "notification_type": data.notification_type.value,
-                        "data": data.data,
+                        "cursor": key,
+                        "queued": stats["created"],
+                        "published_cursor": key,
+                        "published": stats["published"],
+                        "heartbeat_at": datetime.now(timezone.utc),
                     },
                 )
+            await self.session.commit()
+
+        return stats
 
-        return notifications
+    async def _enqueue_rows(
+        self,
+        rows: List[Dict[str, Any]],
+        template: NotificationTemplateBase,
+        body: str,
+        data: NotificationCreate,
+        stats: Dict[str, int],
+        shared: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        # commit — у вызывающего, вместе со строками или чекпоинтом
+        stats["published"] += await self.outbox_repo.add(
+            outbox_rows(
+                self._queue_for_type(data.notification_type),
+                (
+                    self._broker_message(row["id"], row["user_id"], template, body, data, shared)
+                    for row in rows
+                ),
+                data.priority,
+            ),
+            batch_size=settings.fanout_batch_size,
+            commit=False,
+        )
+
+    async def _republish_pending(
+        self,
+        job: FanOutJob,
+        data: NotificationCreate,
+        template: NotificationTemplateBase,
+        body: str,
+        stats: Dict[str, int],
+        shared: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        assert job.cursor is not None
+        async for chunk in self._recipients_between(
+            data.recipients, job.published_cursor, job.cursor
+        ):
+            ids = {_notification_id(job, user_id): user_id for user_id in chunk}
+            # воркер уже мог отправить часть пачки — такие не трогаем
+            pending = await self.notification_repo.get_pending_ids(list(ids))
+            rows = [{"id": notification_id, "user_id": ids[notification_id]} for notification_id in pending]
+            if rows:
+                await self._enqueue_rows(rows, template, body, data, stats, shared)
+        await self._checkpoint(
+            job,
+            {
+                "published_cursor": job.cursor,
+                "published": stats["published"],
+                "heartbeat_at": datetime.now(timezone.utc),
+            },
+        )
+        await self.session.commit()
+
+    async def _checkpoint(self, job: FanOutJob, update_data: Dict[str, Any]) -> None:
+        # commit — у вызывающего: чекпоинт атомарен с пачкой
+        job_id, owner = job.id, job.owner
+        assert owner is not None
+        if not await self.job_repo.update_owned(job_id, owner, update_data, commit=False):
+            # после rollback атрибуты job просрочены — id взят заранее
+            await self.session.rollback()
+            raise JobLeaseLostError(f"Задание {job_id} выполняет другой процесс")
+
+    # === фоновые задания рассылки ===
+    async def create_fanout_job(self, data: NotificationCreate) -> FanOutJob:
+        template = await self.template_repo.get_cached(data.template_id)
+        if not template:
+            raise NotFoundError("Шаблон не найден")
+        job = FanOutJob(request=data.model_dump(mode="json"))
+        return await self.job_repo.create(job)
+
+    async def run_fanout_job(self, job_id: UUID) -> None:
+        # задание могло уже выполняться другим процессом — берём только
+        # новое или то, чей heartbeat устарел дольше lease
+        stale_before = datetime.now(timezone.utc) - timedelta(
+            seconds=settings.fanout_job_lease_seconds
+        )
+        owner = uuid4().hex
+        job = await self.job_repo.claim(job_id, stale_before, owner)
+        if not job:
+            return
+
+        # heartbeat продлевается и между чекпоинтами: долгая пачка не должна
+        # выглядеть брошенной для других процессов
+        renewal = asyncio.create_task(self._renew_job_lease(job_id, owner))
+        try:
+            await self.send_notification_bulk(
+                NotificationCreate.model_validate(job.request), job=job
+            )
+        except asyncio.CancelledError:
+            # остановка процесса: задание продолжит работу с чекпоинта
+            raise
+        except JobLeaseLostError:
+            logger.warning("FANOUT_JOB_LEASE_LOST", job_id=str(job_id))
+            return
+        except Exception as error:
+            await self.session.rollback()
+            await self.job_repo.update_owned(
+                job_id,
+                owner,
+                {
+                    "status": JobStatus.FAILED,
+                    "error_message": str(error),
+                    "finished_at": datetime.now(timezone.utc),
+                },
+            )
+            raise
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+        await self.job_repo.update_owned(
+            job_id, owner, {"status": JobStatus.COMPLETED, "finished_at": datetime.now(timezone.utc)}
+        )
+
+    async def _renew_job_lease(self, job_id: UUID, owner: str) -> None:
+        """Продлевает heartbeat задания из своей сессии, пока им владеет ``owner``."""
+        while True:
+            await asyncio.sleep(settings.fanout_job_lease_seconds / 3)
+            try:
+                async with AsyncDBSession() as session:
+                    renewed = await FanOutJobRepository(session).update_owned(
+                        job_id, owner, {"heartbeat_at": datetime.now(timezone.utc)}
+                    )
+            except Exception as error:
+                # следующая попытка ещё успеет до конца аренды
+                logger.warning("FANOUT_JOB_RENEW_ERROR", job_id=str(job_id), error=str(error))
+                continue
+            if not renewed:
+                # задание забрал другой процесс — ближайший чекпоинт это обнаружит
+                return
+
+    async def get_fanout_job(self, job_id: UUID) -> FanOutJobRead:
+        job = await self.job_repo.get_by_id(job_id)
+        if not job:
+            raise ValueError("Задание не найдено")
+        return FanOutJobRead.from_job(job)
 
     # событие от внешних сервисов (свободный формат)
     async def process_event(self, event: NotificationEvent) -> Dict[str, Any]:
+        """Событие: созданные уведомления или, для рассылки "всем", задание в ``jobs``.
+
+        Задание запускает вызывающий.
+        """
+        create = await self._resolve_event(event)
+        if create.is_broadcast:
+            job = await self.create_fanout_job(create)
+            return {"created": [], "jobs": [str(job.id)]}
+        created = await self.send_notification(create)
+        return {"created": [str(n.id) for n in created]}
+
+    async def _resolve_event(self, event: NotificationEvent) -> NotificationCreate:
+        """Превращает событие в запрос рассылки."""
         # Простой роутинг:
         payload = event.data.copy()
         template_id = payload.get("template_id")
@@ -115,37 +551,272 @@ class NotificationService:
                 payload["notification_type"] = NotificationType.PUSH.value
                 payload["recipients"] = ["ALL"]
 
-        create = NotificationCreate(
-            template_id=UUID(payload["template_id"]),
+        # шаблон можно указать по имени — он резолвится через кэш шаблонов
+        if not payload.get("template_id") and payload.get("template_name"):
+            template = await self.template_repo.get_cached_by_name(payload["template_name"])
+            if not template:
+                raise ValueError("Шаблон не найден")
+            payload["template_id"] = str(template.id)
+
+        if not payload.get("template_id") or not payload.get("notification_type"):
+            raise ValueError("В событии не указаны шаблон или тип уведомления")
+        if not payload.get("recipients"):
+            raise ValueError("В событии не указаны получатели")
+
+        return NotificationCreate(
+            template_id=UUID(str(payload["template_id"])),
             recipients=list(map(str, payload["recipients"])),
             notification_type=NotificationType(payload["notification_type"]),
             scheduled_time=payload.get("scheduled_time"),
             is_recurring=payload.get("is_recurring", False),
             recurrence_pattern=payload.get("recurrence_pattern"),
+            priority=PriorityLevel(payload.get("priority") or PriorityLevel.NORMAL),
             data=payload.get("data", {}),
         )
-        created = await self.send_notification(create)
-        return {"created": [str(n.id) for n in created]}
+
+    async def process_events(self, events: List[NotificationEvent]) -> List[EventResult]:
+        """Пакет событий: результат по каждому событию в порядке следования.
+
+        События группируются по шаблону, каналу и приоритету: шаблон ищется один раз на
+        группу, строки группы пишутся пачками одним INSERT и публикуются одной
+        пакетной публикацией. Для событий "всем" создаётся задание рассылки
+        (``job_id`` в результате) — запустить его должен вызывающий.
+        Группы коммитятся по отдельности, поэтому сбой группы становится ошибкой
+        её событий, а не всего пакета: иначе повтор продублировал бы уже
+        записанные группы.
+        """
+        results = [EventResult(index=index) for index in range(len(events))]
+        groups: Dict[
+            Tuple[UUID, NotificationType, PriorityLevel], List[Tuple[int, NotificationCreate]]
+        ] = {}
+        for index, event in enumerate(events):
+            try:
+                create = await self._resolve_event(event)
+                if create.is_broadcast:
+                    job = await self.create_fanout_job(create)
+                    results[index].job_id = job.id
+                    continue
+            except ValueError as error:
+                results[index].success = False
+                results[index].error = str(error)
+                continue
+            except Exception as error:
+                await self.session.rollback()
+                logger.exception("EVENT_FAILED", index=index, error=str(error))
+                results[index].success = False
+                results[index].error = "Не удалось обработать событие"
+                continue
+            key = (create.template_id, create.notification_type, create.priority)
+            groups.setdefault(key, []).append((index, create))
+
+        for (template_id, notification_type, priority), items in groups.items():
+            try:
+                await self._process_event_group(
+                    template_id, notification_type, priority, items, results
+                )
+            except Exception as error:
+                await self.session.rollback()
+                logger.exception(
+                    "EVENT_GROUP_FAILED", template_id=str(template_id), error=str(error)
+                )
+                for index, _ in items:
+                    results[index] = EventResult(
+                        index=index, success=False, error="Не удалось сохранить события"
+                    )
+        return results
+
+    async def _process_event_group(
+        self,
+        template_id: UUID,
+        notification_type: NotificationType,
+        priority: PriorityLevel,
+        items: List[Tuple[int, NotificationCreate]],
+        results: List[EventResult],
+    ) -> None:
+        template = await self.template_repo.get_cached(template_id)
+        if not template:
+            for index, _ in items:
+                results[index].success = False
+                results[index].error = "Шаблон не найден"
+            return
+
+        rows: List[Dict[str, Any]] = []
+        messages: List[Dict[str, Any]] = []
+        use_reference = self._use_reference(
+            notification_type, sum(len(create.recipients) for _, create in items)
+        )
+        # тело зависит только от ссылок события — одинаковые считаем один раз;
+        # общая часть — тема и тело, data события хранится и передаётся дельтой
+        bodies: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for index, create in items:
+            links_key = repr(create.data.get("links"))
+            if links_key not in bodies:
+                prepared = await self._prepare_body(template.body, create.data)
+                bodies[links_key] = (prepared, self._shared_payload(template, prepared, create, {}))
+            body, shared = bodies[links_key]
+            reference = shared if use_reference else None
+            publish_now = not create.scheduled_time and not create.is_recurring
+            for user_id in dict.fromkeys(create.recipients):
+                row = self._notification_row(uuid4(), user_id, create, shared)
+                rows.append(row)
+                results[index].notification_ids.append(row["id"])
+                if publish_now:
+                    messages.append(
+                        self._broker_message(row["id"], user_id, template, body, create, reference)
+                    )
+            results[index].created = len(results[index].notification_ids)
+
+        # общие части, строки и сообщения группы — одной транзакцией
+        await self.payload_repo.ensure([shared for _, shared in bodies.values()], commit=False)
+        await self.outbox_repo.add(
+            outbox_rows(self._queue_for_type(notification_type), messages, priority),
+            batch_size=settings.fanout_batch_size,
+            commit=False,
+        )
+        await self.notification_repo.bulk_create(rows, batch_size=settings.fanout_batch_size)
 
     # === выдача пользователю уведомлений ===
-    async def get_user_notifications(self, user_id: str) -> List[Notification]:
-        return await self.notification_repo.get_by_user(user_id)
+    async def get_user_notifications(
+        self,
+        user_id: str,
+        filters: NotificationFilter,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Page[NotificationSummary]:
+        return await self._page(filters, limit, cursor, user_id)
+
+    async def get_inbox(
+        self, user_id: str, limit: int, cursor: Optional[str] = None
+    ) -> Page[NotificationSummary]:
+        """Входящие: доставленные уведомления (без ``pending``) из Redis.
+
+        Промах (входящие не построены) отдаёт первую страницу из той же
+        выборки Postgres, которой строятся входящие. Страницы старше окна
+        Redis и чтения при недоступном Redis идут в Postgres.
+        """
+        filters = NotificationFilter()
+        after = decode_cursor(cursor) if cursor else None
+        try:
+            cached = await inbox_store.page(user_id, limit, after)
+        except RedisError as error:
+            INBOX_READS.labels("error").inc()
+            logger.warning("INBOX_READ_ERROR", user_id=user_id, error=str(error))
+            return await self._page(filters, limit, cursor, user_id, inbox=True)
+        if cached is not None:
+            INBOX_READS.labels("hit").inc()
+            return _inbox_page(cached.items, cached.has_more)
+        # окно короче страницы или кончилось раньше курсора: сборка не поможет
+        if after is not None or limit >= settings.inbox_size:
+            INBOX_READS.labels("fallback").inc()
+            return await self._page(filters, limit, cursor, user_id, inbox=True)
+        INBOX_READS.labels("miss").inc()
+        rows = await self._rebuild_inbox(user_id)
+        return _inbox_page(rows[:limit], len(rows) > limit)
+
+    async def _rebuild_inbox(self, user_id: str) -> List[Dict[str, Any]]:
+        """Строит входящие из Postgres; вернёт их строки от новых к старым."""
+        try:
+            token: Optional[str] = await inbox_store.begin_rebuild(user_id)
+        except RedisError as error:
+            logger.warning("INBOX_REBUILD_ERROR", user_id=user_id, error=str(error))
+            token = None
+        # основная БД, а не реплика запроса: доставки, закоммиченные до метки
+        # сборки, воркер во входящие не дописал — они должны попасть в выборку
+        async with AsyncDBSession() as session:
+            rows, unread_total = await NotificationRepository(session).list_inbox(
+                user_id, settings.inbox_size
+            )
+        if token is not None:
+            try:
+                await inbox_store.rebuild(user_id, token, rows, unread_total)
+            except RedisError as error:
+                logger.warning("INBOX_REBUILD_ERROR", user_id=user_id, error=str(error))
+        return rows
+
+    async def get_unread_count(self, user_id: str) -> int:
+        try:
+            unread = await inbox_store.unread(user_id)
+        except RedisError as error:
+            logger.warning("INBOX_READ_ERROR", user_id=user_id, error=str(error))
+            unread = None
+        if unread is None:
+            unread = await self.notification_repo.count_unread(user_id)
+        return unread
+
+    async def mark_read(
+        self, user_id: str, notification_ids: Optional[List[UUID]] = None
+    ) -> InboxCounters:
+        """Отмечает прочитанными уведомления (без списка — все) в Postgres, затем во входящих.
+
+        Во входящие уходят только id, которые Postgres перевёл из непрочитанных,
+        поэтому повтор отметки не уменьшает счётчик дважды.
+        """
+        read_at = datetime.now(timezone.utc)
+        unread: Optional[int] = None
+        if notification_ids is None:
+            marked = await self.notification_repo.mark_all_read(user_id, read_at)
+            await self.session.commit()
+            try:
+                if await inbox_store.mark_all_read(user_id, read_at):
+                    unread = await inbox_store.unread(user_id)
+            except RedisError as error:
+                logger.warning("INBOX_MARK_READ_ERROR", user_id=user_id, error=str(error))
+        else:
+            marked_ids = await self.notification_repo.mark_read(user_id, notification_ids, read_at)
+            await self.session.commit()
+            marked = len(marked_ids)
+            try:
+                unread = await inbox_store.mark_read(user_id, marked_ids, read_at)
+            except RedisError as error:
+                logger.warning("INBOX_MARK_READ_ERROR", user_id=user_id, error=str(error))
+        if unread is None:
+            unread = await self.notification_repo.count_unread(user_id)
+        return InboxCounters(unread=unread, marked=marked)
+
+    async def _page(
+        self,
+        filters: NotificationFilter,
+        limit: int,
+        cursor: Optional[str],
+        user_id: Optional[str] = None,
+        inbox: bool = False,
+    ) -> Page[NotificationSummary]:
+        after = decode_cursor(cursor) if cursor else None
+        # берём на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = await self.notification_repo.list_page(filters, limit + 1, after, user_id, inbox)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        # строки проекции уже типизированы драйвером — без повторной валидации
+        return Page[NotificationSummary].model_construct(items=rows, next_cursor=next_cursor)
+
+    async def export_notifications(
+        self, filters: NotificationFilter, user_id: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """NDJSON-выгрузка из серверного курсора: память не растёт с числом строк."""
+        # своя сессия: тело ответа стримится уже после выхода из зависимости запроса
+        async with AsyncDBSession() as session:
+            async for row in NotificationRepository(session).stream(filters, user_id):
+                yield dumps(row, orjson.OPT_APPEND_NEWLINE)
 
     # === CRUD уведомлений ===
-    async def get_notification(self, notification_id: UUID) -> Notification:
-        notification = await self.notification_repo.get_by_id(notification_id)
+    async def get_notification(self, notification_id: UUID) -> NotificationBase:
+        notification = await self.notification_repo.get_resolved(notification_id)
         if not notification:
             raise ValueError("Уведомление не найдено")
         return notification
 
-    async def list_notifications(self) -> List[Notification]:
-        return await self.notification_repo.list()
+    async def list_notifications(
+        self, filters: NotificationFilter, limit: int, cursor: Optional[str] = None
+    ) -> Page[NotificationSummary]:
+        return await self._page(filters, limit, cursor)
 
-    async def update_notification(self, notification_id: UUID, update_data: dict) -> Notification:
+    async def update_notification(self, notification_id: UUID, update_data: dict) -> NotificationBase:
         notification = await self.notification_repo.update(notification_id, update_data)
         if not notification:
             raise ValueError("Уведомление не найдено для обновления")
-        return notification
+        return await self.get_notification(notification_id)
 
     async def delete_notification(self, notification_id: UUID) -> None:
         deleted = await self.notification_repo.delete_notification(notification_id)
@@ -156,18 +827,28 @@ class NotificationService:
     async def get_templates(self) -> List[NotificationTemplate]:
         return await self.template_repo.list()
 
-    async def get_template(self, template_id: UUID) -> NotificationTemplate:
-        template = await self.template_repo.get_by_id(template_id)
+    async def get_template(self, template_id: UUID) -> NotificationTemplateBase:
+        template = await self.template_repo.get_cached(template_id)
         if not template:
             raise ValueError("Шаблон не найден")
         return template
 
     async def create_template(self, template_data: NotificationTemplateBase) -> NotificationTemplate:
-        templates = await self.template_repo.list()
-        if any(t.name == template_data.name for t in templates):
-            raise ValueError("Шаблон с таким именем уже существует")
+        if await self.template_repo.exists_by_name(template_data.name):
+            raise ConflictError("Шаблон с таким именем уже существует")
         template = NotificationTemplate(**template_data.model_dump())
-        return await self.template_repo.create(template)
+        try:
+            return await self.template_repo.create(template)
+        except IntegrityError:
+            # параллельное создание с тем же именем поймал уникальный индекс
+            await self.session.rollback()
+            raise ConflictError("Шаблон с таким именем уже существует")
+
+    async def import_templates(self, templates: List[NotificationTemplateCreate]) -> List[UUID]:
+        # при повторе имени в одной пачке побеждает последний шаблон
+        by_name = {template.name: template for template in templates}
+        rows = [{"id": uuid4(), **template.model_dump()} for template in by_name.values()]
+        return await self.template_repo.upsert_many(rows)
 
     async def update_template(self, template_id: UUID, update_data: dict) -> NotificationTemplate:
         template = await self.template_repo.update(template_id, update_data)
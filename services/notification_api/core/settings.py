@@ -1,5 +1,5 @@
 import pathlib
-from typing import List, Literal
+from typing import Dict, List, Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -16,6 +16,14 @@ class Settings(BaseSettings):
 
     log_level: str = "INFO"
     log_json_format: bool = False
+    # доля успешных запросов в логе; ошибки и медленные пишутся всегда
+    log_sample_rate: float = 0.1
+    log_slow_request_seconds: float = 1.0
+    # записи ждут фонового потока в очереди; при переполнении отбрасываются
+    log_queue_size: int = 10000
+    # доля и предел в секунду для событий по имени, например {"FANOUT_JOB_RESUMED": 1}
+    log_event_sample_rates: Dict[str, float] = {}
+    log_event_rate_limits: Dict[str, float] = {}
 
     allowed_hosts: List[str] = ["*"]
     cors_origins: List[str] = ["*"]
@@ -29,14 +37,84 @@ class Settings(BaseSettings):
     postgres_password: str
     postgres_host: str
     postgres_port: str
+    # реплика для чтения (host:port, как postgres_host); без неё всё в основную БД
+    postgres_replica_host: Optional[str] = None
+    database_replica_pool_size: int = 10
+    # отстающая сильнее реплика не используется
+    replica_max_lag_seconds: float = 5.0
+    replica_lag_poll_seconds: float = 1.0
 
     rabbitmq_host: str = "rabbitmq"
     rabbitmq_port: int = 5672
     rabbitmq_user: str = "guest"
     rabbitmq_password: str = "guest"
     rabbitmq_vhost: str = "/"
+    rabbitmq_channel_pool_size: int = 10
+    rabbitmq_publish_batch_size: int = 500
+    # формат тела сообщений: msgpack включать после обновления всех консьюмеров
+    rabbitmq_wire_format: Literal["json", "msgpack"] = "json"
+    # reference: сообщения рассылки несут ссылку на общую часть вместо темы и тела;
+    # включать после обновления воркеров, instant-сообщения всегда полные
+    rabbitmq_message_mode: Literal["inline", "reference"] = "inline"
+    rabbitmq_reference_min_recipients: int = 100
+
+    fanout_batch_size: int = 1000
+    recipients_chunk_size: int = 5000
+    fanout_max_concurrent_jobs: int = 2
+    fanout_job_lease_seconds: int = 60
+
+    # секции notifications по месяцам: сколько создавать вперёд, сколько
+    # месяцев хранить и куда выгружать отсоединённые (см. core.partitions)
+    notifications_partitions_ahead: int = 2
+    notifications_retention_months: int = 6
+    notifications_archive_dir: str = "/var/lib/notification-api/archive"
+    partition_maintenance_seconds: int = 3600
+
+    page_default_size: int = 50
+    page_max_size: int = 500
+    export_fetch_size: int = 1000
+
+    template_cache_size: int = 1024
+    template_cache_ttl_seconds: int = 300
+
+    # входящие пользователя в Redis (см. shared.inbox.store): окно последних
+    # уведомлений, срок жизни без обращений и предел id в отметке о прочтении
+    redis_host: str = "redis"
+    redis_port: int = 6379
+    inbox_size: int = 200
+    inbox_ttl_seconds: int = 259200
+    inbox_mark_read_max_ids: int = 1000
+
+    events_batch_max_size: int = 10000
+    # квитанции о доставке: предел запроса и квитанций в одном сообщении очереди
+    receipts_batch_max_size: int = 50000
+    receipts_message_size: int = 500
+
+    admission_enabled: bool = True
+    admission_poll_seconds: float = 2.0
+    admission_max_queue_depth: int = 100000
+    admission_max_wait_seconds: float = 60.0
+    admission_max_defer_seconds: float = 600.0
+    admission_channel_rate: float = 2000.0
+    admission_channel_burst: int = 20000
+    admission_caller_rate: float = 500.0
+    admission_caller_burst: int = 5000
+    admission_max_tracked_callers: int = 10000
+    admission_caller_idle_seconds: int = 600
+    # клиент квоты — адрес соединения; X-Client-Id учитывается только от этих
+    # адресов (шлюза, который сам аутентифицирует клиентов)
+    admission_trusted_proxies: List[str] = []
+    # как часто обновлять оценку числа получателей рассылки "всем"
+    admission_recipients_estimate_seconds: float = 60.0
+
+    idempotency_ttl_seconds: int = 86400
+    idempotency_lock_seconds: int = 60
+    idempotency_wait_seconds: float = 30.0
 
     link_shortener_base_url: str = "http://link-shortener:8000"
+    link_shortener_max_connections: int = 20
+    # не больше SHORTEN_BATCH_MAX_SIZE шортенера
+    link_shortener_batch_size: int = 1000
 
     websocket_secret: str = "dev-secret"
 
@@ -47,5 +125,14 @@ class Settings(BaseSettings):
             f"?user={self.postgres_user}&password={self.postgres_password}"
         )
 
+    @property
+    def replica_database_url(self) -> Optional[str]:
+        if not self.postgres_replica_host:
+            return None
+        return (
+            f"postgresql+asyncpg://{self.postgres_replica_host}/{self.postgres_db}"
+            f"?user={self.postgres_user}&password={self.postgres_password}"
+        )
+
 
 settings = Settings()
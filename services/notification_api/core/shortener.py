@@ -1,20 +1,61 @@
-from typing import Dict
+from typing import Dict, List, Optional
 
 import httpx
 
 from core.settings import settings
 
+# один keep-alive клиент на процесс вместо нового AsyncClient на каждую ссылку
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=settings.link_shortener_base_url,
+            timeout=3.0,
+            limits=httpx.Limits(
+                max_connections=settings.link_shortener_max_connections,
+                max_keepalive_connections=settings.link_shortener_max_connections,
+            ),
+        )
+    return _client
+
 
 async def shorten(url: str) -> str:
     """Вернёт короткую ссылку из сервиса шортенера."""
     try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            resp = await client.post(
-                f"{settings.link_shortener_base_url}/shorten",
-                json={"original_url": url},
-            )
-            resp.raise_for_status()
-            data: Dict[str, str] = resp.json()
-            return data.get("short_url") or url
+        resp = await _get_client().post("/shorten", json={"original_url": url})
+        resp.raise_for_status()
+        data: Dict[str, str] = resp.json()
+        return data.get("short_url") or url
     except Exception:
         return url  # не ломаем поток, если шортенер не отвечает
+
+
+async def shorten_many(urls: List[str]) -> Dict[str, str]:
+    """Сокращает ссылки пакетами: вернёт словарь исходная -> короткая."""
+    unique = list(dict.fromkeys(urls))
+    if not unique:
+        return {}
+    shortened: Dict[str, str] = {}
+    # шортенер отклоняет пакеты больше своего лимита
+    batch_size = settings.link_shortener_batch_size
+    for start in range(0, len(unique), batch_size):
+        try:
+            resp = await _get_client().post(
+                "/shorten/batch", json={"original_urls": unique[start : start + batch_size]}
+            )
+            resp.raise_for_status()
+        except Exception:
+            continue  # не ломаем поток, если шортенер не отвечает
+        shortened.update(
+            (item["original_url"], item.get("short_url") or item["original_url"])
+            for item in resp.json()
+        )
+    return {url: shortened.get(url, url) for url in unique}
+
+
+async def close_shortener() -> None:
+    if _client is not None:
+        await _client.aclose()
@@ -3,10 +3,22 @@ from typing import AsyncGenerator
 
 import structlog
 from api.v1 import router as v1_router
-from core.db import dispose_db, init_db
+from core.admission import admission_controller
+from core.broker import close_broker
+from core.cache import template_invalidation_listener
+from core.db import dispose_db, init_db, replica_engine, replica_monitor
+from core.idempotency import idempotency_store
+from core.inbox import close_inbox
+from core.jobs import fanout_executor
 from core.logging_settings import LoggingMiddleware, setup_logging
-from fastapi import FastAPI
+from core.replica import ReadAfterWriteMiddleware
+from core.retention import partition_maintainer
+from core.shortener import close_shortener
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from models.base import BaseResponse
+from shared.utils.logging_pipeline import shutdown_logging
+from shared.utils.metrics import render_metrics
 
 logger = structlog.get_logger(__name__)
 
@@ -17,16 +29,41 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     logger.info("Приложение запускается...")
     await init_db()
     logger.info("Соединение с базой данных открыто")
+    fanout_executor.start()
+    template_invalidation_listener.start()
+    idempotency_store.start()
+    admission_controller.start()
+    partition_maintainer.start()
+    replica_monitor.start()
     yield
+    await replica_monitor.stop()
+    await partition_maintainer.stop()
+    await admission_controller.stop()
+    await idempotency_store.stop()
+    await template_invalidation_listener.stop()
+    await fanout_executor.shutdown()
+    await close_broker()
+    logger.info("Соединение с брокером закрыто")
+    await close_shortener()
+    await close_inbox()
     await dispose_db()
     logger.info("Соединение с базой данных закрыто")
     logger.info("Приложение завершает работу...")
+    shutdown_logging()
 
 
-app = FastAPI(title="Notification API", version="0.1.0", lifespan=lifespan)
+# orjson вместо json.dumps для всех ответов, кроме явно заданного response_class
+app = FastAPI(
+    title="Notification API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 app.include_router(v1_router)
 
 app.add_middleware(LoggingMiddleware)
+if replica_engine is not None:
+    app.add_middleware(ReadAfterWriteMiddleware)
 
 
 @app.get(
@@ -36,6 +73,12 @@ async def health_check() -> BaseResponse:
     return BaseResponse(success=True, message="Ok")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(body, headers={"Content-Type": content_type})
+
+
 if __name__ == "__main__":
     import uvicorn
 
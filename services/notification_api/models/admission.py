@@ -0,0 +1,37 @@
+from typing import Dict, List, Union
+
+from models.delivery import PriorityLevel
+from pydantic import BaseModel
+
+
+class LaneState(BaseModel):
+    queue: str
+    priority: PriorityLevel
+    depth: int = 0
+    consumers: int = 0
+    drain_rate: float = 0.0  # сообщений в секунду, оценка по замерам глубины
+    estimated_wait_seconds: Union[float, None] = None
+    saturated: bool = False
+
+
+class ChannelState(BaseModel):
+    tokens: float
+    rate: float
+    burst: int
+    lanes: List[LaneState] = []
+
+
+class AdmissionStatus(BaseModel):
+    enabled: bool
+    updated_at: Union[float, None] = None  # unix time последнего замера очередей
+    channels: Dict[str, ChannelState] = {}
+    tracked_callers: int = 0
+
+
+class AdmissionDecision(BaseModel):
+    admitted: bool = True
+    status_code: Union[int, None] = None
+    retry_after: Union[float, None] = None
+    reason: Union[str, None] = None
+    # 0 — публиковать сразу; иначе отложить отправку на столько секунд
+    defer_seconds: float = 0.0
@@ -1,15 +1,25 @@
 from datetime import datetime
-from typing import Any, Union
+from typing import Generic, List, TypeVar, Union
 
 from pydantic import BaseModel
 
+T = TypeVar("T")
+
+
+class BaseResponse(BaseModel, Generic[T]):
+    """Ответ API. ``BaseResponse[Схема]`` даёт типизированное поле ``data``:
+    FastAPI сериализует его по схеме, а не обходит произвольные объекты."""
 
-class BaseResponse(BaseModel):
     success: bool = True
     message: Union[str, None] = None
-    data: Any = None
+    data: Union[T, None] = None
 
 
 class TimestampModel(BaseModel):
     created_at: Union[datetime, None] = None
     updated_at: Union[datetime, None] = None
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T] = []
+    next_cursor: Union[str, None] = None
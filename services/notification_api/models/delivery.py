@@ -19,6 +19,15 @@ class DeliveryStatus(str, Enum):
     DELIVERED = "delivered"
 
 
+class JobStatus(str, Enum):
+    """Статусы фоновых заданий рассылки"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class PriorityLevel(str, Enum):
     """Уровни приоритета уведомлений"""
 
@@ -0,0 +1,18 @@
+from typing import List, Union
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class InboxReadRequest(BaseModel):
+    """Отметка о прочтении: перечисленные уведомления, а без списка — все"""
+
+    notification_ids: Union[List[UUID], None] = None
+
+
+class InboxCounters(BaseModel):
+    """Счётчики входящих пользователя"""
+
+    unread: int
+    # сколько уведомлений отметка перевела в прочитанные
+    marked: int = 0
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+from typing import Any, Union
+from uuid import UUID
+
+from models.delivery import JobStatus
+from pydantic import BaseModel
+
+
+class FanOutJobRead(BaseModel):
+    id: UUID
+    status: JobStatus
+    queued: int = 0
+    published: int = 0
+    failed: int = 0
+    throughput: float = 0.0  # опубликовано сообщений в секунду
+    error_message: Union[str, None] = None
+    created_at: Union[datetime, None] = None
+    started_at: Union[datetime, None] = None
+    finished_at: Union[datetime, None] = None
+
+    @classmethod
+    def from_job(cls, job: Any) -> "FanOutJobRead":
+        throughput = 0.0
+        if job.started_at:
+            finished = job.finished_at or datetime.now(timezone.utc)
+            elapsed = (finished - job.started_at).total_seconds()
+            if elapsed > 0:
+                throughput = round(job.published / elapsed, 2)
+        return cls(
+            id=job.id,
+            status=job.status,
+            queued=job.queued,
+            published=job.published,
+            failed=job.failed,
+            throughput=throughput,
+            error_message=job.error_message,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+        )
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Any, Dict, List, Union
 from uuid import UUID
 
-from models.delivery import DeliveryStatus, NotificationType
+from models.delivery import DeliveryStatus, NotificationType, PriorityLevel
 from pydantic import BaseModel, Field
 from sqlmodel import SQLModel
 
@@ -14,6 +14,8 @@ class NotificationTemplateBase(SQLModel):
     body: str
     notification_type: NotificationType
     variables: List[str] = Field(default_factory=list)
+    # растёт при каждом изменении: по нему сообщение ссылается на редакцию шаблона
+    version: int = 1
 
 
 class NotificationTemplateCreate(BaseModel):
@@ -31,8 +33,14 @@ class NotificationCreate(BaseModel):
     scheduled_time: Union[datetime, None] = None
     is_recurring: bool = False
     recurrence_pattern: Union[str, None] = None  # "weekly:FRI", "yearly:01-01"
+    priority: PriorityLevel = PriorityLevel.NORMAL
     data: Dict[str, Any] = Field(default_factory=dict)
 
+    @property
+    def is_broadcast(self) -> bool:
+        """Рассылка всем получателям (``recipients: ["ALL"]``)."""
+        return len(self.recipients) == 1 and self.recipients[0].upper() == "ALL"
+
 
 class NotificationEvent(BaseModel):
     event_type: str
@@ -40,6 +48,42 @@ class NotificationEvent(BaseModel):
     data: Dict[str, Any] = Field(default_factory=dict)
 
 
+class EventResult(BaseModel):
+    """Итог обработки одного события из пакета."""
+
+    index: int
+    success: bool = True
+    created: int = 0
+    notification_ids: List[UUID] = Field(default_factory=list)
+    # рассылка "всем" идёт фоновым заданием: GET /jobs/{job_id}
+    job_id: Union[UUID, None] = None
+    error: Union[str, None] = None
+
+
+class NotificationFilter(BaseModel):
+    status: Union[DeliveryStatus, None] = None
+    notification_type: Union[NotificationType, None] = None
+    created_from: Union[datetime, None] = None
+    created_to: Union[datetime, None] = None
+
+
+class NotificationSummary(BaseModel):
+    """Строка списка уведомлений: без тяжёлых ``body`` и ``data``."""
+
+    id: UUID
+    user_id: str
+    template_id: UUID
+    notification_type: NotificationType
+    status: DeliveryStatus
+    priority: PriorityLevel = PriorityLevel.NORMAL
+    subject: str
+    created_at: datetime
+    sent_at: Union[datetime, None] = None
+    delivered_at: Union[datetime, None] = None
+    error_message: Union[str, None] = None
+    read_at: Union[datetime, None] = None
+
+
 class NotificationMessage(BaseModel):
     user_id: str
     template_id: UUID
@@ -59,8 +103,10 @@ class NotificationBase(SQLModel):
     status: DeliveryStatus
     sent_at: Union[datetime, None] = None
     delivered_at: Union[datetime, None] = None
+    read_at: Union[datetime, None] = None
     error_message: Union[str, None] = None
     data: Dict[str, Any] = Field(default_factory=dict)
     scheduled_time: Union[datetime, None] = None
     is_recurring: bool = False
     recurrence_pattern: Union[str, None] = None
+    priority: PriorityLevel = PriorityLevel.NORMAL
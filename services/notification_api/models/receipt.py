@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from typing import Union
+from uuid import UUID
+
+from models.delivery import DeliveryStatus
+from pydantic import BaseModel, Field, field_validator
+
+
+class DeliveryReceipt(BaseModel):
+    """Квитанция провайдера о судьбе уведомления"""
+
+    notification_id: UUID
+    status: DeliveryStatus
+    # время события у провайдера; без него — время приёма
+    occurred_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    error_message: Union[str, None] = None
+
+    @field_validator("status")
+    @classmethod
+    def _not_pending(cls, status: DeliveryStatus) -> DeliveryStatus:
+        if status == DeliveryStatus.PENDING:
+            raise ValueError("Квитанция не может вернуть статус pending")
+        return status
+
+    @field_validator("occurred_at")
+    @classmethod
+    def _utc(cls, occurred_at: datetime) -> datetime:
+        # воркер сравнивает время квитанций строкой ISO 8601 — приводим к одной зоне
+        if occurred_at.tzinfo is None:
+            return occurred_at.replace(tzinfo=timezone.utc)
+        return occurred_at.astimezone(timezone.utc)
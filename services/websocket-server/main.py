@@ -2,11 +2,18 @@ import asyncio
 import json
 import hmac
 import hashlib
+import time
 from typing import Dict, Set
 
-import aio_pika
 import structlog
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Response
+from prometheus_client import Gauge, Histogram
+
+from shared.broker.lanes import PRIORITY_LANES, lane_queue
+from shared.broker.publisher import AmqpPublisher
+from shared.models.wire import decode_message
+from shared.utils.logging_pipeline import configure_logging, shutdown_logging
+from shared.utils.metrics import BROKER_MESSAGES_CONSUMED, render_metrics
 
 from .settings import settings
 
@@ -21,9 +28,19 @@ def amqp_url() -> str:
     )
 
 
+# общее robust-соединение процесса с RabbitMQ
+publisher = AmqpPublisher(amqp_url())
+
 # Пул подключений по user_id
 connections: Dict[str, Set[WebSocket]] = {}
 
+WS_CONNECTIONS = Gauge("websocket_connections", "Открытые WebSocket-подключения")
+WS_FANOUT_SECONDS = Histogram(
+    "websocket_fanout_seconds",
+    "Доставка сообщения во все подключения пользователя",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
 
 def authorized(user_id: str, token: str) -> bool:
     expected = hmac.new(
@@ -40,6 +57,7 @@ async def ws_endpoint(ws: WebSocket, user_id: str, token: str) -> None:
 
     await ws.accept()
     connections.setdefault(user_id, set()).add(ws)
+    WS_CONNECTIONS.inc()
     logger.info("WS_CONNECTED", user_id=user_id)
 
     try:
@@ -52,20 +70,27 @@ async def ws_endpoint(ws: WebSocket, user_id: str, token: str) -> None:
         connections[user_id].discard(ws)
         if not connections[user_id]:
             del connections[user_id]
+        WS_CONNECTIONS.dec()
         logger.info("WS_DISCONNECTED", user_id=user_id)
 
 
 async def consumer_loop() -> None:
-    """Читает instant_notifications и пушит по ws."""
-    connection = await aio_pika.connect_robust(amqp_url())
+    """Читает все полосы приоритета instant_notifications и пушит по ws."""
+    await asyncio.gather(
+        *(_consume_lane(lane_queue("instant_notifications", level)) for level in PRIORITY_LANES)
+    )
+
+
+async def _consume_lane(queue_name: str) -> None:
+    connection = await publisher.connect()
+    channel = await connection.channel()
     try:
-        channel = await connection.channel()
-        queue = await channel.declare_queue("instant_notifications", durable=True)
+        queue = await channel.declare_queue(queue_name, durable=True)
         async with queue.iterator() as qit:
             async for message in qit:
                 async with message.process():
                     try:
-                        payload = json.loads(message.body.decode("utf-8"))
+                        payload = decode_message(message.body, message.content_type)
                         uid = payload["user_id"]
                         text = json.dumps(
                             {
@@ -75,14 +100,40 @@ async def consumer_loop() -> None:
                             },
                             ensure_ascii=False,
                         )
-                        for ws in connections.get(uid, set()).copy():
-                            await ws.send_text(text)
+                        sockets = connections.get(uid)
+                        if sockets:
+                            started = time.perf_counter()
+                            for ws in sockets.copy():
+                                await ws.send_text(text)
+                            WS_FANOUT_SECONDS.observe(time.perf_counter() - started)
                     except Exception as e:
+                        BROKER_MESSAGES_CONSUMED.labels(queue_name, "error").inc()
                         logger.exception("WS_CONSUMER_ERROR", error=str(e))
+                    else:
+                        BROKER_MESSAGES_CONSUMED.labels(queue_name, "ok").inc()
     finally:
-        await connection.close()
+        await channel.close()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(body, headers={"Content-Type": content_type})
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
+    configure_logging(
+        level=settings.log_level,
+        json_format=settings.log_json_format,
+        sample_rates=settings.log_event_sample_rates,
+        rate_limits=settings.log_event_rate_limits,
+        queue_size=settings.log_queue_size,
+    )
     asyncio.create_task(consumer_loop())
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await publisher.close()
+    shutdown_logging()
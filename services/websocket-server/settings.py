@@ -2,6 +2,8 @@ import os
 import pathlib
 import hmac
 import hashlib
+from typing import Dict
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -18,6 +20,13 @@ class Settings(BaseSettings):
 
     websocket_secret: str = os.getenv("WEBSOCKET_SECRET", "dev-secret")
 
+    log_level: str = "INFO"
+    log_json_format: bool = False
+    log_queue_size: int = 10000
+    # число подключений видно по метрике websocket_connections
+    log_event_sample_rates: Dict[str, float] = {"WS_CONNECTED": 0.1, "WS_DISCONNECTED": 0.1}
+    log_event_rate_limits: Dict[str, float] = {"WS_CONSUMER_ERROR": 20}
+
     def sign(self, user_id: str) -> str:
         return hmac.new(self.websocket_secret.encode(), user_id.encode(), hashlib.sha256).hexdigest()
 
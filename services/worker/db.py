@@ -1,11 +1,15 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy import Column, DateTime
+from sqlalchemy import BigInteger, Column, DateTime, Identity, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import SQLModel, Field
 
+from shared.broker.outbox import OUTBOX_TABLE
+from shared.utils.db_pool import TimedQueuePool
+
 from .settings import settings
 
 
@@ -21,8 +25,12 @@ class Notification(SQLModel, table=True):
     id: UUID = Field(primary_key=True)
     user_id: str
     template_id: UUID
-    subject: str
-    body: str
+    # пусты, если содержимое в message_payloads по payload_ref
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    payload_ref: Optional[str] = None
+    # при payload_ref — только data получателя поверх общей
+    data: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
     notification_type: str
     status: str
     sent_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
@@ -32,7 +40,36 @@ class Notification(SQLModel, table=True):
     scheduled_time: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
     is_recurring: bool = False
     recurrence_pattern: Optional[str] = None
+    priority: str = "normal"
+    # ключ секционирования таблицы API: условие по нему сужает UPDATE до одной секции
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
+
+
+class MessagePayload(SQLModel, table=True):
+    """Общая часть рассылки для сообщений по ссылке (``payload_ref``)."""
+
+    __tablename__ = "message_payloads"
+    ref: str = Field(primary_key=True)
+    template_id: UUID
+    template_version: int
+    subject: str
+    body: str
+    data: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
+
+
+class OutboxMessage(SQLModel, table=True):
+    """Сообщение outbox, записанное API; публикует relay (см. ``relay.py``)."""
+
+    __tablename__ = OUTBOX_TABLE
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger, Identity(), primary_key=True))
+    queue: str
+    body: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    content_type: str
+    created_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True)))
 
 
-engine = create_async_engine(settings.database_url, pool_pre_ping=True, echo=False)
+engine = create_async_engine(
+    settings.database_url, pool_pre_ping=True, echo=False, poolclass=TimedQueuePool
+)
 AsyncDBSession = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
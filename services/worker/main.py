@@ -1,16 +1,29 @@
 import asyncio
-import json
 from datetime import datetime, timezone
 from typing import Any, Dict
 
 import aio_pika
 import structlog
-from sqlalchemy import select, update
+from prometheus_client import start_http_server
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select, text, update
 from sqlmodel import SQLModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from shared.broker.lanes import PRIORITY_LANES, lane_queue
+from shared.broker.publisher import AmqpPublisher
+from shared.inbox.store import InboxStore
+from shared.models.wire import WireFormat, decode_message
+from shared.utils.logging_pipeline import configure_logging, shutdown_logging
+from shared.utils.metrics import BROKER_MESSAGES_CONSUMED
+
 from .settings import settings
-from .db import AsyncDBSession, Notification, Recipient
+from .db import AsyncDBSession, Notification, Recipient, engine
+from .metrics import DELIVERY_PHASE_SECONDS, SCHEDULER_LAG_SECONDS
+from .payloads import resolve_payload, shared_content
+from .receipts import ReceiptConsumer
+from .relay import OutboxRelay
 from .senders import EmailSender, SmsSender, PushSender
 from .utils import render_template
 
@@ -24,48 +37,136 @@ def amqp_url() -> str:
     )
 
 
+# одно robust-соединение на процесс: и для консьюмеров, и для планировщика
+publisher = AmqpPublisher(
+    amqp_url(),
+    channel_pool_size=settings.rabbitmq_channel_pool_size,
+    wire_format=WireFormat(settings.rabbitmq_wire_format),
+)
+
+# входящие пользователей: дописываются после доставки, если их уже читали
+redis_client = Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    decode_responses=True,
+    socket_connect_timeout=1.0,
+    socket_timeout=1.0,
+)
+inbox = InboxStore(redis_client, size=settings.inbox_size, ttl=settings.inbox_ttl_seconds)
+
+
 async def _ensure_db() -> None:
-    async with AsyncDBSession() as s:
-        async with s.begin():
-            await s.run_sync(SQLModel.metadata.create_all)
+    # notifications, outbox и message_payloads — схема API (notifications
+    # секционирована): здесь только их отображение, создаём свои таблицы
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: SQLModel.metadata.create_all(sync_conn, tables=[Recipient.__table__])
+        )
 
 
 async def handle_delivery(
     session: AsyncSession, payload: Dict[str, Any], channel: aio_pika.Channel
 ) -> None:
-    """Сбор персонализации и 'отправка'."""
+    """Сбор персонализации и 'отправка'.
+
+    Этапы замеряются в ``worker_delivery_phase_seconds``: по ним видно,
+    что тормозит — БД, рендер шаблона или канал отправки.
+    """
     user_id = payload["user_id"]
-    q = await session.execute(select(Recipient).where(Recipient.id == user_id))
-    recipient = q.scalar_one_or_none()
+    ntype = payload["notification_type"]
+
+    # сообщение по ссылке: тема, тело и data — в общей части рассылки
+    with DELIVERY_PHASE_SECONDS.labels(ntype, "payload").time():
+        payload = await resolve_payload(session, payload)
+
+    with DELIVERY_PHASE_SECONDS.labels(ntype, "db_lookup").time():
+        q = await session.execute(select(Recipient).where(Recipient.id == user_id))
+        recipient = q.scalar_one_or_none()
 
     to_email = getattr(recipient, "email", None)
     name = getattr(recipient, "name", "")
 
     context = {"user": {"id": user_id, "name": name, "email": to_email}, "data": payload.get("data", {})}
-    body = await render_template(payload["body"], context)
+    with DELIVERY_PHASE_SECONDS.labels(ntype, "render").time():
+        body = await render_template(payload["body"], context)
     subject = payload["subject"]
 
-    ntype = payload["notification_type"]
-    if ntype == "email":
-        await EmailSender().send(to_email or "", subject, body)
-    elif ntype == "sms":
-        await SmsSender().send(user_id, subject, body)
-    elif ntype == "push":
-        await PushSender().send(user_id, subject, body)
-
-    # помечаем как отправленное
-    await session.execute(
-        update(Notification)
-        .where(Notification.id == payload["notification_id"])
-        .values(status="sent", sent_at=datetime.now(timezone.utc))
-    )
-    await session.commit()
+    with DELIVERY_PHASE_SECONDS.labels(ntype, "send").time():
+        if ntype == "email":
+            await EmailSender().send(to_email or "", subject, body)
+        elif ntype == "sms":
+            await SmsSender().send(user_id, subject, body)
+        elif ntype == "push":
+            await PushSender().send(user_id, subject, body)
+
+    # помечаем как отправленное: статус в БД — тип deliverystatus с именами
+    # DeliveryStatus, строковый параметр он не принимает. Только из PENDING:
+    # квитанция DELIVERED/FAILED могла прийти раньше, её не понижаем
+    with DELIVERY_PHASE_SECONDS.labels(ntype, "status_update").time():
+        result = await session.execute(
+            update(Notification)
+            .where(
+                Notification.id == payload["notification_id"],
+                Notification.status == text("CAST('PENDING' AS deliverystatus)"),
+            )
+            .values(
+                status=text("CAST('SENT' AS deliverystatus)"),
+                sent_at=datetime.now(timezone.utc),
+            )
+            .returning(
+                Notification.id,
+                Notification.user_id,
+                Notification.template_id,
+                Notification.notification_type,
+                Notification.priority,
+                Notification.created_at,
+                Notification.sent_at,
+                Notification.delivered_at,
+                Notification.error_message,
+            )
+        )
+        sent = result.mappings().first()
+        await session.commit()
+
+    # после commit: сборка входящих в API увидит то, что сюда не попало
+    if sent is not None:
+        with DELIVERY_PHASE_SECONDS.labels(ntype, "inbox").time():
+            try:
+                await inbox.add(
+                    {
+                        **sent,
+                        "notification_type": sent["notification_type"].lower(),
+                        "status": "sent",
+                        "subject": subject,
+                        "read_at": None,
+                    }
+                )
+            except RedisError as e:
+                logger.warning("INBOX_UPDATE_ERROR", user_id=user_id, error=str(e))
 
 
 async def consume_named(queue_name: str) -> None:
-    connection = await aio_pika.connect_robust(amqp_url())
+    """Разбирает все полосы приоритета очереди ``queue_name``.
+
+    У каждой полосы свои консьюмеры, поэтому срочное письмо не ждёт за
+    бэклогом массовой рассылки в той же очереди. Число консьюмеров полосы
+    (``priority_lane_consumers``) задаёт её долю пропускной способности:
+    срочные разбираются быстрее, но низкий приоритет не голодает.
+    """
+    await asyncio.gather(
+        *(
+            _consume_lane(lane_queue(queue_name, level))
+            for level in PRIORITY_LANES
+            for _ in range(settings.priority_lane_consumers.get(level.value, 1))
+        )
+    )
+
+
+async def _consume_lane(queue_name: str) -> None:
+    connection = await publisher.connect()
+    channel = await connection.channel()
     try:
-        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=settings.rabbitmq_prefetch_count)
         queue = await channel.declare_queue(queue_name, durable=True)
 
         async with AsyncDBSession() as session:
@@ -73,12 +174,15 @@ async def consume_named(queue_name: str) -> None:
                 async for message in queue_iter:
                     async with message.process():
                         try:
-                            payload = json.loads(message.body.decode("utf-8"))
+                            payload = decode_message(message.body, message.content_type)
                             await handle_delivery(session, payload, channel)
                         except Exception as e:
+                            BROKER_MESSAGES_CONSUMED.labels(queue_name, "error").inc()
                             logger.exception("WORKER_HANDLE_ERROR", error=str(e))
+                        else:
+                            BROKER_MESSAGES_CONSUMED.labels(queue_name, "ok").inc()
     finally:
-        await connection.close()
+        await channel.close()
 
 
 async def scheduler_loop() -> None:
@@ -88,39 +192,57 @@ async def scheduler_loop() -> None:
         try:
             async with AsyncDBSession() as session:
                 now = datetime.now(timezone.utc)
-                # отложенные: наступило время и статус pending
+                # отложенные: наступило время и статус PENDING (тип deliverystatus,
+                # строковый параметр он не принимает). SKIP LOCKED — реплики
+                # воркера не публикуют одну строку дважды
                 result = await session.execute(
-                    select(Notification).where(
+                    select(Notification)
+                    .where(
                         Notification.scheduled_time.is_not(None),
                         Notification.scheduled_time <= now,
-                        Notification.status == "pending",
+                        Notification.status == text("CAST('PENDING' AS deliverystatus)"),
                     )
+                    .with_for_update(skip_locked=True)
                 )
                 due = list(result.scalars().all())
 
                 for n in due:
+                    SCHEDULER_LAG_SECONDS.observe((now - n.scheduled_time).total_seconds())
+                    # в БД тип хранится именем NotificationType, в сообщениях — значением
+                    ntype = n.notification_type.lower()
                     msg = {
                         "notification_id": str(n.id),
                         "user_id": n.user_id,
                         "template_id": str(n.template_id),
                         "subject": n.subject,
                         "body": n.body,
-                        "notification_type": n.notification_type,
-                        "data": {},
+                        "notification_type": ntype,
+                        "priority": n.priority,
+                        "data": n.data or {},
                     }
+                    # публикуем целиком: instant разбирает сервер без доступа к БД
+                    if n.payload_ref is not None:
+                        shared = await shared_content(session, n.payload_ref, n.data)
+                        msg["data"] = shared["data"]
+                        # тема и тело из общей части — только вместо NULL в строке
+                        for field in ("subject", "body"):
+                            if msg[field] is None:
+                                msg[field] = shared[field]
                     # публикуем
-                    await _publish(n.notification_type, msg)
-                    # если повторяющееся — переносим на следующий раз
+                    await _publish(ntype, msg, n.priority)
+                    # повторяющееся переносим на следующий раз, разовое забираем:
+                    # без срока оно больше не попадёт в выборку, а status=sent
+                    # выставит обработчик доставки. Публикация до commit — при
+                    # падении между ними сообщение уйдёт повторно, но не потеряется
                     if n.is_recurring and n.recurrence_pattern:
                         nxt = _next_run(now, n.recurrence_pattern)
-                        await session.execute(
-                            update(Notification)
-                            .where(Notification.id == n.id)
-                            .values(scheduled_time=nxt)
-                        )
                     else:
-                        # иначе просто оставим — воркер выставит status=sent
-                        pass
+                        nxt = None
+                    await session.execute(
+                        update(Notification)
+                        .where(Notification.id == n.id, Notification.created_at == n.created_at)
+                        .values(scheduled_time=nxt)
+                    )
                 await session.commit()
         except Exception as e:
             logger.exception("SCHEDULER_ERROR", error=str(e))
@@ -147,34 +269,58 @@ def _next_run(now: datetime, pattern: str) -> datetime:
     return now + asyncio.timedelta(days=7)  # type: ignore[attr-defined]
 
 
-async def _publish(ntype: str, message: Dict[str, Any]) -> None:
-    mapping = {"email": "email_notifications", "sms": "sms_notifications", "push": "push_notifications"}
+async def _publish(ntype: str, message: Dict[str, Any], priority: str = "normal") -> None:
+    mapping = {
+        "email": "email_notifications",
+        "sms": "sms_notifications",
+        "push": "push_notifications",
+        "instant": "instant_notifications",
+    }
     qname = mapping.get(ntype, "email_notifications")
-    connection = await aio_pika.connect_robust(amqp_url())
-    try:
-        channel = await connection.channel()
-        queue = await channel.declare_queue(qname, durable=True)
-        await channel.default_exchange.publish(
-            aio_pika.Message(
-                body=json.dumps(message, ensure_ascii=False).encode("utf-8"),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-                content_type="application/json",
-            ),
-            routing_key=queue.name,
-        )
-    finally:
-        await connection.close()
+    await publisher.publish(lane_queue(qname, priority), message)
 
 
 async def main() -> None:
+    configure_logging(
+        level=settings.log_level,
+        json_format=settings.log_json_format,
+        sample_rates=settings.log_event_sample_rates,
+        rate_limits=settings.log_event_rate_limits,
+        queue_size=settings.log_queue_size,
+    )
+    # /metrics отдаёт отдельный поток: у воркера нет своего HTTP-приложения
+    start_http_server(settings.metrics_port)
     await _ensure_db()
     tasks = [
         asyncio.create_task(consume_named("email_notifications")),
         asyncio.create_task(consume_named("sms_notifications")),
         asyncio.create_task(consume_named("push_notifications")),
         asyncio.create_task(scheduler_loop()),
+        # сообщения API из outbox: реплики воркера делят пачки через SKIP LOCKED
+        asyncio.create_task(
+            OutboxRelay(
+                publisher,
+                batch_size=settings.outbox_relay_batch_size,
+                poll_seconds=settings.outbox_relay_poll_seconds,
+            ).run()
+        ),
+        # квитанции провайдеров: пачками, одним UPDATE на пачку
+        asyncio.create_task(
+            ReceiptConsumer(
+                publisher,
+                inbox,
+                batch_size=settings.receipts_batch_size,
+                flush_seconds=settings.receipts_flush_seconds,
+                prefetch=settings.receipts_prefetch_count,
+            ).run()
+        ),
     ]
-    await asyncio.gather(*tasks)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await publisher.close()
+        await redis_client.aclose()
+        shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+from prometheus_client import Counter, Histogram
+
+# от миллисекунд у запроса к БД до десятков секунд у медленного SMTP
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# опоздание планировщика: не меньше периода опроса, при отставании — минуты
+LAG_BUCKETS = (1.0, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+# ожидание в outbox: миллисекунды при NOTIFY, секунды при отставании relay
+OUTBOX_LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DELIVERY_PHASE_SECONDS = Histogram(
+    "worker_delivery_phase_seconds",
+    "Длительность этапов handle_delivery",
+    ["channel", "phase"],
+    buckets=PHASE_BUCKETS,
+)
+SCHEDULER_LAG_SECONDS = Histogram(
+    "worker_scheduler_lag_seconds",
+    "Опоздание публикации отложенного уведомления относительно scheduled_time",
+    buckets=LAG_BUCKETS,
+)
+OUTBOX_RELAY_LAG_SECONDS = Histogram(
+    "worker_outbox_relay_lag_seconds",
+    "Сколько старейшее сообщение пачки ждало в outbox до публикации",
+    buckets=OUTBOX_LAG_BUCKETS,
+)
+RECEIPT_BATCH_SECONDS = Histogram(
+    "worker_receipt_batch_seconds",
+    "Применение пачки квитанций о доставке одним UPDATE",
+    buckets=PHASE_BUCKETS,
+)
+RECEIPTS_PROCESSED = Counter(
+    "worker_receipts_total",
+    "Квитанции о доставке: applied — статус изменён, ignored — не повышает статус "
+    "или id неизвестен, rejected — битое сообщение",
+    ["outcome"],
+)
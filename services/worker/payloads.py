@@ -0,0 +1,94 @@
+"""Общие части рассылок для сообщений и уведомлений по ссылке.
+
+Сообщение или строка ``notifications`` с ``payload_ref`` не несёт темы, тела
+и data: они лежат одной строкой в ``message_payloads``. Строки неизменяемы (ключ — sha256
+содержимого), поэтому кэшируются без инвалидации. Пока одна задача читает
+строку из БД, остальные сообщения той же рассылки ждут её результата, а не
+идут в БД следом.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import MessagePayload
+from .settings import settings
+
+
+class PayloadCache:
+    """LRU-кэш общих частей рассылок с одним запросом к БД на ``ref``."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._payloads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loading: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+
+    async def get(self, session: AsyncSession, ref: str) -> Optional[Dict[str, Any]]:
+        payload = self._payloads.get(ref)
+        if payload is not None:
+            self._payloads.move_to_end(ref)
+            return payload
+        loading = self._loading.get(ref)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        loading = asyncio.get_running_loop().create_future()
+        self._loading[ref] = loading
+        try:
+            payload = await self._load(session, ref)
+        except asyncio.CancelledError:
+            loading.cancel()
+            raise
+        except Exception as e:
+            loading.set_exception(e)
+            # ожидающих может не быть — исключение не должно попасть в лог loop'а
+            loading.exception()
+            raise
+        finally:
+            self._loading.pop(ref, None)
+        loading.set_result(payload)
+        if payload is not None:
+            self._payloads[ref] = payload
+            if len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+        return payload
+
+    async def _load(self, session: AsyncSession, ref: str) -> Optional[Dict[str, Any]]:
+        q = await session.execute(select(MessagePayload).where(MessagePayload.ref == ref))
+        row = q.scalar_one_or_none()
+        if row is None:
+            return None
+        return {"subject": row.subject, "body": row.body, "data": row.data or {}}
+
+
+payload_cache = PayloadCache(settings.payload_cache_size)
+
+
+async def shared_content(
+    session: AsyncSession,
+    ref: str,
+    delta: Optional[Dict[str, Any]] = None,
+    cache: PayloadCache = payload_cache,
+) -> Dict[str, Any]:
+    """Тема, тело и data общей части рассылки с data получателя поверх."""
+    shared = await cache.get(session, ref)
+    if shared is None:
+        raise LookupError(f"Общая часть рассылки {ref} не найдена")
+    return {
+        "subject": shared["subject"],
+        "body": shared["body"],
+        "data": {**shared["data"], **(delta or {})},
+    }
+
+
+async def resolve_payload(
+    session: AsyncSession, payload: Dict[str, Any], cache: PayloadCache = payload_cache
+) -> Dict[str, Any]:
+    """Полное сообщение: для сообщения по ссылке подставляет общую часть рассылки."""
+    ref = payload.get("payload_ref")
+    if ref is None:
+        return payload
+    return {**payload, **await shared_content(session, ref, payload.get("delta"), cache)}
@@ -0,0 +1,168 @@
+"""Применение квитанций о доставке пачками (см. ``shared.broker.receipts``).
+
+Консьюмер копит квитанции из сообщений очереди, пока их не наберётся
+``receipts_batch_size`` или не пройдёт ``receipts_flush_seconds``, и
+применяет их одним ``UPDATE ... FROM unnest(...)``: массивы передаются
+четырьмя параметрами, поэтому запрос один и тот же при любом размере
+пачки и готовится драйвером один раз. После commit все сообщения пачки
+подтверждаются одним ack с ``multiple``; при ошибке возвращаются в очередь.
+Новые статусы затем переносятся во входящие пользователей (``shared.inbox``).
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from uuid import UUID
+
+import structlog
+from aio_pika.abc import AbstractIncomingMessage
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.broker.publisher import AmqpPublisher
+from shared.broker.receipts import RECEIPTS_QUEUE, STATUS_ORDER, decode_receipts, latest_receipts
+from shared.inbox.store import InboxStore
+
+from .db import AsyncDBSession
+from .metrics import RECEIPT_BATCH_SECONDS, RECEIPTS_PROCESSED
+
+logger = structlog.get_logger(__name__)
+
+# пауза после ошибки применения: БД недоступна, не крутим цикл вхолостую
+RETRY_DELAY_SECONDS = 5.0
+
+_RANKS = "ARRAY[" + ", ".join(f"'{status.upper()}'" for status in STATUS_ORDER) + "]"
+
+# статусы в БД хранятся именами DeliveryStatus; переход только к старшему статусу
+APPLY_RECEIPTS = text(
+    f"""
+UPDATE notifications AS n
+SET status = CAST(v.status AS deliverystatus),
+    sent_at = CASE WHEN v.status IN ('SENT', 'DELIVERED')
+                   THEN COALESCE(n.sent_at, v.occurred_at, now()) ELSE n.sent_at END,
+    delivered_at = CASE WHEN v.status = 'DELIVERED'
+                        THEN COALESCE(v.occurred_at, now()) ELSE n.delivered_at END,
+    error_message = CASE WHEN v.status = 'FAILED' THEN v.error_message ELSE n.error_message END
+FROM unnest(
+    CAST(:ids AS uuid[]),
+    CAST(:statuses AS text[]),
+    CAST(:occurred AS timestamptz[]),
+    CAST(:errors AS text[])
+) AS v(id, status, occurred_at, error_message)
+WHERE n.id = v.id
+  AND array_position({_RANKS}, CAST(n.status AS text)) < array_position({_RANKS}, v.status)
+RETURNING n.id, n.user_id, CAST(n.status AS text) AS status,
+          n.sent_at, n.delivered_at, n.error_message
+"""
+)
+
+
+async def apply_receipts(
+    session: AsyncSession, receipts: Sequence[Mapping[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Применяет квитанции одним UPDATE; вернёт новые поля изменённых уведомлений.
+
+    Квитанции на неизвестные id и не повышающие статус пропускаются.
+    Commit — за вызывающим.
+    """
+    latest = latest_receipts(receipts)
+    if not latest:
+        return []
+    result = await session.execute(
+        APPLY_RECEIPTS,
+        {
+            "ids": [UUID(str(receipt["notification_id"])) for receipt in latest],
+            "statuses": [receipt["status"].upper() for receipt in latest],
+            "occurred": [_timestamp(receipt.get("occurred_at")) for receipt in latest],
+            "errors": [receipt.get("error_message") for receipt in latest],
+        },
+    )
+    # статус во входящих — значением DeliveryStatus, как в API
+    return [{**row, "status": row["status"].lower()} for row in result.mappings().all()]
+
+
+class ReceiptConsumer:
+    def __init__(
+        self,
+        publisher: AmqpPublisher,
+        inbox: InboxStore,
+        batch_size: int,
+        flush_seconds: float,
+        prefetch: int,
+    ) -> None:
+        self.publisher = publisher
+        self.inbox = inbox
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.prefetch = prefetch
+        self._pending: List[Tuple[AbstractIncomingMessage, List[Mapping[str, Any]]]] = []
+        self._buffered = 0
+        self._full = asyncio.Event()
+
+    async def run(self) -> None:
+        connection = await self.publisher.connect()
+        channel = await connection.channel()
+        try:
+            # prefetch в сообщениях: столько пачек API держим неподтверждёнными
+            await channel.set_qos(prefetch_count=self.prefetch)
+            queue = await channel.declare_queue(RECEIPTS_QUEUE, durable=True)
+            await queue.consume(self._on_message)
+            while True:
+                await self._wait()
+                await self.flush()
+        finally:
+            await channel.close()
+
+    async def flush(self) -> int:
+        """Применяет накопленные квитанции; вернёт число изменённых уведомлений."""
+        pending, self._pending, self._buffered = self._pending, [], 0
+        self._full.clear()
+        if not pending:
+            return 0
+        receipts = [receipt for _, batch in pending for receipt in batch]
+        last = pending[-1][0]
+        started = time.perf_counter()
+        try:
+            async with AsyncDBSession() as session:
+                changed = await apply_receipts(session, receipts)
+                await session.commit()
+        except Exception as e:
+            logger.exception("RECEIPTS_APPLY_ERROR", receipts=len(receipts), error=str(e))
+            await last.nack(multiple=True, requeue=True)
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+            return 0
+        RECEIPT_BATCH_SECONDS.observe(time.perf_counter() - started)
+        RECEIPTS_PROCESSED.labels("applied").inc(len(changed))
+        RECEIPTS_PROCESSED.labels("ignored").inc(len(receipts) - len(changed))
+        # все сообщения пачки пришли по этому каналу раньше последнего
+        await last.ack(multiple=True)
+        try:
+            await self.inbox.update(changed)
+        except RedisError as e:
+            logger.warning("INBOX_UPDATE_ERROR", notifications=len(changed), error=str(e))
+        return len(changed)
+
+    async def _on_message(self, message: AbstractIncomingMessage) -> None:
+        try:
+            receipts = decode_receipts(message.body)
+        except ValueError as e:
+            RECEIPTS_PROCESSED.labels("rejected").inc()
+            logger.warning("RECEIPTS_MESSAGE_REJECTED", error=str(e))
+            await message.reject(requeue=False)
+            return
+        self._pending.append((message, receipts))
+        self._buffered += len(receipts)
+        if self._buffered >= self.batch_size:
+            self._full.set()
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,129 @@
+"""Relay outbox: переносит сообщения из ``notification_outbox`` в RabbitMQ.
+
+Пачка забирается одним ``DELETE ... WHERE id IN (SELECT ... FOR UPDATE
+SKIP LOCKED) RETURNING``: реплики воркера берут разные строки и не ждут
+друг друга. Пачка публикуется с подтверждениями брокера, и только потом
+транзакция коммитится; ошибка публикации откатывает удаление, и строки
+уйдут следующей попыткой. Relay просыпается по NOTIFY от API, а опрос раз
+в ``outbox_relay_poll_seconds`` страхует от потерянных уведомлений.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+import structlog
+from sqlalchemy import delete, select
+
+from shared.broker.outbox import OUTBOX_NOTIFY_CHANNEL
+from shared.broker.publisher import AmqpPublisher
+
+from .db import AsyncDBSession, OutboxMessage
+from .metrics import OUTBOX_RELAY_LAG_SECONDS
+from .settings import settings
+
+logger = structlog.get_logger(__name__)
+
+# пауза после ошибки: брокер или БД недоступны, не крутим цикл вхолостую
+RETRY_DELAY_SECONDS = 5.0
+
+
+class OutboxRelay:
+    def __init__(self, publisher: AmqpPublisher, batch_size: int, poll_seconds: float) -> None:
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._listener: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            while True:
+                try:
+                    relayed = await self.relay_batch()
+                except Exception as e:
+                    logger.exception("OUTBOX_RELAY_ERROR", error=str(e))
+                    await asyncio.sleep(RETRY_DELAY_SECONDS)
+                    continue
+                # полная пачка — за ней, скорее всего, есть ещё
+                if relayed < self.batch_size:
+                    await self._wait()
+        finally:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+
+    async def relay_batch(self) -> int:
+        """Публикует одну пачку из outbox; вернёт число опубликованных сообщений."""
+        claimed = (
+            select(OutboxMessage.id)
+            .order_by(OutboxMessage.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncDBSession() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(OutboxMessage)
+                    .where(OutboxMessage.id.in_(claimed))
+                    .returning(
+                        OutboxMessage.id,
+                        OutboxMessage.queue,
+                        OutboxMessage.body,
+                        OutboxMessage.content_type,
+                        OutboxMessage.created_at,
+                    )
+                )
+                # RETURNING не обязан сохранять порядок подзапроса
+                rows = sorted(result.all(), key=lambda row: row.id)
+                if not rows:
+                    return 0
+                OUTBOX_RELAY_LAG_SECONDS.observe(
+                    (datetime.now(timezone.utc) - rows[0].created_at).total_seconds()
+                )
+                for queue, bodies in _by_queue(rows).items():
+                    await self.publisher.publish_encoded(queue, bodies)
+        return len(rows)
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        self._wakeup.set()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    host=settings.postgres_host,
+                    port=settings.postgres_port,
+                    user=settings.postgres_user,
+                    password=settings.postgres_password,
+                    database=settings.postgres_db,
+                )
+            except Exception as e:
+                logger.warning("OUTBOX_LISTEN_ERROR", error=str(e))
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+                continue
+            try:
+                await connection.add_listener(OUTBOX_NOTIFY_CHANNEL, self._on_notify)
+                # пока слушателя не было, NOTIFY могли потеряться
+                self._wakeup.set()
+                while not connection.is_closed():
+                    await asyncio.sleep(RETRY_DELAY_SECONDS)
+            finally:
+                await connection.close()
+            logger.warning("OUTBOX_LISTEN_LOST")
+
+
+def _by_queue(rows: List[Any]) -> Dict[str, List[Tuple[bytes, str]]]:
+    # порядок внутри очереди сохраняется, очереди публикуются по очереди
+    groups: Dict[str, List[Tuple[bytes, str]]] = {}
+    for row in rows:
+        groups.setdefault(row.queue, []).append((row.body, row.content_type))
+    return groups
@@ -1,5 +1,5 @@
 import pathlib
-from typing import Literal
+from typing import Dict, Literal
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -22,10 +22,50 @@ class Settings(BaseSettings):
     rabbitmq_user: str = "guest"
     rabbitmq_password: str = "guest"
     rabbitmq_vhost: str = "/"
+    rabbitmq_channel_pool_size: int = 10
+    rabbitmq_prefetch_count: int = 10
+    # формат публикаций планировщика: msgpack включать после обновления всех консьюмеров
+    rabbitmq_wire_format: Literal["json", "msgpack"] = "json"
+    # число консьюмеров на полосу приоритета: вес полосы при разборе очереди
+    priority_lane_consumers: Dict[str, int] = {"urgent": 3, "high": 2, "normal": 1, "low": 1}
+
+    # сколько общих частей рассылок (payload_ref) держать в памяти
+    payload_cache_size: int = 1000
+
+    # relay outbox: строк за транзакцию и период опроса без NOTIFY
+    outbox_relay_batch_size: int = 1000
+    outbox_relay_poll_seconds: float = 1.0
+
+    # квитанции о доставке: сколько копить до UPDATE, как долго ждать неполную
+    # пачку и сколько сообщений API держать неподтверждёнными
+    receipts_batch_size: int = 5000
+    receipts_flush_seconds: float = 0.5
+    receipts_prefetch_count: int = 50
+
+    # входящие пользователей в Redis: окно и срок жизни — как у API
+    redis_host: str = "redis"
+    redis_port: int = 6379
+    inbox_size: int = 200
+    inbox_ttl_seconds: int = 259200
 
     # Scheduler
     scheduler_poll_seconds: int = 10
 
+    # порт HTTP-сервера с /metrics для Prometheus
+    metrics_port: int = 9100
+
+    # Logging
+    log_level: str = "INFO"
+    log_json_format: bool = False
+    log_queue_size: int = 10000
+    # отправки считаются в метриках: в лог достаточно выборки
+    log_event_sample_rates: Dict[str, float] = {"EMAIL_SENT": 0.1, "SMS_SENT": 0.1, "PUSH_SENT": 0.1}
+    log_event_rate_limits: Dict[str, float] = {
+        "WORKER_HANDLE_ERROR": 20,
+        "SCHEDULER_ERROR": 1,
+        "INBOX_UPDATE_ERROR": 1,
+    }
+
     @property
     def database_url(self) -> str:
         return (
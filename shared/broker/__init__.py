@@ -0,0 +1 @@
+"""Shared broker utilities for notification system"""
@@ -0,0 +1,118 @@
+"""Примитивы допуска рассылок: квоты token bucket и замер полос очередей.
+
+Квоты считаются в сообщениях. Проверка (``wait``) и списание (``take``)
+разделены: запрос проверяют все ограничители, и списывают с них, только
+если он допущен, иначе отклонённый запрос съедал бы чужую квоту.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+# сглаживание оценки скорости разбора очереди
+DRAIN_RATE_SMOOTHING = 0.3
+
+
+class TokenBucket:
+    """Token bucket: ``rate`` токенов в секунду, не больше ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait(self, cost: float) -> float:
+        """Сколько секунд ждать, пока хватит токенов на ``cost``; 0 — хватает сейчас."""
+        self._refill()
+        # запрос дороже всей ёмкости забирает полную корзину
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float) -> float:
+        """Списывает ``cost`` токенов. Вернёт 0 или сколько секунд ждать до успеха."""
+        wait = self.wait(cost)
+        if not wait:
+            self.tokens -= min(cost, self.capacity)
+        return wait
+
+    def level(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class LaneMonitor:
+    """Последний замер глубины одной полосы очереди.
+
+    Полоса насыщена, если в ней не меньше ``max_depth`` сообщений или
+    оценка ожидания достигла ``max_wait`` секунд.
+    """
+
+    def __init__(self, queue: str, priority: str, max_depth: int, max_wait: float) -> None:
+        self.queue = queue
+        self.priority = priority
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.depth = 0
+        self.consumers = 0
+        self.drain_rate = 0.0  # сообщений в секунду, оценка по замерам глубины
+        self.estimated_wait_seconds: Optional[float] = None
+        self.saturated = False
+        self._sampled_at: Optional[float] = None
+        self._published_at_sample = 0
+
+    def update(
+        self, depth: int, consumers: int, published: int, now: Optional[float] = None
+    ) -> None:
+        """Новый замер: ``published`` — сколько этот процесс опубликовал в полосу всего."""
+        now = time.monotonic() if now is None else now
+        if self._sampled_at is not None and now > self._sampled_at:
+            # приток известен только свой: с несколькими инстансами API
+            # скорость занижается, и оценка ожидания выходит осторожнее
+            inflow = published - self._published_at_sample
+            drained = max(0, self.depth + inflow - depth)
+            rate = drained / (now - self._sampled_at)
+            self.drain_rate = round(
+                DRAIN_RATE_SMOOTHING * rate + (1 - DRAIN_RATE_SMOOTHING) * self.drain_rate, 2
+            )
+        self._sampled_at = now
+        self._published_at_sample = published
+        self.depth = depth
+        self.consumers = consumers
+        # без разбора (нет консьюмеров или они стоят) ожидание неизвестно
+        self.estimated_wait_seconds = (
+            round(depth / self.drain_rate, 2) if self.drain_rate > 0 else None
+        )
+        self.saturated = depth >= self.max_depth or (
+            self.estimated_wait_seconds is not None
+            and self.estimated_wait_seconds >= self.max_wait
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queue": self.queue,
+            "priority": self.priority,
+            "depth": self.depth,
+            "consumers": self.consumers,
+            "drain_rate": self.drain_rate,
+            "estimated_wait_seconds": self.estimated_wait_seconds,
+            "saturated": self.saturated,
+        }
+
+
+def recipients_cost(recipients: List[str], broadcast_size: int) -> int:
+    """Стоимость рассылки в сообщениях для квот.
+
+    Рассылка "всем" стоит оценку числа получателей ``broadcast_size``:
+    крупнейшие рассылки не должны обходить квоты.
+    """
+    unique = {recipient.upper() for recipient in recipients}
+    if unique == {"ALL"}:
+        return max(1, broadcast_size)
+    return len(unique)
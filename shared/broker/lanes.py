@@ -0,0 +1,27 @@
+"""Полосы приоритета: своя очередь RabbitMQ на каждый уровень PriorityLevel.
+
+Уже объявленные очереди нельзя переобъявить с ``x-max-priority``, поэтому
+приоритет разводится по отдельным очередям: NORMAL остаётся в исходной
+очереди, остальные уровни получают суффикс, например
+``email_notifications.urgent``. Консьюмер читает все полосы очереди.
+"""
+
+from typing import Optional, Tuple, Union
+
+from shared.enums.delivery import PriorityLevel
+
+# от самого срочного к самому низкому
+PRIORITY_LANES: Tuple[PriorityLevel, ...] = (
+    PriorityLevel.URGENT,
+    PriorityLevel.HIGH,
+    PriorityLevel.NORMAL,
+    PriorityLevel.LOW,
+)
+
+
+def lane_queue(queue_name: str, priority: Optional[Union[str, PriorityLevel]] = None) -> str:
+    """Имя очереди полосы ``priority`` для базовой очереди ``queue_name``."""
+    level = PriorityLevel(priority or PriorityLevel.NORMAL)
+    if level is PriorityLevel.NORMAL:
+        return queue_name
+    return f"{queue_name}.{level.value}"
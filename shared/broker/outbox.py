@@ -0,0 +1,14 @@
+"""Transactional outbox между notification-api и RabbitMQ.
+
+API не публикует в брокер сам: закодированное сообщение (``encode_message``)
+и имя очереди полосы пишутся строкой в ``notification_outbox`` в той же
+транзакции, что и уведомления, а после commit приходит NOTIFY на канал
+``OUTBOX_NOTIFY_CHANNEL``. Relay воркера забирает строки пачками через
+``FOR UPDATE SKIP LOCKED`` (несколько реплик не мешают друг другу),
+публикует с подтверждениями брокера и удаляет в той же транзакции.
+Доставка «хотя бы один раз»: при падении между публикацией и commit пачка
+уйдёт повторно.
+"""
+
+OUTBOX_TABLE = "notification_outbox"
+OUTBOX_NOTIFY_CHANNEL = "notification_outbox"
@@ -0,0 +1,138 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.pool import Pool
+
+from shared.models.wire import WireFormat, encode_message
+from shared.utils.metrics import BROKER_MESSAGES_PUBLISHED
+
+DEFAULT_CHANNEL_POOL_SIZE = 10
+DEFAULT_PUBLISH_BATCH_SIZE = 500
+
+
+class AmqpPublisher:
+    """Долгоживущий издатель RabbitMQ.
+
+    Держит одно robust-соединение на процесс, пул каналов и кэш
+    уже объявленных очередей, чтобы публикация не делала handshake
+    и ``declare_queue`` на каждое сообщение.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel_pool_size: int = DEFAULT_CHANNEL_POOL_SIZE,
+        batch_size: int = DEFAULT_PUBLISH_BATCH_SIZE,
+        wire_format: WireFormat = WireFormat.JSON,
+    ) -> None:
+        self.url = url
+        self.channel_pool_size = channel_pool_size
+        self.batch_size = batch_size
+        self.wire_format = WireFormat(wire_format)
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._channels: Optional[Pool[AbstractChannel]] = None
+        self._declared: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> AbstractRobustConnection:
+        """Вернёт общее соединение процесса, открыв его при первом вызове."""
+        if self._connection is None or self._connection.is_closed:
+            async with self._lock:
+                if self._connection is None or self._connection.is_closed:
+                    self._connection = await aio_pika.connect_robust(self.url)
+                    self._channels = Pool(
+                        self._open_channel, max_size=self.channel_pool_size
+                    )
+                    self._declared.clear()
+        return self._connection
+
+    async def close(self) -> None:
+        if self._channels is not None:
+            await self._channels.close()
+            self._channels = None
+        if self._connection is not None and not self._connection.is_closed:
+            await self._connection.close()
+        self._connection = None
+        self._declared.clear()
+
+    async def publish(self, queue_name: str, message: Dict[str, Any]) -> None:
+        await self.publish_batch(queue_name, [message])
+
+    async def publish_batch(
+        self, queue_name: str, messages: Iterable[Dict[str, Any]]
+    ) -> int:
+        """Публикует сообщения одной очереди пачками по ``batch_size``.
+
+        Внутри пачки публикации идут конвейером по одному каналу из пула,
+        подтверждения брокера ожидаются для всей пачки разом.
+        """
+        return await self._publish_all(
+            queue_name, (build_message(message, self.wire_format) for message in messages)
+        )
+
+    async def publish_encoded(
+        self, queue_name: str, bodies: Iterable[Tuple[bytes, str]]
+    ) -> int:
+        """Публикует уже закодированные тела с их ``content_type``, как ``publish_batch``.
+
+        Для сообщений, закодированных заранее через ``encode_message``, —
+        например, из outbox: формат выбрал тот, кто их записал.
+        """
+        return await self._publish_all(
+            queue_name, (encoded_message(body, content_type) for body, content_type in bodies)
+        )
+
+    async def _publish_all(self, queue_name: str, messages: Iterable[aio_pika.Message]) -> int:
+        await self.connect()
+        assert self._channels is not None
+        published = 0
+        async with self._channels.acquire() as channel:
+            await self._ensure_queue(channel, queue_name)
+            batch: List[aio_pika.Message] = []
+            for message in messages:
+                batch.append(message)
+                if len(batch) >= self.batch_size:
+                    published += await self._publish_many(channel, queue_name, batch)
+                    batch = []
+            if batch:
+                published += await self._publish_many(channel, queue_name, batch)
+        BROKER_MESSAGES_PUBLISHED.labels(queue_name).inc(published)
+        return published
+
+    async def _open_channel(self) -> AbstractChannel:
+        connection = await self.connect()
+        return await connection.channel()
+
+    async def _ensure_queue(self, channel: AbstractChannel, queue_name: str) -> None:
+        # очередь durable, объявляем один раз на процесс
+        if queue_name in self._declared:
+            return
+        await channel.declare_queue(queue_name, durable=True)
+        self._declared.add(queue_name)
+
+    async def _publish_many(
+        self, channel: AbstractChannel, queue_name: str, batch: List[aio_pika.Message]
+    ) -> int:
+        await asyncio.gather(
+            *(
+                channel.default_exchange.publish(message, routing_key=queue_name)
+                for message in batch
+            )
+        )
+        return len(batch)
+
+
+def encoded_message(body: bytes, content_type: str) -> aio_pika.Message:
+    return aio_pika.Message(
+        body=body,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        content_type=content_type,
+    )
+
+
+def build_message(
+    message: Dict[str, Any], wire_format: WireFormat = WireFormat.JSON
+) -> aio_pika.Message:
+    return encoded_message(*encode_message(message, wire_format))
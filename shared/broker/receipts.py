@@ -0,0 +1,67 @@
+"""Квитанции о доставке от провайдеров: очередь, формат и порядок статусов.
+
+API принимает квитанции пачкой и публикует их в ``RECEIPTS_QUEUE``
+сообщениями по несколько сотен: JSON-массив объектов с полями
+``notification_id``, ``status``, ``occurred_at`` (ISO 8601) и
+``error_message``. Воркер копит квитанции из многих сообщений и применяет
+их одним UPDATE, подтверждая сообщения после commit.
+
+Статус уведомления только растёт по ``STATUS_RANK``: запоздавшая или
+повторная квитанция (``sent`` после ``delivered``) ничего не меняет, поэтому
+повторная доставка сообщения из очереди безопасна. ``delivered`` старше
+``failed``: провайдер может сообщить о неудачной попытке, а потом о
+доставке повтором.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+from uuid import UUID
+
+import orjson
+
+RECEIPTS_QUEUE = "delivery_receipts"
+RECEIPTS_CONTENT_TYPE = "application/json"
+# порядок = ранг статуса; pending квитанцией не приходит
+STATUS_ORDER = ("pending", "sent", "failed", "delivered")
+STATUS_RANK = {status: rank for rank, status in enumerate(STATUS_ORDER)}
+RECEIPT_STATUSES = frozenset(STATUS_ORDER[1:])
+
+
+def encode_receipts(receipts: Sequence[Mapping[str, Any]]) -> bytes:
+    return orjson.dumps(receipts, option=orjson.OPT_NON_STR_KEYS)
+
+
+def decode_receipts(body: bytes) -> List[Dict[str, Any]]:
+    receipts = orjson.loads(body)
+    if not isinstance(receipts, list):
+        raise ValueError("Ожидается массив квитанций")
+    # битая квитанция иначе сорвала бы применение всей пачки
+    for receipt in receipts:
+        if not isinstance(receipt, dict):
+            raise ValueError("Квитанция должна быть объектом")
+        if receipt.get("status") not in RECEIPT_STATUSES:
+            raise ValueError(f"Неизвестный статус квитанции: {receipt.get('status')}")
+        UUID(str(receipt.get("notification_id")))
+        if receipt.get("occurred_at"):
+            datetime.fromisoformat(receipt["occurred_at"])
+    return receipts
+
+
+def latest_receipts(receipts: Iterable[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+    """По одной квитанции на уведомление: старшая по статусу, затем по времени.
+
+    Одно UPDATE ... FROM не может применить к строке две квитанции, а
+    результат применения по очереди совпал бы со старшей из них.
+    """
+    latest: Dict[str, Mapping[str, Any]] = {}
+    for receipt in receipts:
+        key = str(receipt["notification_id"])
+        current = latest.get(key)
+        if current is None or _order(receipt) > _order(current):
+            latest[key] = receipt
+    return list(latest.values())
+
+
+def _order(receipt: Mapping[str, Any]) -> Tuple[int, str]:
+    # API приводит время к UTC, а ISO 8601 в одной зоне сравнивается строкой
+    return STATUS_RANK[receipt["status"]], str(receipt.get("occurred_at") or "")
@@ -0,0 +1 @@
+"""Shared user inbox read model for notification system"""
@@ -0,0 +1,308 @@
+"""Входящие пользователя в Redis: последние уведомления и счётчик непрочитанных.
+
+Read model для ``GET /users/{user_id}/inbox``, источник правды —
+Postgres (статусы и ``read_at``). Ключи пользователя; хеш-тег ``{user_id}``
+держит их в одном слоте кластера, поэтому их меняет один Lua-скрипт:
+
+- ``inbox:{u}:ids`` — ZSET id уведомлений, score — created_at в микросекундах;
+- ``inbox:{u}:items`` — HASH id → краткая сводка (JSON полей списка и ``read_at``);
+- ``inbox:{u}:unread`` — SET непрочитанных id из окна;
+- ``inbox:{u}:meta`` — HASH: ``built``, ``older_unread`` — непрочитанные за
+  пределами окна, ``complete`` — в окне вся история пользователя.
+
+В окне не больше ``size`` последних доставленных уведомлений. Входящие
+строит API из Postgres при первом чтении: ``begin_rebuild`` ставит метку
+сборки, затем выборка из БД сливается с тем, что воркер успел дописать
+(``rebuild``). Воркер дописывает и меняет статусы только у существующих
+входящих — иначе ключи копились бы у тех, кто их не читает — и только после
+commit, поэтому пропущенное им попадёт в выборку сборки. Сброс отметок о
+прочтении и статусов во время сборки отменяет её: её выборка могла их не
+увидеть. Ключи живут ``ttl`` с последнего обращения.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+import orjson
+from redis.asyncio import Redis
+
+from shared.utils.serialization import dumps
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# сколько держать метку сборки, если API упал посреди неё
+BUILD_TTL_SECONDS = 60
+
+# отсекает старейшие сверх окна; их непрочитанные уходят в older_unread
+_TRIM = """
+local function trim(size)
+  local extra = redis.call('ZCARD', KEYS[1]) - size
+  if extra <= 0 then return end
+  local old = redis.call('ZRANGE', KEYS[1], 0, extra - 1)
+  redis.call('ZREMRANGEBYRANK', KEYS[1], 0, extra - 1)
+  for _, id in ipairs(old) do
+    redis.call('HDEL', KEYS[2], id)
+    if redis.call('SREM', KEYS[3], id) == 1 then
+      redis.call('HINCRBY', KEYS[4], 'older_unread', 1)
+    end
+  end
+  redis.call('HSET', KEYS[4], 'complete', 0)
+end
+local function touch(ttl)
+  for i = 1, #KEYS do redis.call('EXPIRE', KEYS[i], ttl) end
+end
+"""
+
+# ARGV: id, score, сводка, size, ttl
+ADD_SCRIPT = _TRIM + """
+if redis.call('EXISTS', KEYS[4]) == 0 then return 0 end
+-- повторная доставка сообщения не возвращает прочитанному «непрочитано»
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[1])
+trim(tonumber(ARGV[4]))
+touch(ARGV[5])
+return 1
+"""
+
+# ARGV: id, JSON изменённых полей
+UPDATE_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'built') ~= '1' then
+  redis.call('DEL', KEYS[4])
+  return 0
+end
+local current = redis.call('HGET', KEYS[2], ARGV[1])
+if not current then return 0 end
+local summary = cjson.decode(current)
+for field, value in pairs(cjson.decode(ARGV[2])) do summary[field] = value end
+redis.call('HSET', KEYS[2], ARGV[1], cjson.encode(summary))
+return 1
+"""
+
+# ARGV: read_at, id... — только id, которые Postgres сейчас перевёл в прочитанные
+MARK_READ_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'built') ~= '1' then
+  redis.call('DEL', KEYS[4])
+  return false
+end
+for i = 2, #ARGV do
+  local id = ARGV[i]
+  if redis.call('SREM', KEYS[3], id) == 1 then
+    local summary = cjson.decode(redis.call('HGET', KEYS[2], id))
+    summary['read_at'] = ARGV[1]
+    redis.call('HSET', KEYS[2], id, cjson.encode(summary))
+  elseif redis.call('HEXISTS', KEYS[2], id) == 0 then
+    -- за пределами окна
+    if tonumber(redis.call('HGET', KEYS[4], 'older_unread') or '0') > 0 then
+      redis.call('HINCRBY', KEYS[4], 'older_unread', -1)
+    end
+  end
+end
+return redis.call('SCARD', KEYS[3]) + tonumber(redis.call('HGET', KEYS[4], 'older_unread') or '0')
+"""
+
+# ARGV: read_at
+MARK_ALL_READ_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'built') ~= '1' then
+  redis.call('DEL', KEYS[4])
+  return false
+end
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+  local summary = cjson.decode(redis.call('HGET', KEYS[2], id))
+  summary['read_at'] = ARGV[1]
+  redis.call('HSET', KEYS[2], id, cjson.encode(summary))
+end
+redis.call('DEL', KEYS[3])
+redis.call('HSET', KEYS[4], 'older_unread', 0)
+return 0
+"""
+
+# ARGV: токен, ttl сборки
+BEGIN_REBUILD_SCRIPT = """
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+redis.call('HSET', KEYS[4], 'building', ARGV[1])
+redis.call('EXPIRE', KEYS[4], ARGV[2])
+return 1
+"""
+
+# ARGV: токен, size, ttl, older_unread, complete, затем четвёрки id, score, сводка, unread
+REBUILD_SCRIPT = _TRIM + """
+if redis.call('HGET', KEYS[4], 'building') ~= ARGV[1] then return 0 end
+for i = 6, #ARGV, 4 do
+  if redis.call('HEXISTS', KEYS[2], ARGV[i]) == 0 then
+    redis.call('ZADD', KEYS[1], ARGV[i + 1], ARGV[i])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    if ARGV[i + 3] == '1' then redis.call('SADD', KEYS[3], ARGV[i]) end
+  end
+end
+redis.call('HDEL', KEYS[4], 'building')
+redis.call('HSET', KEYS[4], 'built', 1, 'older_unread', ARGV[4], 'complete', ARGV[5])
+trim(tonumber(ARGV[2]))
+touch(ARGV[3])
+return 1
+"""
+
+# ARGV: score курсора или '+inf', id курсора или '', limit, ttl;
+# вернёт unread, complete и до limit + 1 сводок от новых к старым
+PAGE_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'built') ~= '1' then return false end
+local limit = tonumber(ARGV[3])
+local rows
+if ARGV[2] == '' then
+  rows = redis.call('ZREVRANGE', KEYS[1], 0, limit, 'WITHSCORES')
+else
+  -- строки с тем же score, что у курсора, отбираются по id
+  local ties = redis.call('ZCOUNT', KEYS[1], ARGV[1], ARGV[1])
+  rows = redis.call(
+    'ZREVRANGEBYSCORE', KEYS[1], ARGV[1], '-inf', 'WITHSCORES', 'LIMIT', 0, limit + 1 + ties
+  )
+end
+local after = tonumber(ARGV[1])
+local result = {
+  redis.call('SCARD', KEYS[3]) + tonumber(redis.call('HGET', KEYS[4], 'older_unread') or '0'),
+  tonumber(redis.call('HGET', KEYS[4], 'complete') or '0'),
+}
+for i = 1, #rows, 2 do
+  if #result - 2 > limit then break end
+  if ARGV[2] == '' or tonumber(rows[i + 1]) < after or rows[i] < ARGV[2] then
+    local summary = redis.call('HGET', KEYS[2], rows[i])
+    if summary then result[#result + 1] = summary end
+  end
+end
+for i = 1, #KEYS do redis.call('EXPIRE', KEYS[i], ARGV[4]) end
+return result
+"""
+
+UNREAD_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'built') ~= '1' then return false end
+return redis.call('SCARD', KEYS[3]) + tonumber(redis.call('HGET', KEYS[4], 'older_unread') or '0')
+"""
+
+
+class InboxPage(NamedTuple):
+    """Страница входящих: сводки от новых к старым и есть ли следующая."""
+
+    items: List[Dict[str, Any]]
+    has_more: bool
+    unread: int
+
+
+def inbox_keys(user_id: str) -> List[str]:
+    prefix = f"inbox:{{{user_id}}}"
+    return [f"{prefix}:ids", f"{prefix}:items", f"{prefix}:unread", f"{prefix}:meta"]
+
+
+def inbox_score(created_at: datetime) -> int:
+    """created_at в микросекундах: порядок совпадает с keyset-пагинацией Postgres."""
+    return (created_at - EPOCH) // timedelta(microseconds=1)
+
+
+def encode_summary(summary: Mapping[str, Any]) -> str:
+    return dumps(summary).decode()
+
+
+class InboxStore:
+    def __init__(self, redis: Redis, size: int, ttl: int) -> None:
+        self.redis = redis
+        self.size = size
+        self.ttl = ttl
+        self._add = redis.register_script(ADD_SCRIPT)
+        self._update = redis.register_script(UPDATE_SCRIPT)
+        self._mark_read = redis.register_script(MARK_READ_SCRIPT)
+        self._mark_all_read = redis.register_script(MARK_ALL_READ_SCRIPT)
+        self._begin_rebuild = redis.register_script(BEGIN_REBUILD_SCRIPT)
+        self._rebuild = redis.register_script(REBUILD_SCRIPT)
+        self._page = redis.register_script(PAGE_SCRIPT)
+        self._unread = redis.register_script(UNREAD_SCRIPT)
+
+    async def add(self, summary: Mapping[str, Any]) -> bool:
+        """Дописывает доставленное уведомление, если входящие пользователя построены."""
+        args = [
+            str(summary["id"]),
+            inbox_score(summary["created_at"]),
+            encode_summary(summary),
+            self.size,
+            self.ttl,
+        ]
+        return bool(await self._add(keys=inbox_keys(summary["user_id"]), args=args))
+
+    async def update(self, changes: Sequence[Mapping[str, Any]]) -> None:
+        """Переносит в сводки изменённые поля; в каждом изменении есть id и user_id."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for change in changes:
+                fields = {k: v for k, v in change.items() if k not in ("id", "user_id")}
+                await self._update(
+                    keys=inbox_keys(change["user_id"]),
+                    args=[str(change["id"]), encode_summary(fields)],
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def page(
+        self, user_id: str, limit: int, after: Optional[Tuple[datetime, UUID]] = None
+    ) -> Optional[InboxPage]:
+        """Страница из входящих; ``None`` — их нет или окно кончилось раньше страницы."""
+        args: List[Any] = (
+            ["+inf", "", limit, self.ttl]
+            if after is None
+            else [inbox_score(after[0]), str(after[1]), limit, self.ttl]
+        )
+        result = await self._page(keys=inbox_keys(user_id), args=args)
+        if result is None:
+            return None
+        unread, complete, *rows = result
+        if len(rows) <= limit and not complete:
+            # старше окна есть уведомления — страницу отдаст Postgres
+            return None
+        items = [orjson.loads(row) for row in rows[:limit]]
+        return InboxPage(items=items, has_more=len(rows) > limit, unread=int(unread))
+
+    async def unread(self, user_id: str) -> Optional[int]:
+        result = await self._unread(keys=inbox_keys(user_id))
+        return None if result is None else int(result)
+
+    async def begin_rebuild(self, user_id: str) -> str:
+        """Ставит метку сборки; выборку из Postgres делать после неё."""
+        token = uuid4().hex
+        await self._begin_rebuild(keys=inbox_keys(user_id), args=[token, BUILD_TTL_SECONDS])
+        return token
+
+    async def rebuild(
+        self, user_id: str, token: str, rows: Sequence[Mapping[str, Any]], unread_total: int
+    ) -> bool:
+        """Сливает выборку Postgres (последние ``size`` строк) во входящие.
+
+        ``unread_total`` — все непрочитанные пользователя из того же снимка.
+        ``False`` — сборку отменили или перехватили, входящие не построены.
+        """
+        args: List[Any] = [token, self.size, self.ttl, 0, int(len(rows) < self.size)]
+        window_unread = 0
+        for row in rows[: self.size]:
+            unread = row.get("read_at") is None
+            window_unread += unread
+            args += [
+                str(row["id"]),
+                inbox_score(row["created_at"]),
+                encode_summary(row),
+                int(unread),
+            ]
+        args[3] = max(unread_total - window_unread, 0)
+        return bool(await self._rebuild(keys=inbox_keys(user_id), args=args))
+
+    async def mark_read(
+        self, user_id: str, notification_ids: Sequence[UUID], read_at: datetime
+    ) -> Optional[int]:
+        """Отмечает прочитанными id, уже отмеченные в Postgres; вернёт непрочитанные.
+
+        ``None`` — входящие не построены (или сборка отменена).
+        """
+        result = await self._mark_read(
+            keys=inbox_keys(user_id),
+            args=[read_at.isoformat(), *map(str, notification_ids)],
+        )
+        return None if result is None else int(result)
+
+    async def mark_all_read(self, user_id: str, read_at: datetime) -> bool:
+        result = await self._mark_all_read(keys=inbox_keys(user_id), args=[read_at.isoformat()])
+        return result is not None
@@ -4,7 +4,7 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field
 
-from shared.enums.delivery import DeliveryStatus, NotificationType
+from shared.enums.delivery import DeliveryStatus, NotificationType, PriorityLevel
 
 
 class NotificationTemplate(BaseModel):
@@ -23,6 +23,7 @@ class NotificationCreate(BaseModel):
     scheduled_time: Union[datetime, None] = None
     is_recurring: bool = False
     recurrence_pattern: Union[str, None] = None
+    priority: PriorityLevel = PriorityLevel.NORMAL
     data: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -0,0 +1,227 @@
+"""Схема сообщений брокера на проводе.
+
+Логически сообщение — словарь полей уведомления (``notification_id``,
+``user_id``, ``subject``, ``body``...). Формат тела определяет
+``content_type`` сообщения AMQP:
+
+- ``application/json`` — прежний UTF-8 JSON со всеми именами ключей;
+- ``application/vnd.notification.v1+msgpack`` — схема v1: msgpack-массив
+  полей в фиксированном порядке, UUID как 16 байт, тип и приоритет как
+  коды. Поля вне схемы передаются последним элементом-словарём;
+- ``application/vnd.notification.v2+msgpack`` — схема v2 для сообщений
+  по ссылке: вместо темы, тела и data — ``template_version``,
+  ``payload_ref`` на общую часть рассылки (см. ``payload_ref``) и
+  ``delta`` — data конкретного получателя поверх общей.
+
+Консьюмеры читают все форматы, поэтому издателей переключают на msgpack
+только после обновления всех консьюмеров. Порядок полей и таблицы кодов v1
+не меняются: несовместимое изменение — новая версия и новый ``content_type``.
+"""
+
+import hashlib
+from enum import Enum
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+from uuid import UUID
+
+import msgpack
+import orjson
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_V1_CONTENT_TYPE = "application/vnd.notification.v1+msgpack"
+MSGPACK_V2_CONTENT_TYPE = "application/vnd.notification.v2+msgpack"
+
+
+class WireFormat(str, Enum):
+    """Формат, в котором издатель кодирует сообщения"""
+
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+V1_FIELDS = (
+    "notification_id",
+    "user_id",
+    "template_id",
+    "notification_type",
+    "priority",
+    "subject",
+    "body",
+    "data",
+)
+V2_FIELDS = (
+    "notification_id",
+    "user_id",
+    "template_id",
+    "template_version",
+    "payload_ref",
+    "notification_type",
+    "priority",
+    "delta",
+)
+V1_NOTIFICATION_TYPES = ("email", "sms", "push", "instant")
+V1_PRIORITIES = ("low", "normal", "high", "urgent")
+
+_V1_FIELD_SET = frozenset(V1_FIELDS)
+_V2_FIELD_SET = frozenset(V2_FIELDS)
+_V1_TYPE_CODES = {value: code for code, value in enumerate(V1_NOTIFICATION_TYPES)}
+_V1_PRIORITY_CODES = {value: code for code, value in enumerate(V1_PRIORITIES)}
+
+
+def _pack_uuid(value: Union[UUID, str, None]) -> Union[bytes, str, None]:
+    if isinstance(value, UUID):
+        return value.bytes
+    # разбор через bytes.fromhex в разы дешевле конструктора UUID
+    if (
+        isinstance(value, str)
+        and len(value) == 36
+        and value[8] == value[13] == value[18] == value[23] == "-"
+    ):
+        try:
+            return bytes.fromhex(value.replace("-", ""))
+        except ValueError:
+            return value
+    return value
+
+
+def _unpack_uuid(value: Union[bytes, str, None]) -> Optional[str]:
+    if isinstance(value, bytes):
+        digits = value.hex()
+        return (
+            f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+        )
+    return value
+
+
+def _pack_code(value: Any, codes: Mapping[str, int]) -> Any:
+    # значение вне таблицы кодов уходит строкой, а не ломает публикацию
+    return codes.get(value, value)
+
+
+def _unpack_code(value: Any, table: Tuple[str, ...]) -> Any:
+    return table[value] if isinstance(value, int) else value
+
+
+def _encode_v1(message: Mapping[str, Any]) -> bytes:
+    fields: List[Any] = [
+        _pack_uuid(message.get("notification_id")),
+        message.get("user_id"),
+        _pack_uuid(message.get("template_id")),
+        _pack_code(message.get("notification_type"), _V1_TYPE_CODES),
+        _pack_code(message.get("priority"), _V1_PRIORITY_CODES),
+        message.get("subject"),
+        message.get("body"),
+        message.get("data") or {},
+    ]
+    if not message.keys() <= _V1_FIELD_SET:
+        fields.append(
+            {key: value for key, value in message.items() if key not in _V1_FIELD_SET}
+        )
+    return msgpack.packb(fields, use_bin_type=True)
+
+
+def _decode_v1(body: bytes) -> Dict[str, Any]:
+    fields = msgpack.unpackb(body, raw=False)
+    message: Dict[str, Any] = {
+        "notification_id": _unpack_uuid(fields[0]),
+        "user_id": fields[1],
+        "template_id": _unpack_uuid(fields[2]),
+        "notification_type": _unpack_code(fields[3], V1_NOTIFICATION_TYPES),
+        "priority": _unpack_code(fields[4], V1_PRIORITIES),
+        "subject": fields[5],
+        "body": fields[6],
+        "data": fields[7],
+    }
+    if len(fields) > len(V1_FIELDS):
+        message.update(fields[len(V1_FIELDS)])
+    return message
+
+
+def _encode_v2(message: Mapping[str, Any]) -> bytes:
+    fields: List[Any] = [
+        _pack_uuid(message.get("notification_id")),
+        message.get("user_id"),
+        _pack_uuid(message.get("template_id")),
+        message.get("template_version"),
+        bytes.fromhex(message["payload_ref"]),
+        _pack_code(message.get("notification_type"), _V1_TYPE_CODES),
+        _pack_code(message.get("priority"), _V1_PRIORITY_CODES),
+        message.get("delta") or {},
+    ]
+    if not message.keys() <= _V2_FIELD_SET:
+        fields.append(
+            {key: value for key, value in message.items() if key not in _V2_FIELD_SET}
+        )
+    return msgpack.packb(fields, use_bin_type=True)
+
+
+def _decode_v2(body: bytes) -> Dict[str, Any]:
+    fields = msgpack.unpackb(body, raw=False)
+    message: Dict[str, Any] = {
+        "notification_id": _unpack_uuid(fields[0]),
+        "user_id": fields[1],
+        "template_id": _unpack_uuid(fields[2]),
+        "template_version": fields[3],
+        "payload_ref": fields[4].hex(),
+        "notification_type": _unpack_code(fields[5], V1_NOTIFICATION_TYPES),
+        "priority": _unpack_code(fields[6], V1_PRIORITIES),
+        "delta": fields[7],
+    }
+    if len(fields) > len(V2_FIELDS):
+        message.update(fields[len(V2_FIELDS)])
+    return message
+
+
+def _encode_msgpack(message: Mapping[str, Any]) -> Tuple[bytes, str]:
+    if "payload_ref" in message:
+        return _encode_v2(message), MSGPACK_V2_CONTENT_TYPE
+    return _encode_v1(message), MSGPACK_V1_CONTENT_TYPE
+
+
+def _encode_json(message: Mapping[str, Any]) -> Tuple[bytes, str]:
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS), JSON_CONTENT_TYPE
+
+
+_ENCODERS: Dict[str, Callable[[Mapping[str, Any]], Tuple[bytes, str]]] = {
+    WireFormat.JSON: _encode_json,
+    WireFormat.MSGPACK: _encode_msgpack,
+}
+
+
+def encode_message(
+    message: Mapping[str, Any], wire_format: WireFormat = WireFormat.JSON
+) -> Tuple[bytes, str]:
+    """Кодирует сообщение, вернёт тело и его ``content_type``.
+
+    Сообщения по ссылке (с ``payload_ref``) в msgpack идут по схеме v2.
+    """
+    return _ENCODERS[wire_format](message)
+
+
+def decode_message(body: bytes, content_type: Optional[str]) -> Dict[str, Any]:
+    """Разбирает тело сообщения любого поддерживаемого формата.
+
+    Сообщения без ``content_type`` считаются JSON: так публиковали
+    до появления схемы.
+    """
+    if content_type == MSGPACK_V1_CONTENT_TYPE:
+        return _decode_v1(body)
+    if content_type == MSGPACK_V2_CONTENT_TYPE:
+        return _decode_v2(body)
+    if not content_type or content_type == JSON_CONTENT_TYPE:
+        return orjson.loads(body)
+    raise ValueError(f"Неподдерживаемый content_type сообщения: {content_type}")
+
+
+def payload_ref(
+    template_id: Union[UUID, str],
+    template_version: int,
+    subject: str,
+    body: str,
+    data: Mapping[str, Any],
+) -> str:
+    """Ключ общей части рассылки: sha256 её содержимого в hex."""
+    content = orjson.dumps(
+        [str(template_id), template_version, subject, body, data],
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+    return hashlib.sha256(content).hexdigest()
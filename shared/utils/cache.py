@@ -0,0 +1,115 @@
+"""Кэши процесса: LRU с TTL и кэш снимков шаблонов по id и по имени."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+from uuid import UUID
+
+T = TypeVar("T")
+
+
+class TTLCache(Generic[T]):
+    """LRU-кэш с ограничением размера и временем жизни записей."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: T) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[T]:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def pop_matching(self, predicate: Callable[[T], bool]) -> int:
+        """Удаляет записи, значение которых подходит под ``predicate``; вернёт их число."""
+        keys = [key for key, (_, value) in self._data.items() if predicate(value)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def expire(self) -> int:
+        """Удаляет просроченные записи; вернёт их число."""
+        now = time.monotonic()
+        keys = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TemplateCache(Generic[T]):
+    """Кэш шаблонов по id и по имени.
+
+    Хранит отвязанные от сессии снимки (их строит ``snapshot``, у снимка есть
+    ``id`` и ``name``), поэтому их можно безопасно отдавать из разных запросов.
+
+    Чтение из БД, начатое до инвалидации, может вернуть старую версию. Поэтому
+    заполняющий берёт ``generation`` до чтения и передаёт его в ``put``: если
+    за время чтения была инвалидация, снимок не кэшируется.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, snapshot: Callable[[Any], T]) -> None:
+        self._by_id: TTLCache[T] = TTLCache(maxsize, ttl)
+        self._by_name: TTLCache[T] = TTLCache(maxsize, ttl)
+        self._snapshot = snapshot
+        self.invalidations = 0
+        self.generation = 0
+
+    def get_by_id(self, template_id: UUID) -> Optional[T]:
+        return self._by_id.get(template_id)
+
+    def get_by_name(self, name: str) -> Optional[T]:
+        return self._by_name.get(name)
+
+    def put(self, template: Any, generation: Optional[int] = None) -> T:
+        """Снимок шаблона; кэшируется, если с ``generation`` не было инвалидаций."""
+        snapshot = self._snapshot(template)
+        if generation is None or generation == self.generation:
+            self._by_id.set(snapshot.id, snapshot)  # type: ignore[attr-defined]
+            self._by_name.set(snapshot.name, snapshot)  # type: ignore[attr-defined]
+        return snapshot
+
+    def invalidate(self, template_id: UUID) -> None:
+        self.invalidations += 1
+        self.generation += 1
+        self._by_id.pop(template_id)
+        # запись по id могла уже вытесниться, а по имени — остаться;
+        # при переименовании их к тому же несколько
+        self._by_name.pop_matching(lambda snapshot: snapshot.id == template_id)  # type: ignore[attr-defined]
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._by_id.clear()
+        self._by_name.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._by_id),
+            "hits": self._by_id.hits + self._by_name.hits,
+            "misses": self._by_id.misses + self._by_name.misses,
+            "invalidations": self.invalidations,
+        }
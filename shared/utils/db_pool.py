@@ -0,0 +1,21 @@
+import time
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from shared.utils.metrics import DB_POOL_CHECKOUT_WAIT
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения.
+
+    Передаётся в ``create_async_engine(poolclass=...)``; при исчерпании пула
+    время уходит именно сюда, поэтому рост гистограммы — сигнал
+    увеличить ``pool_size`` или сократить удержание сессий.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
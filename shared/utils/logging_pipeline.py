@@ -0,0 +1,300 @@
+"""Неблокирующий конвейер логов для всех сервисов.
+
+На event loop остаются только дешёвые процессоры structlog: фильтр уровня,
+выборка и ограничение частоты по имени события, метка времени. Словарь
+события сразу кладётся в ограниченную очередь, без ``LogRecord`` и поиска
+вызывающего кадра; записи сторонних библиотек (uvicorn, SQLAlchemy)
+попадают в ту же очередь через ``QueueHandler``. Форматирование в JSON
+(orjson) и запись в поток выполняет фоновый поток ``QueueListener``. При
+переполнении очереди записи отбрасываются со счётчиком
+``log_records_dropped_total`` — лог не должен останавливать обработку запросов.
+"""
+
+import atexit
+import logging
+import queue
+import random
+import sys
+import time
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+import orjson
+import structlog
+
+from shared.utils.metrics import LOG_RECORDS_DROPPED
+
+DEFAULT_QUEUE_SIZE = 10000
+
+# событие structlog в очереди: имя логгера, метод и словарь события
+QueuedEvent = Tuple[str, str, MutableMapping[str, Any]]
+QueueItem = Union[logging.LogRecord, QueuedEvent]
+
+_listener: Optional["LogListener"] = None
+
+
+class EventSampler:
+    """Пропускает в лог долю ``rate`` событий с заданным именем.
+
+    Для частых однотипных событий (``EMAIL_SENT``, ``WS_CONNECTED``),
+    количество которых и так видно в метриках. Пропущенное событие несёт
+    поле ``sampled`` с долей, чтобы при анализе можно было пересчитать объём.
+    """
+
+    def __init__(self, rates: Mapping[str, float]) -> None:
+        self.rates = dict(rates)
+
+    def __call__(
+        self, logger: Any, method_name: str, event_dict: MutableMapping[str, Any]
+    ) -> MutableMapping[str, Any]:
+        rate = self.rates.get(event_dict.get("event"))  # type: ignore[arg-type]
+        if rate is None:
+            return event_dict
+        if random.random() >= rate:
+            raise structlog.DropEvent
+        event_dict["sampled"] = rate
+        return event_dict
+
+
+class EventRateLimiter:
+    """Не больше ``limit`` событий с заданным именем в секунду.
+
+    Token bucket на имя события с запасом в одну секунду. Число
+    отброшенных записей попадает в поле ``suppressed`` первой пропущенной
+    после них, так что шторм ошибок виден в логе, но не заливает его.
+    """
+
+    def __init__(self, limits: Mapping[str, float]) -> None:
+        self.limits = dict(limits)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._suppressed: "Counter[str]" = Counter()
+
+    def __call__(
+        self, logger: Any, method_name: str, event_dict: MutableMapping[str, Any]
+    ) -> MutableMapping[str, Any]:
+        event = event_dict.get("event")
+        limit = self.limits.get(event)  # type: ignore[arg-type]
+        if limit is None:
+            return event_dict
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(event, (limit, now))  # type: ignore[arg-type]
+        tokens = min(limit, tokens + (now - updated) * limit)
+        if tokens < 1:
+            self._buckets[event] = (tokens, now)  # type: ignore[index]
+            self._suppressed[event] += 1  # type: ignore[index]
+            raise structlog.DropEvent
+        self._buckets[event] = (tokens - 1, now)  # type: ignore[index]
+        suppressed = self._suppressed.pop(event, 0)  # type: ignore[arg-type]
+        if suppressed:
+            event_dict["suppressed"] = suppressed
+        return event_dict
+
+
+def _put(records: "queue.Queue[QueueItem]", item: QueueItem) -> None:
+    try:
+        records.put_nowait(item)
+    except queue.Full:
+        LOG_RECORDS_DROPPED.inc()
+
+
+class QueueLogger:
+    """Логгер structlog, который только ставит событие в очередь."""
+
+    def __init__(self, name: str, records: "queue.Queue[QueueItem]") -> None:
+        self.name = name
+        self._records = records
+
+    def _enqueue(self, method_name: str, event_dict: MutableMapping[str, Any]) -> None:
+        _put(self._records, (self.name, method_name, event_dict))
+
+    def debug(self, event_dict: MutableMapping[str, Any]) -> None:
+        self._enqueue("debug", event_dict)
+
+    def info(self, event_dict: MutableMapping[str, Any]) -> None:
+        self._enqueue("info", event_dict)
+
+    def warning(self, event_dict: MutableMapping[str, Any]) -> None:
+        self._enqueue("warning", event_dict)
+
+    def error(self, event_dict: MutableMapping[str, Any]) -> None:
+        self._enqueue("error", event_dict)
+
+    def critical(self, event_dict: MutableMapping[str, Any]) -> None:
+        self._enqueue("critical", event_dict)
+
+    msg = info
+    warn = warning
+    exception = err = error
+    fatal = failure = critical
+
+
+class QueueLoggerFactory:
+    def __init__(self, records: "queue.Queue[QueueItem]") -> None:
+        self._records = records
+
+    def __call__(self, *args: Any) -> QueueLogger:
+        return QueueLogger(args[0] if args else "", self._records)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """``QueueHandler`` для записей stdlib без форматирования в вызывающем потоке.
+
+    Базовый ``prepare`` форматирует запись ещё до постановки в очередь,
+    то есть на event loop; здесь только подставляются аргументы сообщения.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        _put(self.queue, record)
+
+
+class LogListener(QueueListener):
+    """Фоновый поток: рендерит события structlog и записи stdlib в один поток."""
+
+    def __init__(
+        self,
+        records: "queue.Queue[QueueItem]",
+        output: logging.StreamHandler,
+        processors: List[Any],
+    ) -> None:
+        super().__init__(records, output, respect_handler_level=True)
+        self.output = output
+        self.processors = processors
+
+    def handle(self, record: QueueItem) -> None:  # type: ignore[override]
+        if isinstance(record, logging.LogRecord):
+            super().handle(record)
+            return
+        name, method_name, event_dict = record
+        event_dict["logger"] = name
+        try:
+            for processor in self.processors:
+                event_dict = processor(None, method_name, event_dict)
+            # пишет только этот поток, блокировка обработчика не нужна
+            line = event_dict + self.output.terminator  # type: ignore[operator]
+            self.output.stream.write(line)
+            self.output.flush()
+        except Exception:
+            self.output.handleError(logging.makeLogRecord({"msg": event_dict}))
+
+    def enqueue_sentinel(self) -> None:
+        # очередь может быть полна: ждём места, иначе хвост логов потеряется
+        self.queue.put(self._sentinel)
+
+
+def _capture_exc_info(
+    logger: Any, method_name: str, event_dict: MutableMapping[str, Any]
+) -> MutableMapping[str, Any]:
+    # в фоновом потоке sys.exc_info() уже пуст: фиксируем исключение здесь
+    exc_info = event_dict.get("exc_info")
+    if exc_info is True:
+        event_dict["exc_info"] = sys.exc_info()
+    elif isinstance(exc_info, BaseException):
+        event_dict["exc_info"] = (type(exc_info), exc_info, exc_info.__traceback__)
+    return event_dict
+
+
+def _to_queue(
+    logger: Any, method_name: str, event_dict: MutableMapping[str, Any]
+) -> Tuple[Tuple[MutableMapping[str, Any]], Dict[str, Any]]:
+    # последний процессор: словарь уходит в QueueLogger как есть
+    return (event_dict,), {}
+
+
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    return orjson.dumps(obj, default=str).decode("utf-8")
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    sample_rates: Optional[Mapping[str, float]] = None,
+    rate_limits: Optional[Mapping[str, float]] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """Настраивает structlog и корневой логгер на запись через фоновый поток.
+
+    Повторный вызов останавливает прежний поток записи, дописав его очередь.
+    """
+    shutdown_logging()
+
+    renderer: Any = (
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+        if json_format
+        else structlog.dev.ConsoleRenderer()
+    )
+    render_processors = [structlog.processors.format_exc_info, renderer]
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
+        ],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            *render_processors,
+        ],
+    )
+    output = logging.StreamHandler(stream)
+    output.setFormatter(formatter)
+
+    records: "queue.Queue[QueueItem]" = queue.Queue(maxsize=queue_size)
+    root_logger = logging.getLogger()
+    for root_handler in root_logger.handlers[:]:
+        root_logger.removeHandler(root_handler)
+    root_logger.addHandler(NonBlockingQueueHandler(records))
+    root_logger.setLevel(level)
+
+    structlog.configure(
+        processors=[
+            # отброшенные события не должны стоить остальных процессоров
+            EventSampler(sample_rates or {}),
+            EventRateLimiter(rate_limits or {}),
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
+            _capture_exc_info,
+            _to_queue,
+        ],
+        # уровень отсекается до процессоров: отключённые методы — пустышки
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelName(level.upper())
+        ),
+        logger_factory=QueueLoggerFactory(records),
+        cache_logger_on_first_use=True,
+    )
+
+    logging.getLogger("uvicorn").handlers = []
+    logging.getLogger("uvicorn.access").handlers = []
+    logging.getLogger("uvicorn").propagate = True
+
+    global _listener
+    _listener = LogListener(records, output, render_processors)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и останавливает поток записи; повторный вызов безопасен."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,31 @@
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# от долей миллисекунды: ожидание свободного соединения обычно нулевое
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0)
+
+BROKER_MESSAGES_PUBLISHED = Counter(
+    "broker_messages_published_total",
+    "Опубликовано сообщений в очередь RabbitMQ",
+    ["queue"],
+)
+BROKER_MESSAGES_CONSUMED = Counter(
+    "broker_messages_consumed_total",
+    "Обработано сообщений из очереди RabbitMQ",
+    ["queue", "outcome"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Записи лога, отброшенные из-за переполнения очереди записи",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула БД",
+    buckets=POOL_WAIT_BUCKETS,
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Текущие метрики процесса в формате Prometheus и их content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,21 @@
+"""JSON для строк БД без промежуточных моделей.
+
+Строки проекций кодирует orjson напрямую. datetime и str-Enum он пишет сам
+(ISO 8601 и значения), а UUID драйвера asyncpg — подкласс ``uuid.UUID``,
+который orjson не знает: его строкой отдаёт ``json_default``.
+"""
+
+from typing import Any
+from uuid import UUID
+
+import orjson
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any, option: int = 0) -> bytes:
+    return orjson.dumps(value, default=json_default, option=option)
@@ -0,0 +1,76 @@
+"""Unit tests for admission primitives"""
+
+import pytest
+
+from shared.broker import admission
+from shared.broker.admission import LaneMonitor, TokenBucket, recipients_cost
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_take_and_refill(clock):
+    """Тест: корзина списывает токены и пополняется со скоростью rate"""
+    bucket = TokenBucket(rate=10, capacity=100)
+
+    assert bucket.take(60) == 0.0
+    assert bucket.take(60) == pytest.approx(2.0)
+    clock[0] += 2
+    assert bucket.take(60) == 0.0
+    assert bucket.level() == pytest.approx(0.0)
+
+
+def test_token_bucket_wait_does_not_debit(clock):
+    """Тест: проверка без списания не тратит квоту"""
+    bucket = TokenBucket(rate=10, capacity=100)
+
+    assert bucket.wait(80) == 0.0
+    assert bucket.wait(80) == 0.0
+    assert bucket.level() == pytest.approx(100.0)
+
+
+def test_token_bucket_caps_cost_at_capacity(clock):
+    """Тест: запрос дороже ёмкости забирает полную корзину, а не ждёт вечно"""
+    bucket = TokenBucket(rate=10, capacity=100)
+
+    assert bucket.take(1_000_000) == 0.0
+    assert bucket.level() == pytest.approx(0.0)
+    assert bucket.wait(1_000_000) == pytest.approx(10.0)
+
+
+def test_lane_monitor_estimates_drain_rate():
+    """Тест: скорость разбора учитывает собственный приток в полосу"""
+    lane = LaneMonitor("email_notifications", "normal", max_depth=1000, max_wait=60)
+    lane.update(depth=500, consumers=2, published=0, now=0.0)
+    # за секунду опубликовано 100, глубина упала на 100: разобрано 200
+    lane.update(depth=400, consumers=2, published=100, now=1.0)
+
+    assert lane.drain_rate == pytest.approx(0.3 * 200)
+    assert lane.estimated_wait_seconds == pytest.approx(400 / 60, abs=0.01)
+    assert lane.saturated is False
+
+
+def test_lane_monitor_saturation():
+    """Тест: полоса насыщена по глубине или по ожиданию; без разбора ожидание неизвестно"""
+    deep = LaneMonitor("sms_notifications", "normal", max_depth=100, max_wait=60)
+    deep.update(depth=100, consumers=0, published=0, now=0.0)
+    assert deep.saturated is True
+    assert deep.estimated_wait_seconds is None
+
+    slow = LaneMonitor("push_notifications", "low", max_depth=10_000, max_wait=5)
+    slow.update(depth=100, consumers=1, published=0, now=0.0)
+    slow.update(depth=90, consumers=1, published=0, now=1.0)
+    assert slow.estimated_wait_seconds == pytest.approx(90 / 3)
+    assert slow.saturated is True
+    assert slow.snapshot()["queue"] == "push_notifications"
+
+
+def test_recipients_cost():
+    """Тест: стоимость — уникальные получатели, рассылка всем — оценка их числа"""
+    assert recipients_cost(["u1", "u2", "u1"], broadcast_size=50_000) == 2
+    assert recipients_cost(["ALL"], broadcast_size=50_000) == 50_000
+    assert recipients_cost(["all"], broadcast_size=0) == 1
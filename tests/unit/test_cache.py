@@ -0,0 +1,102 @@
+"""Unit tests for process caches"""
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from shared.utils import cache
+from shared.utils.cache import TemplateCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_template(name="welcome", template_id=None):
+    return SimpleNamespace(id=template_id or uuid4(), name=name)
+
+
+def make_cache(maxsize=10, ttl=60):
+    return TemplateCache(maxsize=maxsize, ttl=ttl, snapshot=lambda t: SimpleNamespace(**vars(t)))
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    """Тест: при переполнении вытесняется давно не читанная запись"""
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+
+    assert ttl_cache.get("a") == 1
+    ttl_cache.set("c", 3)
+
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+    assert len(ttl_cache) == 2
+
+
+def test_ttl_cache_expires_entries(clock):
+    """Тест: запись живёт ttl секунд, expire чистит просроченные"""
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+
+    clock[0] += 30
+    assert ttl_cache.get("a") == 1
+    clock[0] += 31
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.expire() == 1
+    assert len(ttl_cache) == 0
+    assert (ttl_cache.hits, ttl_cache.misses) == (1, 1)
+
+
+def test_template_cache_invalidate_drops_id_and_name(clock):
+    """Тест: инвалидация убирает шаблон по id и по имени"""
+    template_cache = make_cache()
+    template = make_template()
+    template_cache.put(template)
+
+    assert template_cache.get_by_name("welcome").id == template.id
+    template_cache.invalidate(template.id)
+
+    assert template_cache.get_by_id(template.id) is None
+    assert template_cache.get_by_name("welcome") is None
+    assert template_cache.stats()["invalidations"] == 1
+
+
+def test_template_cache_invalidate_after_id_eviction(clock):
+    """Тест: запись по имени сбрасывается, даже если запись по id уже вытеснена"""
+    template_cache = make_cache(maxsize=1)
+    template = make_template()
+    template_cache.put(template)
+    template_cache._by_id.set(uuid4(), make_template("other"))
+
+    assert template_cache.get_by_id(template.id) is None
+    template_cache.invalidate(template.id)
+
+    assert template_cache.get_by_name("welcome") is None
+
+
+@pytest.mark.parametrize("reset", ["invalidate", "clear"])
+def test_template_cache_skips_put_after_concurrent_invalidation(clock, reset):
+    """Тест: чтение, начатое до инвалидации, не кладёт старую версию в кэш"""
+    template_cache = make_cache()
+    template = make_template()
+    generation = template_cache.generation
+
+    if reset == "invalidate":
+        template_cache.invalidate(template.id)
+    else:
+        template_cache.clear()
+    snapshot = template_cache.put(template, generation)
+
+    assert snapshot.id == template.id
+    assert template_cache.get_by_id(template.id) is None
+    assert template_cache.get_by_name("welcome") is None
+
+    template_cache.put(template, template_cache.generation)
+    assert template_cache.get_by_id(template.id).name == "welcome"
@@ -0,0 +1,43 @@
+"""Unit tests for user inbox read model"""
+
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import orjson
+
+from shared.enums.delivery import DeliveryStatus
+from shared.inbox.store import encode_summary, inbox_keys, inbox_score
+
+
+def test_inbox_keys_share_hash_tag():
+    """Тест: все ключи пользователя в одном слоте кластера"""
+    keys = inbox_keys("user-1")
+
+    assert len(set(keys)) == 4
+    assert all(key.startswith("inbox:{user-1}:") for key in keys)
+
+
+def test_inbox_score_keeps_microsecond_order():
+    """Тест: score различает соседние микросекунды и не теряет точность"""
+    created_at = datetime(2026, 10, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    score = inbox_score(created_at)
+
+    assert inbox_score(created_at + timedelta(microseconds=1)) == score + 1
+    # ZSET хранит score как double: значение должно быть точным
+    assert float(score) == score
+
+
+def test_summary_round_trip():
+    """Тест: сводка хранит время с зоной, id строкой и статус значением"""
+    created_at = datetime(2026, 10, 1, 12, 0, 0, 5, tzinfo=timezone.utc)
+    notification_id = UUID("6712d937-f49b-402e-aaac-ca573adb8ed4")
+
+    summary = orjson.loads(
+        encode_summary(
+            {"id": notification_id, "status": DeliveryStatus.SENT, "created_at": created_at}
+        )
+    )
+
+    assert summary["id"] == str(notification_id)
+    assert summary["status"] == "sent"
+    assert datetime.fromisoformat(summary["created_at"]) == created_at
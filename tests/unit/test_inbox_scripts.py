@@ -0,0 +1,124 @@
+"""Unit tests for user inbox Lua scripts"""
+
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+
+from shared.enums.delivery import DeliveryStatus
+from shared.inbox.store import InboxStore
+
+fakeredis = pytest.importorskip("fakeredis", reason="скрипты входящих гоняются на fakeredis[lua]")
+pytest.importorskip("lupa", reason="скрипты входящих гоняются на fakeredis[lua]")
+
+START = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_row(index, read=False):
+    return {
+        "id": UUID(int=index),
+        "user_id": "user-1",
+        "status": DeliveryStatus.SENT,
+        "created_at": START + timedelta(seconds=index),
+        "read_at": START.isoformat() if read else None,
+    }
+
+
+@pytest.fixture
+def store():
+    return InboxStore(fakeredis.aioredis.FakeRedis(), size=3, ttl=60)
+
+
+async def build(store, rows, unread_total):
+    token = await store.begin_rebuild("user-1")
+    # выборка Postgres идёт от новых к старым
+    return await store.rebuild("user-1", token, rows[::-1], unread_total)
+
+
+@pytest.mark.asyncio
+async def test_add_needs_built_inbox(store):
+    """Тест: воркер не создаёт входящие тем, кто их не читал"""
+    assert await store.add(make_row(1)) is False
+    assert await store.page("user-1", 10) is None
+
+    await build(store, [], 0)
+    assert await store.add(make_row(1)) is True
+    # повторная доставка не возвращает «непрочитано»
+    assert await store.add(make_row(1)) is False
+    assert await store.unread("user-1") == 1
+
+
+@pytest.mark.asyncio
+async def test_add_trims_window_and_counts_older_unread(store):
+    """Тест: вытесненные из окна непрочитанные уходят в older_unread"""
+    await build(store, [make_row(1), make_row(2, read=True)], 1)
+    for index in (3, 4, 5):
+        await store.add(make_row(index))
+
+    page = await store.page("user-1", 2)
+    assert [item["id"] for item in page.items] == [str(UUID(int=i)) for i in (5, 4)]
+    assert page.has_more is True
+    assert page.unread == 4
+    # окно больше не вся история: страницу длиннее окна отдаст Postgres
+    assert await store.page("user-1", 3) is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_cancelled_by_new_rebuild(store):
+    """Тест: сборку с чужим токеном перехватили, она ничего не пишет"""
+    stale = await store.begin_rebuild("user-1")
+    await store.begin_rebuild("user-1")
+
+    assert await store.rebuild("user-1", stale, [make_row(1)], 1) is False
+    assert await store.unread("user-1") is None
+
+
+@pytest.mark.asyncio
+async def test_page_cursor_skips_seen_rows(store):
+    """Тест: курсор отдаёт строки строго старше последней показанной"""
+    await build(store, [make_row(1), make_row(2)], 2)
+
+    first = await store.page("user-1", 1)
+    assert first.has_more is True
+    last = first.items[-1]
+    after = (datetime.fromisoformat(last["created_at"]), UUID(last["id"]))
+    second = await store.page("user-1", 1, after)
+
+    assert [item["id"] for item in second.items] == [str(UUID(int=1))]
+    assert second.has_more is False
+
+
+@pytest.mark.asyncio
+async def test_mark_read_updates_window_and_older_counter(store):
+    """Тест: отметка снимает непрочитанное в окне и за его пределами"""
+    rows = [make_row(index) for index in (1, 2, 3)]
+    await build(store, rows, 5)
+
+    unread = await store.mark_read("user-1", [UUID(int=3), UUID(int=99)], START)
+    assert unread == 3
+    page = await store.page("user-1", 1)
+    assert page.items[0]["read_at"] == START.isoformat()
+
+    assert await store.mark_all_read("user-1", START) is True
+    assert await store.unread("user-1") == 0
+
+
+@pytest.mark.asyncio
+async def test_mark_read_during_rebuild_cancels_it(store):
+    """Тест: отметка во время сборки отменяет сборку"""
+    token = await store.begin_rebuild("user-1")
+
+    assert await store.mark_read("user-1", [UUID(int=1)], START) is None
+    assert await store.rebuild("user-1", token, [make_row(1)], 1) is False
+
+
+@pytest.mark.asyncio
+async def test_update_merges_fields(store):
+    """Тест: квитанция меняет поля сводки, не трогая остальные"""
+    await build(store, [make_row(1)], 1)
+
+    await store.update([{"id": UUID(int=1), "user_id": "user-1", "status": "delivered"}])
+
+    (item,) = (await store.page("user-1", 1)).items
+    assert item["status"] == "delivered"
+    assert item["created_at"] == (START + timedelta(seconds=1)).isoformat()
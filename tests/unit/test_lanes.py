@@ -0,0 +1,22 @@
+"""Unit tests for priority lanes"""
+
+from shared.broker.lanes import PRIORITY_LANES, lane_queue
+from shared.enums.delivery import PriorityLevel
+
+
+def test_normal_priority_keeps_base_queue():
+    """Тест: NORMAL и отсутствие приоритета идут в исходную очередь"""
+    assert lane_queue("email_notifications") == "email_notifications"
+    assert lane_queue("email_notifications", "normal") == "email_notifications"
+
+
+def test_lane_queue_names():
+    """Тест имён очередей полос"""
+    assert lane_queue("email_notifications", PriorityLevel.URGENT) == "email_notifications.urgent"
+    assert lane_queue("sms_notifications", "low") == "sms_notifications.low"
+    assert [lane_queue("push", level) for level in PRIORITY_LANES] == [
+        "push.urgent",
+        "push.high",
+        "push",
+        "push.low",
+    ]
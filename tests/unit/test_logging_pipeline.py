@@ -0,0 +1,84 @@
+"""Unit tests for shared non-blocking log pipeline"""
+
+import io
+import json
+import logging
+
+import pytest
+import structlog
+
+from shared.utils.logging_pipeline import (
+    EventRateLimiter,
+    EventSampler,
+    configure_logging,
+    shutdown_logging,
+)
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    configure_logging(level="INFO", json_format=True, stream=stream)
+    yield stream
+    shutdown_logging()
+    structlog.reset_defaults()
+    logging.getLogger().handlers.clear()
+
+
+def _lines(stream):
+    shutdown_logging()  # дописывает очередь
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_sampler_drops_and_marks_events(monkeypatch):
+    """Тест выборки по имени события"""
+    sampler = EventSampler({"EMAIL_SENT": 0.25})
+    monkeypatch.setattr("shared.utils.logging_pipeline.random.random", lambda: 0.5)
+    with pytest.raises(structlog.DropEvent):
+        sampler(None, "info", {"event": "EMAIL_SENT"})
+    monkeypatch.setattr("shared.utils.logging_pipeline.random.random", lambda: 0.1)
+    assert sampler(None, "info", {"event": "EMAIL_SENT"})["sampled"] == 0.25
+    assert sampler(None, "info", {"event": "OTHER"}) == {"event": "OTHER"}
+
+
+def test_rate_limiter_reports_suppressed(monkeypatch):
+    """Тест ограничения частоты: число отброшенных уходит в следующее событие"""
+    now = [100.0]
+    monkeypatch.setattr("shared.utils.logging_pipeline.time.monotonic", lambda: now[0])
+    limiter = EventRateLimiter({"WORKER_HANDLE_ERROR": 2})
+
+    passed = 0
+    for _ in range(5):
+        try:
+            limiter(None, "error", {"event": "WORKER_HANDLE_ERROR"})
+            passed += 1
+        except structlog.DropEvent:
+            pass
+    assert passed == 2
+
+    now[0] += 1
+    event = limiter(None, "error", {"event": "WORKER_HANDLE_ERROR"})
+    assert event["suppressed"] == 3
+
+
+def test_pipeline_renders_structlog_and_stdlib_records(log_stream):
+    """Тест записи событий structlog и stdlib через фоновый поток"""
+    structlog.get_logger("worker").info("EMAIL_SENT", to="user@example.com")
+    structlog.get_logger("worker").debug("HIDDEN")
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        structlog.get_logger("worker").exception("WORKER_HANDLE_ERROR")
+    logging.getLogger("uvicorn.error").warning("Started %s", "server")
+
+    lines = _lines(log_stream)
+
+    assert [line["event"] for line in lines] == [
+        "EMAIL_SENT",
+        "WORKER_HANDLE_ERROR",
+        "Started server",
+    ]
+    assert lines[0]["logger"] == "worker"
+    assert lines[0]["level"] == "info"
+    assert "RuntimeError: boom" in lines[1]["exception"]
+    assert lines[2]["logger"] == "uvicorn.error"
@@ -0,0 +1,105 @@
+"""Unit tests for shared AMQP publisher"""
+
+from typing import Any, List
+
+import pytest
+
+from shared.broker import publisher as publisher_module
+from shared.broker.publisher import AmqpPublisher
+from shared.utils.metrics import BROKER_MESSAGES_PUBLISHED
+
+
+class FakeExchange:
+    def __init__(self) -> None:
+        self.published: List[Any] = []
+
+    async def publish(self, message: Any, routing_key: str) -> None:
+        self.published.append((routing_key, message))
+
+
+class FakeChannel:
+    def __init__(self, exchange: FakeExchange, declared: List[str]) -> None:
+        self.default_exchange = exchange
+        self._declared = declared
+        self.is_closed = False
+
+    async def declare_queue(self, name: str, durable: bool = False) -> None:
+        self._declared.append(name)
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.exchange = FakeExchange()
+        self.declared: List[str] = []
+        self.is_closed = False
+
+    async def channel(self) -> FakeChannel:
+        return FakeChannel(self.exchange, self.declared)
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened: List[FakeConnection] = []
+
+    async def connect_robust(url: str) -> FakeConnection:
+        connection = FakeConnection()
+        opened.append(connection)
+        return connection
+
+    monkeypatch.setattr(publisher_module.aio_pika, "connect_robust", connect_robust)
+    return opened
+
+
+@pytest.mark.asyncio
+async def test_publisher_reuses_connection_and_declares_once(connections):
+    """Тест: одно соединение и одно объявление очереди на процесс"""
+    publisher = AmqpPublisher("amqp://test")
+
+    for index in range(5):
+        await publisher.publish("email_notifications", {"n": index})
+
+    assert len(connections) == 1
+    assert connections[0].declared == ["email_notifications"]
+    assert len(connections[0].exchange.published) == 5
+    await publisher.close()
+    assert connections[0].is_closed
+
+
+@pytest.mark.asyncio
+async def test_publish_batch_splits_into_chunks(connections):
+    """Тест пакетной публикации"""
+    publisher = AmqpPublisher("amqp://test", batch_size=3)
+    counter = BROKER_MESSAGES_PUBLISHED.labels("push_notifications")
+    before = counter._value.get()
+
+    published = await publisher.publish_batch(
+        "push_notifications", ({"n": index} for index in range(7))
+    )
+
+    assert published == 7
+    routing_keys = {key for key, _ in connections[0].exchange.published}
+    assert routing_keys == {"push_notifications"}
+    assert counter._value.get() - before == 7
+    await publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_publish_encoded_keeps_body_and_content_type(connections):
+    """Тест: заранее закодированные тела публикуются как есть"""
+    publisher = AmqpPublisher("amqp://test")
+
+    published = await publisher.publish_encoded(
+        "sms_notifications", [(b"\x93\x01\x02\x03", "application/vnd.notification.v1+msgpack")]
+    )
+
+    assert published == 1
+    _, message = connections[0].exchange.published[0]
+    assert message.body == b"\x93\x01\x02\x03"
+    assert message.content_type == "application/vnd.notification.v1+msgpack"
+    await publisher.close()
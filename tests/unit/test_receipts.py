@@ -0,0 +1,48 @@
+"""Unit tests for delivery receipts format"""
+
+from uuid import uuid4
+
+import pytest
+
+from shared.broker.receipts import decode_receipts, encode_receipts, latest_receipts
+
+
+def _receipt(notification_id, status, occurred_at="2026-01-01T10:00:00Z"):
+    return {"notification_id": notification_id, "status": status, "occurred_at": occurred_at}
+
+
+def test_receipts_round_trip():
+    """Тест: пачка квитанций переживает кодирование"""
+    receipts = [_receipt(str(uuid4()), "delivered"), _receipt(str(uuid4()), "failed")]
+
+    assert decode_receipts(encode_receipts(receipts)) == receipts
+
+
+@pytest.mark.parametrize(
+    "receipt",
+    [
+        _receipt(str(uuid4()), "pending"),
+        _receipt("not-a-uuid", "sent"),
+        _receipt(str(uuid4()), "sent", occurred_at="вчера"),
+    ],
+)
+def test_invalid_receipt_rejects_message(receipt):
+    """Тест: битая квитанция отклоняет сообщение, а не пачку в воркере"""
+    with pytest.raises(ValueError):
+        decode_receipts(encode_receipts([receipt]))
+
+
+def test_latest_receipt_wins_by_status_then_time():
+    """Тест: на уведомление остаётся старшая квитанция, запоздавший sent не откатывает"""
+    first, second = str(uuid4()), str(uuid4())
+    receipts = [
+        _receipt(first, "delivered", "2026-01-01T10:00:00Z"),
+        _receipt(first, "sent", "2026-01-01T11:00:00Z"),
+        _receipt(second, "failed", "2026-01-01T10:00:00Z"),
+        _receipt(second, "failed", "2026-01-01T10:05:00Z"),
+    ]
+
+    latest = {receipt["notification_id"]: receipt for receipt in latest_receipts(receipts)}
+
+    assert latest[first]["status"] == "delivered"
+    assert latest[second]["occurred_at"] == "2026-01-01T10:05:00Z"
@@ -0,0 +1,33 @@
+"""Unit tests for JSON encoding of database rows"""
+
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import orjson
+import pytest
+from asyncpg.pgproto.pgproto import UUID as PgUUID
+
+from shared.enums.delivery import DeliveryStatus
+from shared.utils.serialization import dumps
+
+
+def test_dumps_asyncpg_uuid():
+    """Тест: UUID драйвера asyncpg кодируется строкой, как uuid.UUID"""
+    notification_id = PgUUID(str(uuid4()))
+    created_at = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+    row = {"id": notification_id, "status": DeliveryStatus.SENT, "created_at": created_at}
+
+    encoded = dumps(row, orjson.OPT_APPEND_NEWLINE)
+
+    assert encoded.endswith(b"\n")
+    assert orjson.loads(encoded) == {
+        "id": str(notification_id),
+        "status": "sent",
+        "created_at": "2026-10-01T12:00:00+00:00",
+    }
+
+
+def test_dumps_rejects_unknown_types():
+    """Тест: прочие неизвестные типы не превращаются молча в строку"""
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
@@ -0,0 +1,98 @@
+"""Unit tests for broker wire format"""
+
+import json
+from uuid import uuid4
+
+import pytest
+
+from shared.models.wire import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_V1_CONTENT_TYPE,
+    MSGPACK_V2_CONTENT_TYPE,
+    WireFormat,
+    decode_message,
+    encode_message,
+    payload_ref,
+)
+
+
+def _message():
+    return {
+        "notification_id": str(uuid4()),
+        "user_id": "user-123",
+        "template_id": str(uuid4()),
+        "subject": "Новые фильмы недели",
+        "body": "Здравствуйте! https://example.com/movie",
+        "notification_type": "email",
+        "priority": "high",
+        "data": {"movie_ids": [1, 2, 3]},
+    }
+
+
+def test_msgpack_round_trip():
+    """Тест: схема v1 восстанавливает исходный словарь"""
+    message = _message()
+    body, content_type = encode_message(message, WireFormat.MSGPACK)
+
+    assert content_type == MSGPACK_V1_CONTENT_TYPE
+    assert decode_message(body, content_type) == message
+    assert len(body) < len(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+
+
+def test_msgpack_keeps_fields_outside_schema():
+    """Тест: поля вне схемы и значения вне таблиц кодов не теряются"""
+    message = {**_message(), "notification_type": "telegram", "user_id": "u", "trace_id": "abc"}
+    body, content_type = encode_message(message, WireFormat.MSGPACK)
+
+    assert decode_message(body, content_type) == message
+
+
+def test_reference_message_round_trip():
+    """Тест: сообщение по ссылке идёт по схеме v2 и заметно короче полного"""
+    message = _message()
+    ref = payload_ref(
+        message["template_id"], 3, message["subject"], message["body"], message["data"]
+    )
+    reference = {
+        "notification_id": message["notification_id"],
+        "user_id": message["user_id"],
+        "template_id": message["template_id"],
+        "template_version": 3,
+        "payload_ref": ref,
+        "notification_type": "email",
+        "priority": "high",
+        "delta": {"seat": 7},
+    }
+    body, content_type = encode_message(reference, WireFormat.MSGPACK)
+
+    assert content_type == MSGPACK_V2_CONTENT_TYPE
+    assert decode_message(body, content_type) == reference
+    assert len(body) < len(encode_message(message, WireFormat.MSGPACK)[0])
+
+
+def test_payload_ref_depends_on_content_only():
+    """Тест: ключ общей части стабилен к порядку ключей data и меняется с версией"""
+    template_id = uuid4()
+    ref = payload_ref(template_id, 1, "Тема", "Тело", {"a": 1, "b": 2})
+
+    assert ref == payload_ref(str(template_id), 1, "Тема", "Тело", {"b": 2, "a": 1})
+    assert ref != payload_ref(template_id, 2, "Тема", "Тело", {"a": 1, "b": 2})
+    assert len(ref) == 64
+
+
+def test_json_messages_still_decoded():
+    """Тест: консьюмер читает прежний JSON и сообщения без content_type"""
+    message = _message()
+    legacy = json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+    assert decode_message(legacy, JSON_CONTENT_TYPE) == message
+    assert decode_message(legacy, None) == message
+    body, content_type = encode_message(message)
+    assert content_type == JSON_CONTENT_TYPE
+    assert decode_message(body, content_type) == message
+
+
+def test_unknown_content_type_rejected():
+    """Тест неизвестного content_type"""
+    with pytest.raises(ValueError):
+        decode_message(b"<xml/>", "application/xml")